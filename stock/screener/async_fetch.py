@@ -0,0 +1,166 @@
+import asyncio
+import argparse
+import pandas as pd
+from perf import PerfRecorder, current, timed, count
+from metrics import FETCH_REQUESTS, FETCH_RETRIES, PERIOD_FALLBACKS, FETCH_ERRORS
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{ticker}"
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# Requests in flight at once; all of them share one keep-alive connection pool
+MAX_CONNECTIONS = 100
+# Seconds per request once it has a connection, and for opening one
+REQUEST_TIMEOUT = 10
+CONNECT_TIMEOUT = 5
+# How often should_stop is polled while requests are in flight, in seconds
+STOP_POLL = 0.05
+
+def parse_chart(payload, interval):
+    """OHLCV frame from a Yahoo chart response, indexed in exchange time like yfinance
+
+    The quote prices are split adjusted but not dividend adjusted, the basis of yfinance's
+    history(auto_adjust=False) and of the bhavcopy store, so both fetch paths share one file.
+    """
+    chart = payload.get('chart') or {}
+    if chart.get('error'):
+        raise ValueError(chart['error'].get('description') or chart['error'].get('code'))
+    result = (chart.get('result') or [None])[0]
+    if not result or not result.get('timestamp'):
+        return pd.DataFrame()
+
+    quote = result['indicators']['quote'][0]
+    index = pd.to_datetime(result['timestamp'], unit='s', utc=True).tz_convert('Asia/Kolkata')
+    if not interval.endswith(('m', 'h')):
+        # Daily and coarser bars are stamped with the session open; yfinance and the bhavcopy use midnight
+        index = index.normalize()
+    data = pd.DataFrame({
+        'Open': quote.get('open'), 'High': quote.get('high'), 'Low': quote.get('low'),
+        'Close': quote.get('close'), 'Volume': quote.get('volume')
+    }, index=index, dtype=float)
+    data.index.name = 'Datetime'
+    # Yahoo sends nulls for intervals without trades
+    return data.dropna(subset=['Open', 'High', 'Low', 'Close'])
+
+class AsyncYahooClient:
+    """Yahoo chart requests over one pooled aiohttp session, at most max_connections in flight"""
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, timeout=REQUEST_TIMEOUT):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is not installed")
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.session = None
+
+    async def __aenter__(self):
+        # Queued requests wait on the semaphore, so their timeout only starts once they are sent
+        self._slots = asyncio.Semaphore(self.max_connections)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=self.timeout, sock_connect=CONNECT_TIMEOUT),
+            headers=HEADERS
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def chart(self, ticker, interval, period):
+        async with self._slots:
+            with timed('http.chart'):
+                async with self.session.get(CHART_URL.format(ticker=ticker),
+                                            params={'interval': interval, 'range': period}) as response:
+                    payload = await response.json(content_type=None)
+        return parse_chart(payload, interval)
+
+    async def history(self, ticker, interval, periods_to_try):
+        """Same period fallback and (data, has_period_issues) result as fetch_data.download_history"""
+        data = pd.DataFrame()
+        has_period_issues = False
+        for attempt, period in enumerate(periods_to_try):
+            if attempt:
+                FETCH_RETRIES.inc(interval=interval)
+            try:
+                temp_data = await self.chart(ticker, interval, period)
+            except Exception:
+                FETCH_ERRORS.inc(stage='chart')
+                has_period_issues = True
+                continue
+            if not temp_data.empty:
+                data = temp_data
+                if period != periods_to_try[0]:
+                    count('fetch.period_fallback')
+                    PERIOD_FALLBACKS.inc(interval=interval)
+                    has_period_issues = True
+                break
+        return data, has_period_issues
+
+async def run_cancellable(jobs, should_stop=None, on_progress=None, poll=STOP_POLL):
+    """Runs {key: coroutine} concurrently; returns ({key: result} of the finished ones, stopped)
+
+    should_stop and on_progress(done, total) are called every poll seconds. Once should_stop
+    returns True, or on_progress raises, the requests still in flight are cancelled.
+    """
+    tasks = {asyncio.ensure_future(job): key for key, job in jobs.items()}
+    pending = set(tasks)
+    results = {}
+    stopped = False
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=poll)
+            for task in done:
+                if task.exception() is None:
+                    results[tasks[task]] = task.result()
+            if on_progress:
+                on_progress(len(results), len(tasks))
+            if should_stop and should_stop():
+                stopped = True
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return results, stopped
+
+def fetch_histories(tickers, interval, periods_to_try, should_stop=None, on_progress=None,
+                    max_connections=MAX_CONNECTIONS, timeout=REQUEST_TIMEOUT):
+    """Downloads many tickers concurrently; {ticker: (data, has_period_issues)} for those that finished"""
+    async def fetch_all():
+        async with AsyncYahooClient(max_connections, timeout) as client:
+            jobs = {ticker: client.history(ticker, interval, periods_to_try) for ticker in tickers}
+            return await run_cancellable(jobs, should_stop, on_progress)
+
+    FETCH_REQUESTS.inc(len(tickers), interval=interval, source='async')
+    started = PerfRecorder.clock()
+    histories, stopped = asyncio.run(fetch_all())
+    current().record('prefetch.batch', PerfRecorder.clock() - started)
+    if stopped:
+        print(f"Fetch stopped with {len(histories)} of {len(tickers)} tickers downloaded")
+    return histories
+
+if __name__ == "__main__":
+    from fetch_data import fetch_all_tickers, BASE_PERIODS
+
+    parser = argparse.ArgumentParser(description="Download bars for many tickers concurrently and report throughput")
+    parser.add_argument("tickers", nargs="*", help="defaults to the exchange's ticker list")
+    parser.add_argument("--interval", choices=sorted(BASE_PERIODS), default="1d")
+    parser.add_argument("--exchange", default="NSE")
+    parser.add_argument("--connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT)
+    args = parser.parse_args()
+
+    tickers = args.tickers or fetch_all_tickers(args.exchange)
+    started = PerfRecorder.clock()
+    histories = fetch_histories(tickers, args.interval, BASE_PERIODS[args.interval],
+                                max_connections=args.connections, timeout=args.timeout)
+    elapsed = PerfRecorder.clock() - started
+    bars = sum(len(data) for data, _ in histories.values())
+    print(f"{len(histories)} of {len(tickers)} tickers, {bars} bars in {elapsed:.1f}s "
+          f"({len(tickers) / max(elapsed, 1e-9):.0f} tickers/s)")
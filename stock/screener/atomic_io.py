@@ -0,0 +1,53 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+@contextmanager
+def atomic_file(path, mode='w', fsync=True, **kwargs):
+    """File object whose contents replace path in one rename once the block completes
+
+    Readers see the old or the new file, never a partial one. The temporary file has a unique
+    name, so concurrent writers cannot interleave, and an error or a crash leaves the old file.
+    With fsync the data is on disk before the rename, so a power loss cannot leave an empty file.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_file = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with open(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on path + '.lock', held by one process at a time; blocks until it is free"""
+    with open(f"{path}.lock", 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            # Retries for about 10 seconds, then raises OSError
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,157 @@
+import os
+import time
+import argparse
+from datetime import datetime
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from bar_store import BarStore
+from pattern_detection import detect_pattern, get_scan_folder_name
+from pattern_dsl import compile_patterns
+from panel import OHLCVPanel
+
+PATTERNS = ["Volatility Contraction", "Low Volume Stock Selection", "15% Reversal"]
+DEFAULT_HORIZONS = [5, 10, 20]
+
+def pattern_signals(data, pattern_type):
+    """Bar t is a signal when detect_pattern would match on data.iloc[:t+1]"""
+    compiled = compile_patterns([pattern_type])
+    if pattern_type not in compiled.pattern_types:
+        return pd.Series(False, index=data.index)
+    return compiled.signals(data)[pattern_type]
+
+def forward_returns(close, horizons):
+    return pd.DataFrame({f"fwd_{n}": close.shift(-n) / close - 1 for n in horizons}, index=close.index)
+
+def backtest_frame(ticker, data, patterns, horizons):
+    if data.empty or len(data) < 60:
+        return pd.DataFrame()
+    returns = forward_returns(data['Close'], horizons)
+    # All patterns in one evaluation so shared indicators are computed once per ticker
+    all_signals = compile_patterns(patterns).signals(data)
+    results = []
+    for pattern, signals in all_signals.items():
+        if not signals.any():
+            continue
+        hits = returns[signals.values].copy()
+        hits.insert(0, 'close', data['Close'][signals.values])
+        hits.insert(0, 'pattern', pattern)
+        hits.insert(0, 'ticker', ticker)
+        results.append(hits)
+    if not results:
+        return pd.DataFrame()
+    frame = pd.concat(results)
+    frame.index.name = 'signal_date'
+    return frame.reset_index()
+
+# Panel attached once per worker process; its arrays are memory-mapped, not pickled
+_panel = None
+
+def _attach_panel(path):
+    global _panel
+    _panel = OHLCVPanel(path) if path else None
+
+def _backtest_worker(args):
+    store_root, interval, ticker, patterns, horizons = args
+    if _panel is not None:
+        data = _panel.bars(ticker)
+    else:
+        data = BarStore(store_root).read_interval(ticker, interval)
+    try:
+        return backtest_frame(ticker, data, patterns, horizons)
+    except Exception as e:
+        print(f"Error backtesting {ticker}: {e}")
+        return pd.DataFrame()
+
+def run_backtest(store_root, interval, patterns=None, horizons=None, tickers=None, workers=None, panel_path=None):
+    """Signals and forward returns over the store, or over a panel built with panel.py when given"""
+    patterns = patterns or PATTERNS
+    horizons = horizons or DEFAULT_HORIZONS
+    if panel_path:
+        panel = OHLCVPanel(panel_path)
+        if panel.interval != interval:
+            raise ValueError(f"Panel {panel_path} holds {panel.interval} bars, not {interval}")
+        tickers = [t for t in tickers if t in panel] if tickers else panel.tickers
+    else:
+        tickers = tickers or BarStore(store_root).interval_tickers(interval)
+    jobs = [(store_root, interval, ticker, patterns, horizons) for ticker in tickers]
+
+    frames = []
+    if workers == 1:
+        _attach_panel(panel_path)
+        try:
+            frames = [_backtest_worker(job) for job in jobs]
+        finally:
+            _attach_panel(None)
+    else:
+        with Pool(processes=workers, initializer=_attach_panel, initargs=(panel_path,)) as pool:
+            frames = list(pool.imap_unordered(_backtest_worker, jobs, chunksize=16))
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=['signal_date', 'ticker', 'pattern', 'close'] + [f"fwd_{n}" for n in horizons])
+    return pd.concat(frames, ignore_index=True).sort_values(['pattern', 'signal_date', 'ticker'])
+
+def summarize(signals, horizons=None):
+    horizons = horizons or DEFAULT_HORIZONS
+    rows = []
+    for pattern, group in signals.groupby('pattern'):
+        row = {'pattern': pattern, 'signals': len(group), 'tickers': group['ticker'].nunique()}
+        for n in horizons:
+            returns = group[f"fwd_{n}"].dropna()
+            row[f"mean_fwd_{n}"] = returns.mean()
+            row[f"median_fwd_{n}"] = returns.median()
+            row[f"hit_rate_{n}"] = (returns > 0).mean() if len(returns) else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def verify_against_detect_pattern(data, pattern_type, samples=50, seed=0):
+    """Spot-checks the vectorized signals against detect_pattern on random history prefixes"""
+    signals = pattern_signals(data, pattern_type)
+    rng = np.random.default_rng(seed)
+    positions = rng.choice(np.arange(60, len(data)), size=min(samples, max(0, len(data) - 60)), replace=False)
+    mismatches = []
+    for position in sorted(positions):
+        expected = detect_pattern(data.iloc[:position + 1].copy(), pattern_type=pattern_type, log_results=False)
+        if bool(expected) != bool(signals.iloc[position]):
+            mismatches.append(data.index[position])
+    return mismatches
+
+def save_backtest(signals, summary, interval, output_dir="backtest_results"):
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    name = get_scan_folder_name("backtest", interval, stamp)
+    signals_file = os.path.join(output_dir, f"{name}_signals.csv")
+    summary_file = os.path.join(output_dir, f"{name}_summary.csv")
+    signals.to_csv(signals_file, index=False)
+    summary.to_csv(summary_file, index=False)
+    return signals_file, summary_file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the screener patterns over stored history")
+    parser.add_argument("--store", default="bar_store")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--pattern", action="append", dest="patterns", choices=PATTERNS)
+    parser.add_argument("--horizon", action="append", dest="horizons", type=int)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--panel", help="memory-mapped panel directory built with panel.py, read instead of the store")
+    parser.add_argument("--verify", type=int, default=0,
+                        help="compare N random bars per ticker against detect_pattern")
+    parser.add_argument("tickers", nargs="*")
+    args = parser.parse_args()
+
+    if args.verify:
+        store = BarStore(args.store)
+        for ticker in args.tickers or store.interval_tickers(args.interval):
+            data = store.read_interval(ticker, args.interval)
+            for pattern in args.patterns or PATTERNS:
+                mismatches = verify_against_detect_pattern(data, pattern, samples=args.verify)
+                print(f"{ticker} {pattern}: {len(mismatches)} mismatches")
+    else:
+        started = time.perf_counter()
+        signals = run_backtest(args.store, args.interval, args.patterns, args.horizons, args.tickers, args.workers,
+                               args.panel)
+        summary = summarize(signals, args.horizons)
+        signals_file, summary_file = save_backtest(signals, summary, args.interval)
+        print(summary.to_string(index=False))
+        print(f"\n{len(signals)} signals in {time.perf_counter() - started:.1f}s -> {signals_file}")
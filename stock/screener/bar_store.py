@@ -0,0 +1,136 @@
+import os
+from datetime import datetime
+import pandas as pd
+from resample import resample_ohlcv, BASE_INTERVALS
+from atomic_io import atomic_file
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+STORE_FORMATS = ('csv', 'parquet')
+
+class BarStore:
+    """Local OHLCV store: one CSV (or Parquet) file per ticker under <root>/<interval>/"""
+
+    def __init__(self, root="bar_store", fmt="csv"):
+        if fmt not in STORE_FORMATS:
+            raise ValueError(f"Unsupported store format '{fmt}'")
+        self.root = root
+        self.fmt = fmt
+
+    def _path(self, ticker, interval):
+        return os.path.join(self.root, interval, f"{ticker}.{self.fmt}")
+
+    def has(self, ticker, interval):
+        return os.path.exists(self._path(ticker, interval))
+
+    def fetched_at(self, ticker, interval):
+        """Time of the last write, i.e. of the last fetch merged into the store"""
+        path = self._path(ticker, interval)
+        if not os.path.exists(path):
+            return None
+        return datetime.fromtimestamp(os.path.getmtime(path))
+
+    def tickers(self, interval):
+        interval_dir = os.path.join(self.root, interval)
+        if not os.path.isdir(interval_dir):
+            return []
+        suffix = f".{self.fmt}"
+        return sorted(f[:-len(suffix)] for f in os.listdir(interval_dir) if f.endswith(suffix))
+
+    def _source_interval(self, ticker, interval):
+        if self.has(ticker, interval):
+            return interval
+        base_interval = BASE_INTERVALS.get(interval)
+        if base_interval is not None and self.has(ticker, base_interval):
+            return base_interval
+        return None
+
+    def has_interval(self, ticker, interval):
+        """True when the interval is stored or can be resampled from its stored base interval"""
+        return self._source_interval(ticker, interval) is not None
+
+    def interval_tickers(self, interval):
+        """Tickers whose bars of interval are stored or can be resampled from the base interval"""
+        base_interval = BASE_INTERVALS.get(interval)
+        if base_interval is None or base_interval == interval:
+            return self.tickers(interval)
+        return sorted(set(self.tickers(interval)) | set(self.tickers(base_interval)))
+
+    def read_interval(self, ticker, interval, tail=None):
+        """Bars of any form interval; only base intervals are stored, the others are resampled from them"""
+        source = self._source_interval(ticker, interval)
+        if source is None:
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+        if source == interval:
+            return self.read(ticker, interval, tail=tail)
+        data = self.read(ticker, source)
+        if data.empty:
+            return data
+        data = resample_ohlcv(data, interval)
+        return data.tail(tail) if tail is not None else data
+
+    def read(self, ticker, interval, tail=None):
+        path = self._path(ticker, interval)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+        try:
+            if self.fmt == 'parquet':
+                data = pd.read_parquet(path)
+            else:
+                data = pd.read_csv(path, index_col=0)
+            # Timestamps are stored in UTC and handed out in exchange time
+            data.index = pd.to_datetime(data.index, utc=True).tz_convert('Asia/Kolkata')
+            data.index.name = 'Datetime'
+            if tail is not None:
+                data = data.tail(tail)
+            return data
+        except Exception as e:
+            print(f"Error reading stored bars for {ticker} ({interval}): {e}")
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+    def write(self, ticker, interval, data):
+        path = self._path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        bars = data[[c for c in OHLCV_COLUMNS if c in data.columns]].copy()
+        index = pd.to_datetime(bars.index)
+        if index.tz is None:
+            index = index.tz_localize('Asia/Kolkata')
+        bars.index = index.tz_convert('UTC')
+        bars.index.name = 'Datetime'
+
+        # Written once per fetched ticker and refetchable, so not synced to disk
+        if self.fmt == 'parquet':
+            with atomic_file(path, 'wb', fsync=False) as f:
+                bars.to_parquet(f)
+        else:
+            with atomic_file(path, 'w', fsync=False, newline='') as f:
+                bars.to_csv(f)
+
+    def append(self, ticker, interval, new_bars):
+        """Merge new bars into the stored history, newer rows win on duplicate timestamps"""
+        if new_bars is None or new_bars.empty:
+            return self.read(ticker, interval)
+        existing = self.read(ticker, interval)
+        new_bars = new_bars[[c for c in OHLCV_COLUMNS if c in new_bars.columns]]
+        if existing.empty:
+            merged = new_bars
+        else:
+            new_index = pd.to_datetime(new_bars.index)
+            if new_index.tz is None:
+                new_index = new_index.tz_localize('Asia/Kolkata')
+            new_bars = new_bars.set_axis(new_index.tz_convert('Asia/Kolkata'))
+            merged = pd.concat([existing, new_bars])
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        self.write(ticker, interval, merged)
+        return merged
+
+    def bar_count(self, ticker, interval):
+        path = self._path(ticker, interval)
+        if not os.path.exists(path):
+            return 0
+        if self.fmt == 'parquet':
+            return len(pd.read_parquet(path, columns=['Close']))
+        with open(path, 'rb') as f:
+            # Header line is not a bar
+            return max(0, sum(1 for _ in f) - 1)
@@ -0,0 +1,97 @@
+import os
+import ast
+import sys
+import argparse
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "main.py")
+# Imported on first use only; loading any of them with the app is a cold start regression
+DEFERRED = ['yfinance', 'bs4', 'requests', 'matplotlib', 'mplfinance', 'aiohttp']
+
+def startup_modules(path=APP):
+    """Modules a script imports at module level, in order"""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(name for name in names if name not in modules)
+    return modules
+
+def import_times(modules, python=sys.executable):
+    """Imports modules in a fresh interpreter with -X importtime
+
+    Returns ([(name, depth, self_us, cumulative_us)], modules that are not installed).
+    """
+    code = ("import importlib\n"
+            f"for name in {modules!r}:\n"
+            "    try:\n"
+            "        importlib.import_module(name)\n"
+            "    except ImportError:\n"
+            "        print('not installed:', name)\n")
+    result = subprocess.run([python, "-X", "importtime", "-c", code], cwd=HERE,
+                            capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    missing = [line.split(':', 1)[1].strip() for line in result.stdout.splitlines()
+               if line.startswith('not installed:')]
+    return entries, missing
+
+def summarize(entries, baseline=()):
+    """(total seconds, {top-level package: cumulative seconds}, set of every module loaded)
+
+    Modules in baseline, those an empty interpreter loads through site, are left out.
+    """
+    entries = [entry for entry in entries if entry[0] not in baseline]
+    total = sum(cumulative for _, depth, _, cumulative in entries if depth == 0) / 1e6
+    packages = {name: cumulative / 1e6 for name, _, _, cumulative in entries
+                if '.' not in name and not os.path.exists(os.path.join(HERE, f"{name}.py"))}
+    return total, packages, {name for name, _, _, _ in entries}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the imports of the screener app, or of the given modules")
+    parser.add_argument("modules", nargs="*", help="defaults to the module-level imports of main.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    modules = args.modules or startup_modules()
+    # The first run also compiles bytecode, so it is left out of the median
+    import_times(modules)
+    baseline = {name for name, _, _, _ in import_times([])[0]}
+    totals = []
+    packages = {}
+    for _ in range(args.runs):
+        entries, missing = import_times(modules)
+        total, run_packages, loaded = summarize(entries, baseline)
+        totals.append(total)
+        for name, seconds in run_packages.items():
+            packages.setdefault(name, []).append(seconds)
+
+    print(f"Importing {len(modules)} modules: median {statistics.median(totals) * 1000:.0f}ms "
+          f"over {args.runs} runs (min {min(totals) * 1000:.0f}ms, max {max(totals) * 1000:.0f}ms)")
+    if missing:
+        print(f"Not installed, not timed: {', '.join(missing)}")
+    print(f"\n{'package':<24}{'cumulative':>12}")
+    heaviest = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))
+    for name, seconds in heaviest[:args.top]:
+        print(f"{name:<24}{statistics.median(seconds) * 1000:>10.1f}ms")
+
+    if not args.modules:
+        eager = [name for name in DEFERRED if name in loaded]
+        if eager:
+            raise SystemExit(f"Loaded at startup but meant to be imported on first use: {', '.join(eager)}")
+        print(f"\nNone of {', '.join(DEFERRED)} loaded at startup")
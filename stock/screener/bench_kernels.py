@@ -0,0 +1,115 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import kernels
+from data_providers import SyntheticProvider
+from pattern_dsl import CompiledPatterns
+
+PATTERNS = ["Volatility Contraction", "Low Volume Stock Selection", "15% Reversal"]
+
+# The pandas calls each kernel replaced; every backend must agree with these
+def _pandas_true_range(high, low, close):
+    high, low, close = pd.Series(high), pd.Series(low), pd.Series(close)
+    prev_close = close.shift(1)
+    return np.maximum(high - low, np.maximum(abs(high - prev_close), abs(low - prev_close))).to_numpy()
+
+REFERENCES = {
+    'true_range': lambda h, l, c: _pandas_true_range(h, l, c),
+    'rolling_sum': lambda x, n: pd.Series(x).rolling(n).sum().to_numpy(),
+    'rolling_mean': lambda x, n: pd.Series(x).rolling(n).mean().to_numpy(),
+    'rolling_max': lambda x, n: pd.Series(x).rolling(n).max().to_numpy(),
+    'rolling_min': lambda x, n: pd.Series(x).rolling(n).min().to_numpy(),
+    'atr': lambda h, l, c, n: pd.Series(_pandas_true_range(h, l, c)).rolling(n).mean().to_numpy(),
+    'ema': lambda x, span: pd.Series(x).ewm(span=span, adjust=False).mean().to_numpy(),
+    'range_pct': lambda h, l, c, n: ((pd.Series(h).rolling(n).max() - pd.Series(l).rolling(n).min())
+                                     / pd.Series(c).rolling(n).mean()).to_numpy()
+}
+
+def kernel_calls(bars):
+    """(kernel, args) pairs as the pattern definitions use them"""
+    high, low, close, volume = (bars[f].to_numpy(dtype=float) for f in ('High', 'Low', 'Close', 'Volume'))
+    returns = np.abs(np.diff(close, prepend=np.nan) / np.r_[np.nan, close[:-1]])
+    return [
+        ('true_range', (high, low, close)),
+        ('rolling_sum', (returns, 39)),
+        ('rolling_mean', (volume, 120)),
+        ('rolling_max', (high, 100)),
+        ('rolling_min', (close, 30)),
+        ('atr', (high, low, close, 14)),
+        ('ema', (close, 20)),
+        ('range_pct', (high, low, close, 45))
+    ]
+
+def check_equivalence(universe, rtol=1e-9):
+    """Compares every backend with the pandas reference; returns (backend, kernel, ticker) mismatches"""
+    mismatches = []
+    for backend in kernels.available_backends():
+        implementations = kernels.NUMBA_KERNELS if backend == 'numba' else kernels.NUMPY_KERNELS
+        for ticker, bars in universe.items():
+            for name, args in kernel_calls(bars):
+                expected = REFERENCES[name](*args)
+                actual = implementations[name](*args)
+                if expected.dtype == bool:
+                    same = np.array_equal(expected, actual)
+                else:
+                    same = np.allclose(actual, expected, rtol=rtol, atol=0, equal_nan=True)
+                if not same:
+                    mismatches.append((backend, name, ticker))
+    return mismatches
+
+def time_kernels(universe, backend):
+    implementations = kernels.NUMBA_KERNELS if backend == 'numba' else kernels.NUMPY_KERNELS
+    calls = [kernel_calls(bars) for bars in universe.values()]
+    # One warm-up pass so numba compilation is not timed
+    for name, args in calls[0]:
+        implementations[name](*args)
+    timings = {}
+    for name in implementations:
+        started = time.perf_counter()
+        for ticker_calls in calls:
+            for call_name, args in ticker_calls:
+                if call_name == name:
+                    implementations[name](*args)
+        timings[name] = time.perf_counter() - started
+    return timings
+
+def time_detection(universe, backend):
+    kernels.use_backend(backend)
+    compiled = CompiledPatterns(PATTERNS)
+    compiled.condition_frames(next(iter(universe.values())))
+    started = time.perf_counter()
+    for bars in universe.values():
+        compiled.condition_frames(bars)
+    return time.perf_counter() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the indicator kernels against pandas and time every backend")
+    parser.add_argument("--tickers", type=int, default=1000)
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    provider = SyntheticProvider(args.tickers, args.seed)
+    universe = {ticker: provider.get_bars(ticker, args.interval)[0] for ticker in provider.list_universe()}
+    bars = sum(len(b) for b in universe.values())
+    print(f"{len(universe)} tickers, {bars} {args.interval} candles, backends: {', '.join(kernels.available_backends())}")
+
+    mismatches = check_equivalence(universe)
+    if mismatches:
+        for backend, name, ticker in mismatches[:20]:
+            print(f"MISMATCH {backend} {name} {ticker}")
+        raise SystemExit(f"{len(mismatches)} kernel results differ from pandas")
+    print("All kernels match the pandas reference")
+
+    kernel_times = {backend: time_kernels(universe, backend) for backend in kernels.available_backends()}
+    print(f"\n{'kernel':<14}" + "".join(f"{backend:>12}" for backend in kernel_times))
+    for name in kernels.NUMPY_KERNELS:
+        print(f"{name:<14}" + "".join(f"{times[name] * 1000:>10.1f}ms" for times in kernel_times.values()))
+
+    print("\nFull pattern evaluation over the universe:")
+    detection = {backend: time_detection(universe, backend) for backend in kernels.available_backends()}
+    for backend, seconds in detection.items():
+        print(f"  {backend:<6} {seconds:.2f}s ({len(universe) / seconds:.0f} tickers/s)")
+    if 'numba' in detection:
+        print(f"  numba speedup {detection['numpy'] / detection['numba']:.2f}x")
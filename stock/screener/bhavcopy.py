@@ -0,0 +1,294 @@
+import os
+import io
+import json
+import zipfile
+import argparse
+from datetime import datetime, date, timedelta
+import numpy as np
+import pandas as pd
+import pytz
+from bar_store import BarStore
+from atomic_io import atomic_file
+
+IST = pytz.timezone('Asia/Kolkata')
+
+ARCHIVE_DIR = "bhavcopy_archive"
+STATE_FILE = os.path.join("metadata", "bhavcopy_state.json")
+
+# NSE switched from the legacy bhavcopy to the UDiFF layout on 8 July 2024
+UDIFF_START = date(2024, 7, 8)
+LEGACY_URL = "https://archives.nseindia.com/content/historical/EQUITIES/{year}/{month}/cm{day}{month}{year}bhav.csv.zip"
+UDIFF_URL = "https://nsearchives.nseindia.com/content/cm/BhavCopy_NSE_CM_0_0_0_{stamp}_F_0000.csv.zip"
+
+# Bhavcopy is published in the evening; before this hour today's file is not expected yet
+PUBLISH_HOUR = 19
+
+EQUITY_SERIES = ('EQ', 'BE', 'BZ')
+
+LEGACY_COLUMNS = {
+    'SYMBOL': 'symbol', 'SERIES': 'series', 'TIMESTAMP': 'date',
+    'OPEN': 'Open', 'HIGH': 'High', 'LOW': 'Low', 'CLOSE': 'Close', 'TOTTRDQTY': 'Volume',
+    'PREVCLOSE': 'prev_close'
+}
+UDIFF_COLUMNS = {
+    'TckrSymb': 'symbol', 'SctySrs': 'series', 'TradDt': 'date',
+    'OpnPric': 'Open', 'HghPric': 'High', 'LwPric': 'Low', 'ClsPric': 'Close', 'TtlTradgVol': 'Volume',
+    'PrvsClsgPric': 'prev_close'
+}
+
+# Bhavcopy prices are as traded, while Yahoo's (fetched with auto_adjust=False) are split and bonus
+# adjusted. The exchange's previous close is adjusted on the ex-date, so a previous close that differs
+# from the stored close by more than this marks a corporate action, and older bars are rescaled by it.
+ADJUSTMENT_TOLERANCE = 0.01
+# The previous close only describes the stored bar when no session is missing in between
+ADJUSTMENT_MAX_GAP = pd.Timedelta(days=5)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+def bhavcopy_url(day):
+    if day >= UDIFF_START:
+        return UDIFF_URL.format(stamp=day.strftime('%Y%m%d'))
+    month = day.strftime('%b').upper()
+    return LEGACY_URL.format(year=day.year, month=month, day=day.strftime('%d'))
+
+def _read_csv_bytes(content):
+    if content[:2] == b'PK':
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            name = next(n for n in archive.namelist() if n.lower().endswith('.csv'))
+            content = archive.read(name)
+    return pd.read_csv(io.BytesIO(content))
+
+def parse_bhavcopy(source, series=EQUITY_SERIES):
+    """Parses a legacy or UDiFF bhavcopy (csv or zip, path or bytes) into one row per ticker"""
+    if isinstance(source, (bytes, bytearray)):
+        raw = _read_csv_bytes(bytes(source))
+    else:
+        with open(source, 'rb') as f:
+            raw = _read_csv_bytes(f.read())
+
+    raw.columns = [c.strip() for c in raw.columns]
+    if 'TckrSymb' in raw.columns:
+        columns = UDIFF_COLUMNS
+        date_format = '%Y-%m-%d'
+    elif 'SYMBOL' in raw.columns:
+        columns = LEGACY_COLUMNS
+        date_format = '%d-%b-%Y'
+    else:
+        raise ValueError("Unrecognised bhavcopy layout")
+
+    bars = raw[list(columns)].rename(columns=columns)
+    bars['series'] = bars['series'].astype(str).str.strip()
+    bars = bars[bars['series'].isin(series)]
+    bars['symbol'] = bars['symbol'].astype(str).str.strip()
+    bars['date'] = pd.to_datetime(bars['date'].astype(str).str.strip(), format=date_format)
+    for column in ['Open', 'High', 'Low', 'Close', 'Volume', 'prev_close']:
+        bars[column] = pd.to_numeric(bars[column], errors='coerce')
+    bars = bars.dropna(subset=['Open', 'High', 'Low', 'Close'])
+
+    # A symbol can trade in several series on one day; keep the most traded one
+    bars = bars.sort_values('Volume', ascending=False).drop_duplicates(['symbol', 'date'])
+    bars['ticker'] = bars['symbol'] + '.NS'
+    return bars[['ticker', 'date', 'Open', 'High', 'Low', 'Close', 'Volume', 'prev_close']].reset_index(drop=True)
+
+def download_bhavcopy(day, archive_dir=ARCHIVE_DIR, session=None):
+    """Returns the raw file for a trading day, from the local archive when already downloaded"""
+    local_file = os.path.join(archive_dir, f"{day.isoformat()}.csv.zip")
+    if os.path.exists(local_file):
+        with open(local_file, 'rb') as f:
+            return f.read()
+
+    if session is None:
+        import requests
+        session = requests.Session()
+    response = session.get(bhavcopy_url(day), headers=HEADERS, timeout=30)
+    # Exchange holidays have no file; anything else is a failed download to retry later
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+
+    # A partial archive would be read back as the day's file on every later run
+    with atomic_file(local_file, 'wb') as f:
+        f.write(response.content)
+    return response.content
+
+def to_store_frames(bars):
+    """Splits parsed bhavcopy rows into per-ticker daily frames indexed like yfinance daily bars"""
+    frames = {}
+    for ticker, rows in bars.groupby('ticker'):
+        frame = rows.set_index('date')[['Open', 'High', 'Low', 'Close', 'Volume', 'prev_close']].sort_index()
+        frame.index = frame.index.tz_localize(IST)
+        frame.index.name = 'Date'
+        frames[ticker] = frame
+    return frames
+
+def load_state(state_file=STATE_FILE):
+    if not os.path.exists(state_file):
+        return {}
+    try:
+        with open(state_file, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading bhavcopy state: {e}")
+        return {}
+
+def save_state(state, state_file=STATE_FILE):
+    with atomic_file(state_file) as f:
+        json.dump(state, f)
+
+def expected_latest_session(now=None):
+    """Most recent weekday whose bhavcopy should already be published"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    day = now.date()
+    if now.hour < PUBLISH_HOUR:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+def store_is_current(state=None):
+    state = state if state is not None else load_state()
+    checked = state.get('checked_through')
+    return bool(checked) and date.fromisoformat(checked) >= expected_latest_session()
+
+def adjust_for_corporate_actions(bars):
+    """Rescales the bars before each corporate action so the history is continuous with the latest bar
+
+    bars holds OHLCV plus the exchange's prev_close, NaN for bars from Yahoo. The latest bar keeps its
+    traded prices, so a history adjusted once stays on the same basis when newer bars are appended.
+    """
+    close = bars['Close'].to_numpy(dtype=float)
+    prev_close = bars['prev_close'].to_numpy(dtype=float)
+    factors = np.ones(len(bars))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        factors[1:] = prev_close[1:] / close[:-1]
+    gaps = np.r_[False, (bars.index[1:] - bars.index[:-1]) > ADJUSTMENT_MAX_GAP]
+    factors[np.isnan(factors) | (np.abs(factors - 1) <= ADJUSTMENT_TOLERANCE) | gaps] = 1.0
+    # A bar is scaled by every action after it
+    scale = np.r_[np.cumprod(factors[::-1])[::-1][1:], 1.0]
+
+    adjusted = bars[['Open', 'High', 'Low', 'Close', 'Volume']].copy()
+    for column in ['Open', 'High', 'Low', 'Close']:
+        adjusted[column] = adjusted[column] * scale
+    adjusted['Volume'] = adjusted['Volume'] / scale
+    return adjusted
+
+def ingest_frames(store, frames):
+    """Merges bhavcopy frames into the store, adjusting the stored history for corporate actions"""
+    for ticker, frame in frames.items():
+        existing = store.read(ticker, '1d')
+        if not existing.empty:
+            frame = frame.set_axis(frame.index.tz_convert(existing.index.tz))
+            merged = pd.concat([existing.assign(prev_close=np.nan), frame])
+            frame = merged[~merged.index.duplicated(keep='last')].sort_index()
+        store.write(ticker, '1d', adjust_for_corporate_actions(frame))
+
+def ingest_range(start, end, store=None, archive_dir=ARCHIVE_DIR, state_file=STATE_FILE):
+    """Downloads every session between start and end and merges them into the store in one write per ticker"""
+    import requests
+    store = store or BarStore()
+    state = load_state(state_file)
+    session = requests.Session()
+
+    parsed = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            try:
+                content = download_bhavcopy(day, archive_dir, session)
+            except requests.RequestException as e:
+                # Only sessions before the failed download count as checked
+                print(f"Error downloading bhavcopy for {day}: {e}")
+                end = day - timedelta(days=1)
+                break
+            if content:
+                try:
+                    parsed.append(parse_bhavcopy(content))
+                    if not state.get('last_date') or day > date.fromisoformat(state['last_date']):
+                        state['last_date'] = day.isoformat()
+                except Exception as e:
+                    print(f"Error parsing bhavcopy for {day}: {e}")
+        day += timedelta(days=1)
+
+    if parsed:
+        ingest_frames(store, to_store_frames(pd.concat(parsed, ignore_index=True)))
+
+    if not state.get('checked_through') or end > date.fromisoformat(state['checked_through']):
+        state['checked_through'] = end.isoformat()
+    save_state(state, state_file)
+    return sum(len(p) for p in parsed)
+
+def ingest_daily(store=None, archive_dir=ARCHIVE_DIR, state_file=STATE_FILE, backfill_days=365):
+    """Brings the store up to the latest published session; the first run backfills a year"""
+    state = load_state(state_file)
+    end = expected_latest_session()
+    if state.get('checked_through'):
+        start = date.fromisoformat(state['checked_through']) + timedelta(days=1)
+    else:
+        start = end - timedelta(days=backfill_days)
+    if start > end:
+        return 0
+    return ingest_range(start, end, store, archive_dir, state_file)
+
+def ingest_files(paths, store=None):
+    """Ingests bhavcopy files already on disk, e.g. a manually downloaded history"""
+    store = store or BarStore()
+    parsed = []
+    for path in paths:
+        try:
+            parsed.append(parse_bhavcopy(path))
+        except Exception as e:
+            print(f"Error parsing {path}: {e}")
+    if parsed:
+        ingest_frames(store, to_store_frames(pd.concat(parsed, ignore_index=True)))
+    return sum(len(p) for p in parsed)
+
+def refresh_daily_store(store=None):
+    """Adds the sessions published since the last run once a backfill has set the store up"""
+    state = load_state()
+    if state and not store_is_current(state):
+        try:
+            ingest_daily(store)
+        except Exception as e:
+            print(f"Error refreshing bhavcopy data: {e}")
+
+def current_daily_bars(ticker, store=None, state=None):
+    """Stored daily bars reaching the latest ingested session, or None when they have to be downloaded
+
+    A ticker missing from the recent bhavcopies (BSE listings, suspended or delisted stocks) keeps
+    the file of its last Yahoo download, which must not be served as current.
+    """
+    store = store or BarStore()
+    state = state if state is not None else load_state()
+    if not store_is_current(state) or not state.get('last_date') or not store.has(ticker, '1d'):
+        return None
+    data = store.read(ticker, '1d')
+    if data.empty or data.index[-1].date() < date.fromisoformat(state['last_date']):
+        return None
+    return data
+
+def load_daily_bars(ticker, period_days, store=None):
+    """Daily bars from the bhavcopy-fed store, or None when the store cannot answer for this ticker"""
+    data = current_daily_bars(ticker, store)
+    if data is None:
+        return None
+    cutoff = data.index[-1] - pd.Timedelta(days=period_days)
+    return data[data.index > cutoff]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest NSE bhavcopy files into the local bar store")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="backfill start date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="backfill end date (YYYY-MM-DD)")
+    parser.add_argument("--store", default="bar_store")
+    parser.add_argument("files", nargs="*", help="local bhavcopy csv/zip files to ingest instead of downloading")
+    args = parser.parse_args()
+
+    store = BarStore(args.store)
+    if args.files:
+        rows = ingest_files(args.files, store)
+    elif args.start:
+        rows = ingest_range(args.start, args.end or expected_latest_session(), store)
+    else:
+        rows = ingest_daily(store)
+    print(f"Ingested {rows} bhavcopy rows")
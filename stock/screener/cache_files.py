@@ -0,0 +1,114 @@
+import io
+import os
+import zlib
+import json
+import gzip
+import itertools
+from atomic_io import atomic_file, file_lock
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# One JSON header line, one line per ticker and a checksum trailer, through a streaming compressor
+EXTENSIONS = {'zstd': '.jsonl.zst', 'gzip': '.jsonl.gz'}
+CODEC = 'zstd' if zstandard is not None else 'gzip'
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+def cache_path(base):
+    """Path of a cache entry written now; base is the path without extension"""
+    return base + EXTENSIONS[CODEC]
+
+def find_cache_file(base):
+    """Existing file for base in any codec this process can read, preferring the current one"""
+    for codec in (CODEC, *EXTENSIONS):
+        if codec == 'zstd' and zstandard is None:
+            continue
+        path = base + EXTENSIONS[codec]
+        if os.path.exists(path):
+            return path
+    return None
+
+def remove_cache_files(base):
+    for extension in EXTENSIONS.values():
+        if os.path.exists(base + extension):
+            os.remove(base + extension)
+
+def _reader(path):
+    if path.endswith(EXTENSIONS['zstd']):
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True),
+                                encoding='utf-8')
+    return gzip.open(path, 'rt', encoding='utf-8')
+
+def _writer(raw):
+    # The compressor leaves raw open, so atomic_file can sync it before the rename
+    if CODEC == 'zstd':
+        stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL, write_checksum=True).stream_writer(raw, closefd=False)
+    else:
+        stream = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL)
+    return io.TextIOWrapper(stream, encoding='utf-8')
+
+def write_entries(base, header, entries):
+    """Streams the header and entries into a new file that replaces the entry in one rename
+
+    A trailer line records the number of entries and a CRC32 of every line before it, which
+    iter_entries checks. Concurrent writers each replace the whole entry; use update_entries
+    to merge with what another writer saved.
+    """
+    path = cache_path(base)
+    with atomic_file(path, 'wb') as raw:
+        checksum = 0
+        count = 0
+        with _writer(raw) as f:
+            for item in itertools.chain([header], entries):
+                line = json.dumps(item) + '\n'
+                checksum = zlib.crc32(line.encode('utf-8'), checksum)
+                count += 1
+                f.write(line)
+            f.write(json.dumps({'checksum': checksum, 'lines': count}) + '\n')
+    # An older entry in the other codec would otherwise be found again after a codec change
+    for extension in EXTENSIONS.values():
+        if base + extension != path and os.path.exists(base + extension):
+            os.remove(base + extension)
+    return path
+
+def update_entries(base, merge):
+    """Read-merge-write of an entry under its lock, so concurrent writers never drop each other's work
+
+    merge(header, entries) gets the stored header and list of entries, (None, []) when there is no
+    readable entry, and returns the header and entries to write.
+    """
+    with file_lock(base):
+        header, entries = None, []
+        path = find_cache_file(base)
+        if path is not None:
+            try:
+                stored = iter_entries(path)
+                header = next(stored)
+                entries = list(stored)
+            except Exception as e:
+                print(f"Error reading {path}, replacing it: {e}")
+                header, entries = None, []
+        return write_entries(base, *merge(header, entries))
+
+def iter_entries(path):
+    """Yields the header, then each entry, decompressing and parsing one line at a time
+
+    Raises ValueError once the lines read do not match the trailer or the trailer is missing,
+    so a truncated or damaged entry is never taken for a complete one.
+    """
+    checksum = 0
+    count = 0
+    with _reader(path) as f:
+        for line in f:
+            item = json.loads(line)
+            if 'checksum' in item:
+                if item['checksum'] != checksum or item['lines'] != count:
+                    raise ValueError(f"Checksum mismatch in {path}")
+                return
+            checksum = zlib.crc32(line.encode('utf-8'), checksum)
+            count += 1
+            yield item
+    raise ValueError(f"Incomplete cache entry {path}")
@@ -1,13 +1,31 @@
 import os
-import json
+import functools
 from datetime import datetime, timedelta
 import pytz
-import pandas as pd
-from io import StringIO
+from cache_files import write_entries, update_entries, iter_entries, find_cache_file, remove_cache_files
+from perf import timed
+from metrics import CACHE_LOOKUPS
+
+def counts_lookups(kind):
+    """Counts a cache read as a hit when it returns anything but None"""
+    def decorator(method):
+        @functools.wraps(method)
+        def lookup(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            CACHE_LOOKUPS.inc(kind=kind, result='miss' if result is None else 'hit')
+            return result
+        return lookup
+    return decorator
 
 class CacheManager:
-    def __init__(self):
+    def __init__(self, provider=None, progress_tag=None):
         self.cache_dir = "cache"
+        # Results from offline providers must never be served as Yahoo results
+        self.provider = provider
+        self.namespace = "" if provider is None or provider.name == 'yahoo' else f"{provider.name}_"
+        # A background writer such as the pre-warm daemon checkpoints under its own keys, so it never
+        # resumes, replaces or clears the progress of an interactive scan; results are shared
+        self.progress_tag = progress_tag
         self.ensure_cache_directory()
         self.cleanup_old_cache()  # Add cache cleanup on initialization
 
@@ -20,6 +38,9 @@ class CacheManager:
         try:
             current_time = datetime.now()
             for file in os.listdir(self.cache_dir):
+                # Lock files stay, so two writers never lock different files for the same entry
+                if file.endswith('.lock'):
+                    continue
                 file_path = os.path.join(self.cache_dir, file)
                 file_modified = datetime.fromtimestamp(os.path.getmtime(file_path))
                 if (current_time - file_modified) > timedelta(hours=12):
@@ -28,7 +49,11 @@ class CacheManager:
             print(f"Error cleaning cache: {e}")
 
     def get_cache_key(self, pattern, interval, exchange):
-        return f"{pattern}_{interval}_{exchange}"
+        return f"{self.namespace}{pattern}_{interval}_{exchange}"
+
+    def get_data_key(self, interval, exchange):
+        """Multi-pattern scans store each ticker's data once per interval/exchange"""
+        return f"{self.namespace}{interval}_{exchange}_data"
 
     def get_next_expiry(self):
         ist = pytz.timezone('Asia/Kolkata')
@@ -44,70 +69,111 @@ class CacheManager:
         current_time = datetime.now(pytz.UTC)
         return current_time < expiry
 
+    def _progress_name(self, key):
+        return f"{key}_{self.progress_tag}_progress" if self.progress_tag else f"{key}_progress"
+
+    def _base(self, name):
+        """Cache entry path without the codec extension"""
+        return os.path.join(self.cache_dir, name)
+
+    def _entries(self, views, processed=None):
+        """One entry per ticker with its record and its position in each result list
+
+        views maps a list name (a pattern, 'matching_stocks' or 'stocks_with_issues') to records.
+        Tickers that were scanned without producing a record only carry the processed flag.
+        """
+        entries = {}
+        for view, records in views.items():
+            for position, record in enumerate(records):
+                entry = entries.setdefault(record['ticker'], {'ticker': record['ticker'], 'record': record, 'views': {}})
+                entry['views'][view] = position
+        for ticker in processed or ():
+            entries.setdefault(ticker, {'ticker': ticker})['processed'] = True
+        return list(entries.values())
+
+    def _write_views(self, name, header, views, processed=None):
+        write_entries(self._base(name), header, self._entries(views, processed))
+
+    def _merge_progress(self, name, header, views, processed, compatible):
+        """Saves a checkpoint merged with the one other scans of the same key wrote meanwhile
+
+        This scan's results replace the stored ones for the tickers it processed; the others keep
+        theirs, so two sessions scanning the same universe never lose each other's work.
+        """
+        def merge(stored_header, stored_entries):
+            if stored_header is None or not compatible(stored_header):
+                return header, self._entries(views, processed)
+            stored_views = {}
+            stored_processed = set()
+            for entry in stored_entries:
+                if entry.get('processed'):
+                    stored_processed.add(entry['ticker'])
+                for view, position in entry.get('views', {}).items():
+                    stored_views.setdefault(view, []).append((position, entry['record']))
+            merged = {}
+            for view in set(stored_views) | set(views):
+                kept = [record for _, record in sorted(stored_views.get(view, []), key=lambda item: item[0])
+                        if record['ticker'] not in processed]
+                merged[view] = kept + list(views.get(view, []))
+            all_processed = stored_processed | processed
+            merged_header = {**header, 'total_stocks': max(header['total_stocks'], stored_header.get('total_stocks', 0),
+                                                           len(all_processed))}
+            return merged_header, self._entries(merged, all_processed)
+        update_entries(self._base(name), merge)
+
+    def _checkpoint_is_fresh(self, header):
+        try:
+            return datetime.now(pytz.UTC) - datetime.fromisoformat(header['last_update']) <= timedelta(hours=12)
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    def _read_header(self, name):
+        """(path, header) of a cache entry, or (None, None) when there is none"""
+        path = find_cache_file(self._base(name))
+        if path is None:
+            return None, None
+        return path, next(iter_entries(path), None)
+
+    def _read_views(self, path):
+        """Header, {list name: records in their saved order} and the processed tickers of a cache entry"""
+        views = {}
+        processed = set()
+        with timed('cache_read'):
+            entries = iter_entries(path)
+            header = next(entries)
+            for entry in entries:
+                if entry.get('processed'):
+                    processed.add(entry['ticker'])
+                if 'record' not in entry:
+                    continue
+                # Each ticker's record is read once and shared by every list it is in
+                record = entry['record']
+                for view, position in entry['views'].items():
+                    views.setdefault(view, []).append((position, record))
+        views = {view: [record for _, record in sorted(items, key=lambda item: item[0])]
+                 for view, items in views.items()}
+        return header, views, processed
+
     def save_to_cache(self, pattern, interval, exchange, matching_stocks, stocks_with_issues):
         cache_key = self.get_cache_key(pattern, interval, exchange)
-        cache_file = os.path.join(self.cache_dir, f"{cache_key}.json")
-
-        # Convert stock data to serializable format
-        serialized_matching_stocks = []
-        for ticker, company_name, data in matching_stocks:
-            serialized_matching_stocks.append({
-                'ticker': ticker,
-                'company_name': company_name,
-                'data': data.to_json()
+        header = {'expiry': self.get_next_expiry().isoformat()}
+        with timed('cache_write'):
+            self._write_views(cache_key, header, {
+                'matching_stocks': list(matching_stocks),
+                'stocks_with_issues': list(stocks_with_issues)
             })
 
-        serialized_stocks_with_issues = []
-        for ticker, company_name, data in stocks_with_issues:
-            serialized_stocks_with_issues.append({
-                'ticker': ticker,
-                'company_name': company_name,
-                'data': data.to_json()
-            })
-
-        cache_data = {
-            'expiry': self.get_next_expiry().isoformat(),
-            'matching_stocks': serialized_matching_stocks,
-            'stocks_with_issues': serialized_stocks_with_issues
-        }
-
-        with open(cache_file, 'w') as f:
-            json.dump(cache_data, f)
-
+    @counts_lookups('results')
     def get_from_cache(self, pattern, interval, exchange):
         cache_key = self.get_cache_key(pattern, interval, exchange)
-        cache_file = os.path.join(self.cache_dir, f"{cache_key}.json")
-
-        if not os.path.exists(cache_file):
-            return None
 
         try:
-            with open(cache_file, 'r') as f:
-                cache_data = json.load(f)
-
-            if not self.is_cache_valid(cache_data):
+            path, header = self._read_header(cache_key)
+            if path is None or not self.is_cache_valid(header):
                 return None
 
-            # Convert cached data back to original format using StringIO
-            matching_stocks = []
-            for stock in cache_data['matching_stocks']:
-                data = pd.read_json(StringIO(stock['data']))
-                matching_stocks.append((
-                    stock['ticker'],
-                    stock['company_name'],
-                    data
-                ))
-
-            stocks_with_issues = []
-            for stock in cache_data['stocks_with_issues']:
-                data = pd.read_json(StringIO(stock['data']))
-                stocks_with_issues.append((
-                    stock['ticker'],
-                    stock['company_name'],
-                    data
-                ))
-
-            return matching_stocks, stocks_with_issues
+            _, views, _ = self._read_views(path)
+            return views.get('matching_stocks', []), views.get('stocks_with_issues', [])
 
         except Exception as e:
             print(f"Error reading cache: {e}")
@@ -120,86 +186,49 @@ class CacheManager:
             total_stocks = max(total_stocks, len(processed_set))
             
             cache_key = self.get_cache_key(pattern, interval, exchange)
-            progress_file = os.path.join(self.cache_dir, f"{cache_key}_progress.json")
-
-            progress_data = {
+            header = {
                 'last_update': datetime.now(pytz.UTC).isoformat(),
-                'total_stocks': total_stocks,
-                'processed_stocks': list(processed_set),  # Convert to list for JSON serialization
-                'matching_stocks': [
-                    {
-                        'ticker': ticker,
-                        'company_name': company_name,
-                        'data': data.to_json()
-                    }
-                    for ticker, company_name, data in matching_stocks
-                ],
-                'stocks_with_issues': [
-                    {
-                        'ticker': ticker,
-                        'company_name': company_name,
-                        'data': data.to_json()
-                    }
-                    for ticker, company_name, data in stocks_with_issues
-                ]
+                'total_stocks': total_stocks
             }
 
-            with open(progress_file, 'w') as f:
-                json.dump(progress_data, f)
+            with timed('checkpoint'):
+                self._merge_progress(self._progress_name(cache_key), header, {
+                    'matching_stocks': list(matching_stocks),
+                    'stocks_with_issues': list(stocks_with_issues)
+                }, processed_set, self._checkpoint_is_fresh)
         except Exception as e:
             print(f"Error saving progress: {e}")
 
+    @counts_lookups('progress')
     def get_progress_from_cache(self, pattern, interval, exchange):
         cache_key = self.get_cache_key(pattern, interval, exchange)
-        progress_file = os.path.join(self.cache_dir, f"{cache_key}_progress.json")
-
-        if not os.path.exists(progress_file):
-            return None
 
         try:
-            with open(progress_file, 'r') as f:
-                progress_data = json.load(f)
+            path, header = self._read_header(self._progress_name(cache_key))
+            if path is None:
+                return None
 
             # Validate cache data
-            required_keys = ['last_update', 'total_stocks', 'processed_stocks', 'matching_stocks', 'stocks_with_issues']
-            if not all(key in progress_data for key in required_keys):
+            required_keys = ['last_update', 'total_stocks']
+            if not header or not all(key in header for key in required_keys):
                 return None
 
-            last_update = datetime.fromisoformat(progress_data['last_update'])
+            last_update = datetime.fromisoformat(header['last_update'])
             if (datetime.now(pytz.UTC) - last_update) > timedelta(hours=12):
                 self.clear_progress_cache(pattern, interval, exchange)
                 return None
 
             # Validate total_stocks
-            if progress_data['total_stocks'] <= 0:
+            if header['total_stocks'] <= 0:
                 return None
 
-            matching_stocks = [
-                (
-                    stock['ticker'],
-                    stock['company_name'],
-                    pd.read_json(StringIO(stock['data']))
-                )
-                for stock in progress_data['matching_stocks']
-            ]
-
-            stocks_with_issues = [
-                (
-                    stock['ticker'],
-                    stock['company_name'],
-                    pd.read_json(StringIO(stock['data']))
-                )
-                for stock in progress_data['stocks_with_issues']
-            ]
-
-            # Ensure we don't have duplicate processed stocks
-            processed_stocks = set(progress_data['processed_stocks'])
-            total_stocks = max(progress_data['total_stocks'], len(processed_stocks))
+            _, views, processed_stocks = self._read_views(path)
+            total_stocks = max(header['total_stocks'], len(processed_stocks))
 
             return {
                 'processed_stocks': processed_stocks,
-                'matching_stocks': matching_stocks,
-                'stocks_with_issues': stocks_with_issues,
+                'matching_stocks': views.get('matching_stocks', []),
+                'stocks_with_issues': views.get('stocks_with_issues', []),
                 'total_stocks': total_stocks
             }
 
@@ -208,122 +237,192 @@ class CacheManager:
             self.clear_progress_cache(pattern, interval, exchange)
             return None
 
-    def clear_progress_cache(self, pattern, interval, exchange):
-        try:
-            cache_key = self.get_cache_key(pattern, interval, exchange)
-            for suffix in ['_progress.json', '_final.json']:
-                cache_file = os.path.join(self.cache_dir, f"{cache_key}{suffix}")
-                if os.path.exists(cache_file):
-                    os.remove(cache_file)
-        except Exception as e:
-            print(f"Error clearing cache: {e}")
-
     def save_final_results(self, pattern, interval, exchange, matching_stocks, stocks_with_issues, total_stocks):
         try:
             cache_key = self.get_cache_key(pattern, interval, exchange)
-            results_file = os.path.join(self.cache_dir, f"{cache_key}_final.json")
             
-            total_stocks = max(total_stocks, 
-                             len([t for t, _, _ in matching_stocks]) + 
-                             len([t for t, _, _ in stocks_with_issues]))
+            total_stocks = max(total_stocks, len(matching_stocks) + len(stocks_with_issues))
             
-            results_data = {
+            header = {
                 'timestamp': datetime.now(pytz.UTC).isoformat(),
-                'total_stocks': total_stocks,
-                'matching_stocks': [
-                    {
-                        'ticker': ticker,
-                        'company_name': company_name,
-                        'data': data.to_json()
-                    }
-                    for ticker, company_name, data in matching_stocks
-                ],
-                'stocks_with_issues': [
-                    {
-                        'ticker': ticker,
-                        'company_name': company_name,
-                        'data': data.to_json()
-                    }
-                    for ticker, company_name, data in stocks_with_issues
-                ]
+                'total_stocks': total_stocks
             }
             
             if not os.path.exists(self.cache_dir):
                 os.makedirs(self.cache_dir)
             
-            temp_file = os.path.join(self.cache_dir, f"{cache_key}_final.tmp")
-            with open(temp_file, 'w') as f:
-                json.dump(results_data, f)
-            
-            os.replace(temp_file, results_file)
+            with timed('cache_write'):
+                self._write_views(f"{cache_key}_final", header, {
+                    'matching_stocks': list(matching_stocks),
+                    'stocks_with_issues': list(stocks_with_issues)
+                })
             
             self.clear_progress_cache(pattern, interval, exchange)
             
         except Exception as e:
             print(f"Error saving final results: {e}")
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
 
+    @counts_lookups('final')
     def get_final_results(self, pattern, interval, exchange):
         try:
             cache_key = self.get_cache_key(pattern, interval, exchange)
-            results_file = os.path.join(self.cache_dir, f"{cache_key}_final.json")
+            path, header = self._read_header(f"{cache_key}_final")
             
-            if not os.path.exists(results_file):
+            if path is None:
+                # Fall back to this pattern's view of a multi-pattern scan
+                multi_results = self.get_multi_results([pattern], interval, exchange)
+                if multi_results:
+                    return {
+                        'matching_stocks': multi_results['pattern_matches'][pattern],
+                        'stocks_with_issues': multi_results['stocks_with_issues'],
+                        'total_stocks': multi_results['total_stocks']
+                    }
                 return None
-                
-            with open(results_file, 'r') as f:
-                results_data = json.load(f)
 
-            required_keys = ['timestamp', 'total_stocks', 'matching_stocks', 'stocks_with_issues']
-            if not all(key in results_data for key in required_keys):
-                os.remove(results_file)
+            required_keys = ['timestamp', 'total_stocks']
+            if not header or not all(key in header for key in required_keys):
+                os.remove(path)
                 return None
                 
-            timestamp = datetime.fromisoformat(results_data['timestamp'])
+            timestamp = datetime.fromisoformat(header['timestamp'])
             if (datetime.now(pytz.UTC) - timestamp) > timedelta(hours=12):
-                os.remove(results_file)
+                os.remove(path)
                 return None
                 
             try:
-                matching_stocks = [
-                    (
-                        stock['ticker'],
-                        stock['company_name'],
-                        pd.read_json(StringIO(stock['data']))
-                    )
-                    for stock in results_data['matching_stocks']
-                ]
-                
-                stocks_with_issues = [
-                    (
-                        stock['ticker'],
-                        stock['company_name'],
-                        pd.read_json(StringIO(stock['data']))
-                    )
-                    for stock in results_data['stocks_with_issues']
-                ]
+                _, views, _ = self._read_views(path)
                 
                 return {
-                    'matching_stocks': matching_stocks,
-                    'stocks_with_issues': stocks_with_issues,
-                    'total_stocks': results_data['total_stocks']
+                    'matching_stocks': views.get('matching_stocks', []),
+                    'stocks_with_issues': views.get('stocks_with_issues', []),
+                    'total_stocks': header['total_stocks']
                 }
             except Exception:
-                os.remove(results_file)
+                os.remove(path)
                 return None
                 
         except Exception as e:
             print(f"Error reading final results: {e}")
             return None
 
+    def matched_tickers(self, pattern, interval, exchange):
+        """Tickers matching a pattern in the last finished scan, streamed without building records"""
+        for name, view in ((f"{self.get_cache_key(pattern, interval, exchange)}_final", 'matching_stocks'),
+                           (self.get_data_key(interval, exchange), pattern)):
+            try:
+                path, header = self._read_header(name)
+                if path is None:
+                    continue
+                timestamp = datetime.fromisoformat(header['timestamp'])
+                if (datetime.now(pytz.UTC) - timestamp) > timedelta(hours=12):
+                    continue
+                entries = iter_entries(path)
+                next(entries)
+                return {entry['ticker'] for entry in entries if view in entry.get('views', {})}
+            except Exception as e:
+                print(f"Error reading cached matches: {e}")
+        return set()
+
     def clear_progress_cache(self, pattern, interval, exchange):
         try:
             cache_key = self.get_cache_key(pattern, interval, exchange)
-            progress_file = os.path.join(self.cache_dir, f"{cache_key}_progress.json")
-            
-            if os.path.exists(progress_file):
-                os.remove(progress_file)
+            remove_cache_files(self._base(self._progress_name(cache_key)))
                 
         except Exception as e:
-            print(f"Error clearing progress cache: {e}")
\ No newline at end of file
+            print(f"Error clearing progress cache: {e}")
+
+    def save_multi_progress(self, patterns, interval, exchange, processed_stocks, pattern_matches, stocks_with_issues, total_stocks):
+        try:
+            processed_set = set(processed_stocks)
+            header = {
+                'patterns': list(patterns),
+                'last_update': datetime.now(pytz.UTC).isoformat(),
+                'total_stocks': max(total_stocks, len(processed_set))
+            }
+            views = {pattern: pattern_matches.get(pattern, []) for pattern in patterns}
+            views['stocks_with_issues'] = stocks_with_issues
+
+            # Only checkpoints of the same pattern set are merged; another set's checkpoint is replaced
+            same_patterns = lambda stored: (set(stored.get('patterns', [])) == set(patterns)
+                                            and self._checkpoint_is_fresh(stored))
+            with timed('checkpoint'):
+                self._merge_progress(self._progress_name(self.get_data_key(interval, exchange)), header, views,
+                                     processed_set, same_patterns)
+        except Exception as e:
+            print(f"Error saving multi-pattern progress: {e}")
+
+    @counts_lookups('multi_progress')
+    def get_multi_progress(self, patterns, interval, exchange):
+        try:
+            path, header = self._read_header(self._progress_name(self.get_data_key(interval, exchange)))
+            if path is None:
+                return None
+
+            # A checkpoint is only reusable by a scan over the same pattern set
+            if set(header.get('patterns', [])) != set(patterns):
+                return None
+
+            last_update = datetime.fromisoformat(header['last_update'])
+            if (datetime.now(pytz.UTC) - last_update) > timedelta(hours=12):
+                self.clear_multi_progress(interval, exchange)
+                return None
+
+            _, views, processed_stocks = self._read_views(path)
+            return {
+                'processed_stocks': processed_stocks,
+                'pattern_matches': {pattern: views.get(pattern, []) for pattern in patterns},
+                'stocks_with_issues': views.get('stocks_with_issues', []),
+                'total_stocks': max(header['total_stocks'], len(processed_stocks))
+            }
+        except Exception as e:
+            print(f"Error reading multi-pattern progress: {e}")
+            self.clear_multi_progress(interval, exchange)
+            return None
+
+    def clear_multi_progress(self, interval, exchange):
+        try:
+            remove_cache_files(self._base(self._progress_name(self.get_data_key(interval, exchange))))
+        except Exception as e:
+            print(f"Error clearing multi-pattern progress: {e}")
+
+    def save_multi_results(self, patterns, interval, exchange, pattern_matches, stocks_with_issues, total_stocks):
+        try:
+            header = {
+                'patterns': list(patterns),
+                'timestamp': datetime.now(pytz.UTC).isoformat(),
+                'total_stocks': total_stocks
+            }
+            views = {pattern: pattern_matches.get(pattern, []) for pattern in patterns}
+            views['stocks_with_issues'] = stocks_with_issues
+            with timed('cache_write'):
+                self._write_views(self.get_data_key(interval, exchange), header, views)
+
+            self.clear_multi_progress(interval, exchange)
+        except Exception as e:
+            print(f"Error saving multi-pattern results: {e}")
+
+    @counts_lookups('multi_results')
+    def get_multi_results(self, patterns, interval, exchange):
+        """Per-pattern views of a finished multi-pattern scan covering all requested patterns"""
+        try:
+            path, header = self._read_header(self.get_data_key(interval, exchange))
+            if path is None:
+                return None
+
+            if not set(patterns) <= set(header.get('patterns', [])):
+                return None
+
+            timestamp = datetime.fromisoformat(header['timestamp'])
+            if (datetime.now(pytz.UTC) - timestamp) > timedelta(hours=12):
+                os.remove(path)
+                return None
+
+            _, views, _ = self._read_views(path)
+            return {
+                'pattern_matches': {pattern: views.get(pattern, []) for pattern in patterns},
+                'stocks_with_issues': views.get('stocks_with_issues', []),
+                'total_stocks': header['total_stocks']
+            }
+        except Exception as e:
+            print(f"Error reading multi-pattern results: {e}")
+            return None
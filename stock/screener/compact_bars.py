@@ -0,0 +1,83 @@
+import weakref
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+# Tickers scanned on the same interval mostly have identical bar times; they share one array
+_timestamp_pool = weakref.WeakValueDictionary()
+
+def _shared_timestamps(timestamps):
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    key = (len(timestamps), hash(timestamps.tobytes()))
+    shared = _timestamp_pool.get(key)
+    if shared is not None and np.array_equal(shared, timestamps):
+        return shared
+    timestamps = timestamps.copy()
+    timestamps.flags.writeable = False
+    _timestamp_pool[key] = timestamps
+    return timestamps
+
+class CompactBars:
+    """One ticker's OHLCV in plain arrays: float32 prices, integer volume, int64 epoch-ns timestamps
+
+    Results kept in session state and the cache only need to be shown, so they are held in
+    this form and turned back into a DataFrame when a table or chart is drawn. Timestamp
+    arrays are read-only and shared between tickers with the same bar times.
+    """
+
+    __slots__ = ('timestamps', 'prices', 'volume', 'tz')
+
+    def __init__(self, timestamps, prices, volume, tz='Asia/Kolkata'):
+        self.timestamps = timestamps
+        self.prices = prices
+        self.volume = volume
+        self.tz = tz
+
+    @staticmethod
+    def _volume_array(volume):
+        volume = np.nan_to_num(np.asarray(volume, dtype=float), nan=0.0)
+        # Per-bar volumes fit in 32 bits for almost every stock; keep 64 bits for the rest
+        if len(volume) and volume.max() >= np.iinfo(np.uint32).max:
+            return volume.astype(np.int64)
+        return volume.astype(np.uint32)
+
+    @classmethod
+    def from_frame(cls, data):
+        if isinstance(data, CompactBars):
+            return data
+        index = pd.DatetimeIndex(data.index)
+        if index.tz is None:
+            index = index.tz_localize('Asia/Kolkata')
+        epoch_ns = index.tz_convert('UTC').tz_localize(None).values.astype('datetime64[ns]').astype(np.int64)
+        return cls(
+            _shared_timestamps(epoch_ns),
+            np.ascontiguousarray(data[PRICE_COLUMNS].to_numpy(dtype=np.float32)),
+            cls._volume_array(data['Volume'] if 'Volume' in data.columns else np.zeros(len(data))),
+            str(index.tz)
+        )
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def empty(self):
+        return len(self.timestamps) == 0
+
+    def _slice(self, rows):
+        return CompactBars(self.timestamps[rows], self.prices[rows], self.volume[rows], self.tz)
+
+    def to_frame(self):
+        index = pd.DatetimeIndex(self.timestamps, tz='UTC').tz_convert(self.tz)
+        index.name = 'Datetime'
+        # Exchange prices are quoted in paise; rounding drops the float32 noise from the display
+        data = pd.DataFrame(np.round(self.prices.astype(float), 2), index=index, columns=PRICE_COLUMNS)
+        data['Volume'] = self.volume.astype(np.int64)
+        return data
+
+    def tail(self, n=5):
+        return self._slice(slice(max(len(self) - n, 0), None)).to_frame()
+
+def as_frame(data):
+    """DataFrame view of bars held either as a frame or as CompactBars"""
+    return data.to_frame() if isinstance(data, CompactBars) else data
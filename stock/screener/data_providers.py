@@ -0,0 +1,236 @@
+import os
+import zlib
+import argparse
+from abc import ABC, abstractmethod
+from datetime import date
+import numpy as np
+import pandas as pd
+from bar_store import BarStore, OHLCV_COLUMNS
+from resample import resample_ohlcv, BASE_INTERVALS
+
+# Selects the provider for the UI and headless scans: yahoo (default), local or synthetic
+PROVIDER_ENV = "SCREENER_PROVIDER"
+DATA_DIR_ENV = "SCREENER_DATA_DIR"
+
+class DataProvider(ABC):
+    """Where the screener gets its universe, its bars and its company metadata"""
+
+    name = "base"
+    # Bar store the pre-filter can read cheap facts from, if the provider has one
+    store = None
+
+    @abstractmethod
+    def list_universe(self, exchange="NSE"):
+        """Tickers of an exchange"""
+
+    @abstractmethod
+    def get_bars(self, ticker, interval):
+        """Returns (data, has_period_issues) like fetch_stock_data"""
+
+    def get_metadata(self, ticker):
+        return {'ticker': ticker, 'company_name': ticker.replace('.NS', '')}
+
+    def listing_dates(self):
+        return {}
+
+    def prepare(self, interval):
+        """Called once before a scan, e.g. to bring a local store up to date"""
+        pass
+
+    def prefetch(self, tickers, interval, should_stop=None, on_progress=None):
+        """Fetches a batch of tickers ahead of get_bars where that is cheaper; returns how many it fetched"""
+        return 0
+
+class YahooProvider(DataProvider):
+    """Yahoo Finance bars, the Yahoo/NSE ticker lists and NSE company names"""
+
+    name = "yahoo"
+
+    def __init__(self, store=None):
+        self.store = store or BarStore()
+        self._metadata = {}
+
+    def list_universe(self, exchange="NSE"):
+        from fetch_data import fetch_all_tickers
+        return fetch_all_tickers(exchange)
+
+    def get_bars(self, ticker, interval):
+        from fetch_data import fetch_stock_data
+        return fetch_stock_data(ticker, interval)
+
+    def prefetch(self, tickers, interval, should_stop=None, on_progress=None):
+        from fetch_data import prefetch_base_bars
+        return prefetch_base_bars(tickers, interval, self.store, should_stop, on_progress)
+
+    def get_metadata(self, ticker):
+        if ticker not in self._metadata:
+            from fetch_data import get_company_name
+            self._metadata[ticker] = {'ticker': ticker, 'company_name': get_company_name(ticker)}
+        return self._metadata[ticker]
+
+    def listing_dates(self):
+        from prefilter import load_listing_dates
+        return load_listing_dates()
+
+    def prepare(self, interval):
+        if interval == '1d':
+            from bhavcopy import refresh_daily_store
+            refresh_daily_store()
+
+class LocalFileProvider(DataProvider):
+    """Bars from a BarStore-layout directory of CSV or Parquet files, no network access
+
+    Each interval is read from its own directory when present, otherwise resampled from
+    its base interval. Company names come from an optional companies.csv (ticker,company_name).
+    """
+
+    name = "local"
+
+    def __init__(self, root="bar_store", fmt=None):
+        self.root = root
+        self.store = BarStore(root, fmt or self._detect_format(root))
+        self._metadata = None
+
+    @staticmethod
+    def _detect_format(root):
+        for _, _, files in os.walk(root):
+            if any(f.endswith('.parquet') for f in files):
+                return 'parquet'
+        return 'csv'
+
+    def list_universe(self, exchange="NSE"):
+        tickers = set()
+        if os.path.isdir(self.root):
+            for interval in os.listdir(self.root):
+                if os.path.isdir(os.path.join(self.root, interval)):
+                    tickers.update(self.store.tickers(interval))
+        if exchange.upper() == "NSE":
+            tickers = {t for t in tickers if t.endswith('.NS')}
+        return sorted(tickers)
+
+    def get_bars(self, ticker, interval):
+        return self.store.read_interval(ticker, interval), False
+
+    def get_metadata(self, ticker):
+        if self._metadata is None:
+            self._metadata = {}
+            companies_file = os.path.join(self.root, "companies.csv")
+            if os.path.exists(companies_file):
+                try:
+                    companies = pd.read_csv(companies_file)
+                    self._metadata = dict(zip(companies['ticker'], companies['company_name']))
+                except Exception as e:
+                    print(f"Error reading {companies_file}: {e}")
+        return {'ticker': ticker, 'company_name': self._metadata.get(ticker, ticker.replace('.NS', ''))}
+
+# Sessions generated per base interval, enough for every form interval's lookback
+SYNTHETIC_SESSIONS = {'15m': 22, '1d': 520}
+SYNTHETIC_END = date(2024, 12, 31)
+
+class SyntheticProvider(DataProvider):
+    """Deterministic random-walk universe for offline runs and repeatable benchmarks
+
+    Bars depend only on (seed, ticker), so every run sees the same data. A share of the
+    tickers goes quiet towards the end of the history, so the patterns do match some of them.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, n_tickers=500, seed=0, end=SYNTHETIC_END):
+        self.n_tickers = n_tickers
+        self.seed = seed
+        self.end = end
+
+    def list_universe(self, exchange="NSE"):
+        return [f"SYN{i:04d}.NS" for i in range(self.n_tickers)]
+
+    def _timestamps(self, base_interval):
+        sessions = pd.bdate_range(end=self.end, periods=SYNTHETIC_SESSIONS[base_interval], tz='Asia/Kolkata')
+        if base_interval == '1d':
+            return sessions
+        # 25 fifteen-minute bars from 09:15 to 15:15
+        offsets = pd.to_timedelta(9 * 60 + 15 + 15 * np.arange(25), unit='min')
+        return pd.DatetimeIndex([day + offset for day in sessions for offset in offsets])
+
+    def base_bars(self, ticker, base_interval):
+        index = self._timestamps(base_interval)
+        n = len(index)
+        rng = np.random.default_rng([self.seed, zlib.crc32(ticker.encode())])
+
+        daily_vol = rng.uniform(0.01, 0.035)
+        vol = daily_vol / (5.0 if base_interval == '15m' else 1.0)
+        sigma = np.full(n, vol)
+        if rng.random() < 0.3:
+            # Volatility contraction over the last part of the history
+            quiet = int(n * rng.uniform(0.1, 0.3))
+            sigma[n - quiet:] *= np.linspace(0.6, 0.15, quiet)
+
+        returns = rng.normal(rng.normal(0, vol / 20), sigma)
+        close = rng.uniform(50, 3000) * np.exp(np.cumsum(returns))
+        open_ = np.r_[close[0], close[:-1]] * np.exp(rng.normal(0, sigma / 4))
+        wick = np.abs(rng.normal(0, sigma / 2, size=(2, n)))
+        high = np.maximum(open_, close) * (1 + wick[0])
+        low = np.minimum(open_, close) * (1 - wick[1])
+        volume = rng.lognormal(np.log(rng.uniform(2e4, 2e6)), 0.5, n) * (sigma / vol) ** 0.5
+
+        bars = pd.DataFrame({
+            'Open': open_, 'High': high, 'Low': low, 'Close': close,
+            'Volume': volume.astype(np.int64)
+        }, index=index)
+        bars.index.name = 'Datetime'
+        return bars
+
+    def get_bars(self, ticker, interval):
+        base_interval = BASE_INTERVALS.get(interval)
+        if base_interval is None:
+            return pd.DataFrame(columns=OHLCV_COLUMNS), False
+        data = self.base_bars(ticker, base_interval)
+        if interval != base_interval:
+            data = resample_ohlcv(data, interval)
+        return data, False
+
+    def get_metadata(self, ticker):
+        return {'ticker': ticker, 'company_name': f"Synthetic {ticker.replace('.NS', '')}"}
+
+PROVIDERS = {
+    'yahoo': YahooProvider,
+    'local': LocalFileProvider,
+    'synthetic': SyntheticProvider
+}
+
+def get_provider(name=None, data_dir=None, **kwargs):
+    """Provider by name, falling back to $SCREENER_PROVIDER and then Yahoo"""
+    name = (name or os.environ.get(PROVIDER_ENV) or 'yahoo').lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown data provider '{name}', expected one of {', '.join(PROVIDERS)}")
+    if name == 'local':
+        kwargs.setdefault('root', data_dir or os.environ.get(DATA_DIR_ENV) or "bar_store")
+    return PROVIDERS[name](**kwargs)
+
+def materialize(provider, root, intervals=('15m', '1d'), fmt='csv', exchange="NSE"):
+    """Writes a provider's universe into a directory the local provider can read back"""
+    store = BarStore(root, fmt)
+    tickers = provider.list_universe(exchange)
+    for ticker in tickers:
+        for interval in intervals:
+            data, _ = provider.get_bars(ticker, interval)
+            if not data.empty:
+                store.write(ticker, interval, data)
+    pd.DataFrame({
+        'ticker': tickers,
+        'company_name': [provider.get_metadata(t)['company_name'] for t in tickers]
+    }).to_csv(os.path.join(root, "companies.csv"), index=False)
+    return len(tickers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic universe to disk for offline scans")
+    parser.add_argument("root", help="output directory, readable with --provider local --data-dir")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--interval", action="append", dest="intervals", choices=sorted(SYNTHETIC_SESSIONS))
+    parser.add_argument("--format", default="csv", choices=['csv', 'parquet'])
+    args = parser.parse_args()
+
+    count = materialize(SyntheticProvider(args.tickers, args.seed), args.root,
+                        args.intervals or ['15m', '1d'], args.format)
+    print(f"Wrote {count} synthetic tickers to {args.root}")
@@ -0,0 +1,186 @@
+import os
+import time
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+import kernels
+from bar_store import STORE_FORMATS
+from atomic_io import atomic_file
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+FEATURE_DIR = "metadata"
+# Indicator features at the last candle; every column is a plain float so any filter expression works on it
+FEATURE_COLUMNS = [
+    'close', 'avg_volume', 'bar_count',
+    'atr14', 'atr14_pct', 'ema20_distance', 'range45_pct',
+    'volume_ratio_20_120', 'max_impulse', 'drawdown_100'
+]
+IMPULSE_BARS = 39
+
+def _last(values):
+    return float(values[-1]) if len(values) else np.nan
+
+def compute_features(data):
+    """Feature row for the last candle of a history; windows longer than the history give NaN"""
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+    close = data['Close'].to_numpy(dtype=float)
+    volume = data['Volume'].to_numpy(dtype=float)
+    atr14 = _last(kernels.atr(high, low, close, 14))
+    ema20 = _last(kernels.ema(close, 20))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.abs(np.diff(close, prepend=np.nan) / np.r_[np.nan, close[:-1]])
+        features = {
+            'close': close[-1],
+            'avg_volume': _last(kernels.rolling_mean(volume, min(20, len(volume)))),
+            'bar_count': float(len(data)),
+            'atr14': atr14,
+            'atr14_pct': atr14 / close[-1],
+            'ema20_distance': (close[-1] - ema20) / ema20,
+            'range45_pct': _last(kernels.range_pct(high, low, close, 45)),
+            'volume_ratio_20_120': (_last(kernels.rolling_mean(volume, 20)) /
+                                    _last(kernels.rolling_mean(volume, 120))),
+            'max_impulse': _last(kernels.rolling_max(returns, IMPULSE_BARS)),
+            'drawdown_100': 1 - close[-1] / _last(kernels.rolling_max(high, 100))
+        }
+    return {name: float(value) for name, value in features.items()}
+
+class FeatureStore:
+    """Per-ticker feature table of one interval, indexed by ticker
+
+    Rows are recomputed only when a fetch brings a newer last candle, so keeping the table
+    current costs one feature row per new bar. The table is stored as one Parquet or CSV file.
+    """
+
+    def __init__(self, interval, root=FEATURE_DIR, fmt=None):
+        self.interval = interval
+        self.root = root
+        if fmt is None:
+            fmt = 'parquet' if os.path.exists(self._path('parquet')) else 'csv'
+        if fmt not in STORE_FORMATS:
+            raise ValueError(f"Unknown feature store format '{fmt}', expected one of {', '.join(STORE_FORMATS)}")
+        self.fmt = fmt
+        self.rows = self._load()
+        self.dirty = False
+        self._frame = None
+        self._sqlite = None
+
+    def _path(self, fmt=None):
+        extension = 'parquet' if (fmt or self.fmt) == 'parquet' else 'csv'
+        return os.path.join(self.root, f"features_{self.interval}.{extension}")
+
+    def _load(self):
+        path = self._path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            table = pd.read_parquet(path) if self.fmt == 'parquet' else pd.read_csv(path, index_col='ticker')
+            return table.to_dict('index')
+        except Exception as e:
+            print(f"Error reading feature store: {e}")
+            return {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def update(self, ticker, data):
+        """Refreshes a ticker's row when the history has a newer last candle; returns True when it did"""
+        if data is None or data.empty:
+            return False
+        last_bar = pd.Timestamp(data.index[-1]).isoformat()
+        if self.rows.get(ticker, {}).get('last_bar') == last_bar:
+            return False
+        self.rows[ticker] = {**compute_features(data), 'last_bar': last_bar}
+        self.dirty = True
+        self._frame = None
+        self._sqlite = None
+        return True
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            table = self.frame()
+            if self.fmt == 'parquet':
+                with atomic_file(self._path(), 'wb') as f:
+                    table.to_parquet(f)
+            else:
+                with atomic_file(self._path(), 'w', newline='') as f:
+                    table.to_csv(f, index_label='ticker')
+            self.dirty = False
+        except Exception as e:
+            print(f"Error saving feature store: {e}")
+
+    def frame(self):
+        if self._frame is None:
+            self._frame = pd.DataFrame.from_dict(self.rows, orient='index', columns=FEATURE_COLUMNS + ['last_bar'])
+            self._frame = self._frame.astype({column: float for column in FEATURE_COLUMNS})
+            self._frame.index.name = 'ticker'
+        return self._frame
+
+    def query(self, expression, sort_by=None, ascending=False, limit=None):
+        """Rows matching a pandas filter expression, e.g. "range45_pct < 0.12 and volume_ratio_20_120 < 0.8" """
+        result = self.frame().query(expression) if expression and expression.strip() else self.frame()
+        if sort_by:
+            result = result.sort_values(sort_by, ascending=ascending)
+        return result.head(limit) if limit else result
+
+    def sql(self, statement):
+        """Runs SQL against a 'features' table with DuckDB when installed, otherwise in-memory SQLite"""
+        table = self.frame().reset_index()
+        if duckdb is not None:
+            connection = duckdb.connect()
+            connection.register('features', table)
+            return connection.execute(statement).df()
+        if self._sqlite is None:
+            # Rebuilt only after an update, so repeated screens reuse the loaded table
+            self._sqlite = sqlite3.connect(":memory:", check_same_thread=False)
+            table.to_sql('features', self._sqlite, index=False)
+        return pd.read_sql_query(statement, self._sqlite)
+
+    def screen(self, expression):
+        """SQL for statements starting with SELECT, a pandas filter expression otherwise"""
+        if expression.strip().lower().startswith(('select', 'with')):
+            return self.sql(expression)
+        return self.query(expression)
+
+def build(store, provider, tickers):
+    """Fills a feature store from a provider's bars; with the local provider nothing is downloaded"""
+    updated = 0
+    for ticker in tickers:
+        data, _ = provider.get_bars(ticker, store.interval)
+        updated += store.update(ticker, data)
+    store.save()
+    return updated
+
+if __name__ == "__main__":
+    from data_providers import get_provider, PROVIDERS
+
+    parser = argparse.ArgumentParser(description="Build or query the per-ticker feature table")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("expression", nargs="?", default="",
+                        help="pandas filter expression or a SELECT over the 'features' table")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--root", default=FEATURE_DIR)
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default="local")
+    parser.add_argument("--data-dir", help="directory read by the local provider")
+    parser.add_argument("--exchange", default="NSE")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.interval, args.root)
+    if args.command == "build":
+        provider = get_provider(args.provider, data_dir=args.data_dir)
+        started = time.perf_counter()
+        updated = build(store, provider, provider.list_universe(args.exchange))
+        print(f"Updated {updated} of {len(store)} tickers in {time.perf_counter() - started:.1f}s")
+    else:
+        started = time.perf_counter()
+        result = store.screen(args.expression)
+        elapsed = time.perf_counter() - started
+        print(result.to_string())
+        print(f"{len(result)} of {len(store)} tickers in {elapsed * 1000:.1f}ms")
@@ -1,9 +1,15 @@
-from bs4 import BeautifulSoup
-import yfinance as yf
 import pandas as pd
 import json
 from datetime import datetime, timedelta
-import requests
+from bhavcopy import load_daily_bars, current_daily_bars, load_state
+from bar_store import BarStore
+from resample import resample_ohlcv, BASE_INTERVALS
+from perf import timed, count
+from metrics import FETCH_REQUESTS, FETCH_RETRIES, PERIOD_FALLBACKS, FETCH_ERRORS
+import async_fetch
+
+# Seconds before a blocking request gives up, so one hung server cannot stall a scan
+REQUEST_TIMEOUT = 10
 
 def get_all_nse_stocks():
     try:
@@ -79,7 +85,9 @@ def fetch_all_tickers(exchange_filter="NSE"):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
         
-        response = requests.get(url, params=params, headers=headers)
+        import requests
+        with timed('http.ticker_list'):
+            response = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         json_data = json.loads(response.text)
         
         stocks = []
@@ -126,6 +134,7 @@ def fetch_all_tickers(exchange_filter="NSE"):
             "LXCHEM.NS", "KIMS.NS", "CAMPUS.NS", "MEDPLUS.NS", "LATENTVIEW.NS"
         ]
     except Exception as e:
+        FETCH_ERRORS.inc(stage='ticker_list')
         print(f"Error fetching stock list: {e}")
         if exchange_filter.upper() == "NSE":
             nse_stocks = get_all_nse_stocks()
@@ -134,61 +143,155 @@ def fetch_all_tickers(exchange_filter="NSE"):
             return get_nifty50_stocks()
         return []
 
+# Yahoo periods tried in order for each stored base interval; coarser intervals are resampled locally
+BASE_PERIODS = {
+    '15m': ['1mo', '5d', '1d'],
+    '1d': ['2y', '1y', '6mo', '3mo', '1mo', '5d', 'ytd', 'max']
+}
+
+# History handed to detection per form interval, in calendar days
+PERIOD_DAYS = {'15m': 30, '30m': 30, '1h': 30, '1d': 183, '5d': 730}
+
+# How long stored base bars are reused before asking Yahoo again
+BASE_TTL = {'15m': timedelta(minutes=15), '1d': timedelta(hours=12)}
+
+def download_history(ticker, interval, periods_to_try):
+    # yfinance takes longer to import than the rest of the screener; scans served from the store never need it
+    import yfinance as yf
+    stock = yf.Ticker(ticker)
+
+    data = pd.DataFrame()
+    period_errors = []
+    has_period_issues = False
+    
+    for attempt, period in enumerate(periods_to_try):
+        if attempt:
+            FETCH_RETRIES.inc(interval=interval)
+        try:
+            with timed('http.history'):
+                # Split-adjusted but not dividend-adjusted, the basis of the async fetch and the bhavcopy store
+                temp_data = stock.history(period=period, interval=interval, auto_adjust=False)
+            if not temp_data.empty:
+                data = temp_data
+                if period != periods_to_try[0]:
+                    count('fetch.period_fallback')
+                    PERIOD_FALLBACKS.inc(interval=interval)
+                    has_period_issues = True
+                break
+        except Exception as e:
+            FETCH_ERRORS.inc(stage='history')
+            error_str = str(e)
+            period_errors.append(f"Period '{period}': {error_str}")
+            if "Period" in error_str and "is invalid" in error_str:
+                has_period_issues = True
+            continue
+    
+    if period_errors:
+        has_period_issues = True
+
+    return data, has_period_issues
+
+def get_base_bars(ticker, base_interval, period_days, store=None):
+    store = store or BarStore()
+
+    if base_interval == '1d':
+        # Daily bars come from the bhavcopy-fed local store when it is up to date
+        stored = load_daily_bars(ticker, period_days=period_days, store=store)
+        if stored is not None and not stored.empty:
+            count('fetch.store_hit')
+            FETCH_REQUESTS.inc(interval=base_interval, source='bhavcopy')
+            return stored, False
+
+    fetched_at = store.fetched_at(ticker, base_interval)
+    if fetched_at and datetime.now() - fetched_at < BASE_TTL[base_interval]:
+        count('fetch.store_hit')
+        FETCH_REQUESTS.inc(interval=base_interval, source='store')
+        return store.read(ticker, base_interval), False
+
+    count('fetch.download')
+    FETCH_REQUESTS.inc(interval=base_interval, source='download')
+    data, has_period_issues = download_history(ticker, base_interval, BASE_PERIODS[base_interval])
+    if data.empty:
+        return data, has_period_issues
+    # Merged into the store, so intraday history keeps growing past Yahoo's lookback limit
+    return store.append(ticker, base_interval, data), has_period_issues
+
+def prefetch_base_bars(tickers, interval, store=None, should_stop=None, on_progress=None):
+    """Downloads the stale base bars of many tickers concurrently into the store; returns how many were stored
+
+    The fetch_stock_data calls that follow then find fresh bars in the store. Without aiohttp
+    nothing is prefetched and every ticker is still downloaded on its own.
+    """
+    base_interval = BASE_INTERVALS.get(interval)
+    if base_interval is None or async_fetch.aiohttp is None:
+        return 0
+    store = store or BarStore()
+
+    daily_state = load_state() if base_interval == '1d' else None
+    now = datetime.now()
+    stale = []
+    for ticker in tickers:
+        if daily_state is not None and current_daily_bars(ticker, store, daily_state) is not None:
+            continue
+        fetched_at = store.fetched_at(ticker, base_interval)
+        if fetched_at and now - fetched_at < BASE_TTL[base_interval]:
+            continue
+        stale.append(ticker)
+    if not stale:
+        return 0
+
+    histories = async_fetch.fetch_histories(stale, base_interval, BASE_PERIODS[base_interval],
+                                            should_stop=should_stop, on_progress=on_progress)
+    stored = 0
+    for ticker, (data, has_period_issues) in histories.items():
+        # Fallback periods are left to fetch_stock_data, which reports them as period issues
+        if data.empty or has_period_issues:
+            continue
+        store.append(ticker, base_interval, data)
+        stored += 1
+    count('fetch.prefetched', stored)
+    return stored
+
 def fetch_stock_data(ticker, interval='1h'):
     try:
-        stock = yf.Ticker(ticker)
-        
-        interval_config = {
-            '15m': ['5d', '1d'],      
-            '30m': ['5d', '5d', '1d'],      
-            '1h': ['1mo', '5d', '1d'],
-            '1d': ['6mo', '3mo', '1mo', '5d', '1d', 'ytd', 'max'],
-            '5d': ['2y', '1y', '6mo', '3mo', '1mo', 'ytd', 'max']
-        }
-        
-        periods_to_try = interval_config.get(interval, ['1mo', '5d', '1d'])
-        
-        data = pd.DataFrame()
-        period_errors = []
-        has_period_issues = False
-        
-        for period in periods_to_try:
-            try:
-                temp_data = stock.history(period=period, interval=interval)
-                if not temp_data.empty:
-                    data = temp_data
-                    if period != periods_to_try[0]:
-                        has_period_issues = True
-                    break
-            except Exception as e:
-                error_str = str(e)
-                period_errors.append(f"Period '{period}': {error_str}")
-                if "Period" in error_str and "is invalid" in error_str:
-                    has_period_issues = True
-                continue
-        
-        if period_errors:
-            has_period_issues = True
+        base_interval = BASE_INTERVALS.get(interval)
+        if base_interval is None:
+            FETCH_REQUESTS.inc(interval=interval, source='download')
+            data, has_period_issues = download_history(ticker, interval, ['1mo', '5d', '1d'])
+            return data, has_period_issues
+
+        period_days = PERIOD_DAYS[interval]
+        data, has_period_issues = get_base_bars(ticker, base_interval, period_days)
         
         if data.empty:
             return pd.DataFrame(), has_period_issues
-            
-        return data, has_period_issues
+
+        if interval != base_interval:
+            with timed('fetch.resample'):
+                data = resample_ohlcv(data, interval)
+
+        cutoff = data.index[-1] - pd.Timedelta(days=period_days)
+        return data[data.index > cutoff], has_period_issues
 
     except Exception as e:
+        FETCH_ERRORS.inc(stage='fetch_stock_data')
         print(f"Error fetching data for {ticker}: {e}")
         return pd.DataFrame(), False
 
 def get_company_name(ticker):
     try:
+        import requests
+        from bs4 import BeautifulSoup
         symbol = ticker.replace('.NS', '')
         url = f"https://www1.nseindia.com/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp?symbol={symbol}"
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
-        response = requests.get(url, headers=headers)
+        with timed('http.company_name'):
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
         soup = BeautifulSoup(response.content, 'html.parser')
         company_name = soup.find('h2').text.strip()
         return company_name
     except:
+        FETCH_ERRORS.inc(stage='company_name')
         return ticker.replace('.NS', '')
\ No newline at end of file
@@ -0,0 +1,236 @@
+import os
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# SCREENER_KERNELS=numpy forces the NumPy kernels even when numba is installed
+KERNELS_ENV = "SCREENER_KERNELS"
+
+# Inner loops of the pattern indicators. Every kernel takes and returns float64 arrays, leaves the first
+# window-1 values NaN and propagates NaN inside a window, matching the pandas rolling calls they replace.
+# The EMA matches ewm(adjust=False) on NaN-free input only; providers drop bars without prices.
+
+def _leading_nan(values, n, length):
+    result = np.full(length, np.nan)
+    if length >= n:
+        result[n - 1:] = values
+    return result
+
+def _true_range_np(high, low, close):
+    prev_close = np.r_[np.nan, close[:-1]]
+    return np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+def _rolling_sum_np(values, n):
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0))
+    gaps = np.cumsum(~valid)
+    if len(values) < n:
+        return np.full(len(values), np.nan)
+    window_sums = sums[n - 1:] - np.r_[0.0, sums[:-n]]
+    window_gaps = gaps[n - 1:] - np.r_[0, gaps[:-n]]
+    return _leading_nan(np.where(window_gaps == 0, window_sums, np.nan), n, len(values))
+
+def _rolling_mean_np(values, n):
+    return _rolling_sum_np(values, n) / n
+
+def _rolling_max_np(values, n):
+    if len(values) < n:
+        return np.full(len(values), np.nan)
+    return _leading_nan(sliding_window_view(values, n).max(axis=1), n, len(values))
+
+def _rolling_min_np(values, n):
+    if len(values) < n:
+        return np.full(len(values), np.nan)
+    return _leading_nan(sliding_window_view(values, n).min(axis=1), n, len(values))
+
+def _atr_np(high, low, close, n):
+    return _rolling_mean_np(_true_range_np(high, low, close), n)
+
+def _ema_np(values, span):
+    """EMA with adjust=False, solved in closed form over blocks short enough to stay well conditioned"""
+    length = len(values)
+    result = np.empty(length)
+    if length == 0:
+        return result
+    alpha = 2.0 / (span + 1)
+    decay = 1.0 - alpha
+    # decay ** -block stays below 1e3, which bounds the cancellation error of the closed form
+    block = max(1, int(math.log(1e3) / -math.log(decay))) if decay > 0 else length
+    carry = values[0]
+    for start in range(0, length, block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        # E[k] = decay^(k+1) * carry + alpha * sum_j decay^(k-j) * x[j]
+        weighted = np.cumsum(chunk / powers * decay)
+        result[start:start + len(chunk)] = powers * carry + alpha * powers / decay * weighted
+        carry = result[start + len(chunk) - 1]
+    return result
+
+def _range_pct_np(high, low, close, n):
+    return (_rolling_max_np(high, n) - _rolling_min_np(low, n)) / _rolling_mean_np(close, n)
+
+NUMPY_KERNELS = {
+    'true_range': _true_range_np,
+    'rolling_sum': _rolling_sum_np,
+    'rolling_mean': _rolling_mean_np,
+    'rolling_max': _rolling_max_np,
+    'rolling_min': _rolling_min_np,
+    'atr': _atr_np,
+    'ema': _ema_np,
+    'range_pct': _range_pct_np
+}
+
+# Single-pass loops for numba. Rolling extremes use a monotonic deque, so every candle is touched once.
+
+def _true_range_at(high, low, close, i):
+    if i == 0:
+        return np.nan
+    spread = high[i] - low[i]
+    up = abs(high[i] - close[i - 1])
+    down = abs(low[i] - close[i - 1])
+    # np.maximum propagates NaN, plain comparisons would not
+    if np.isnan(spread) or np.isnan(up) or np.isnan(down):
+        return np.nan
+    return max(spread, up, down)
+
+def _true_range_loop(high, low, close):
+    result = np.empty(len(high))
+    for i in range(len(high)):
+        result[i] = _true_range_at(high, low, close, i)
+    return result
+
+def _rolling_sum_loop(values, n):
+    result = np.full(len(values), np.nan)
+    total = 0.0
+    gaps = 0
+    for i in range(len(values)):
+        if np.isnan(values[i]):
+            gaps += 1
+        else:
+            total += values[i]
+        if i >= n:
+            if np.isnan(values[i - n]):
+                gaps -= 1
+            else:
+                total -= values[i - n]
+        if i >= n - 1 and gaps == 0:
+            result[i] = total
+    return result
+
+def _rolling_mean_loop(values, n):
+    return _rolling_sum_loop(values, n) / n
+
+def _rolling_extreme_loop(values, n, sign):
+    # sign 1.0 keeps the maximum, -1.0 the minimum
+    length = len(values)
+    result = np.full(length, np.nan)
+    queue = np.empty(length, dtype=np.int64)
+    head = 0
+    tail = 0
+    last_nan = -n
+    for i in range(length):
+        value = values[i]
+        if np.isnan(value):
+            last_nan = i
+        else:
+            while tail > head and sign * values[queue[tail - 1]] <= sign * value:
+                tail -= 1
+            queue[tail] = i
+            tail += 1
+        while tail > head and queue[head] <= i - n:
+            head += 1
+        if i >= n - 1 and i - last_nan >= n:
+            result[i] = values[queue[head]]
+    return result
+
+def _rolling_max_loop(values, n):
+    return _rolling_extreme_loop(values, n, 1.0)
+
+def _rolling_min_loop(values, n):
+    return _rolling_extreme_loop(values, n, -1.0)
+
+def _atr_loop(high, low, close, n):
+    # True range and its rolling mean fused into one pass
+    length = len(high)
+    result = np.full(length, np.nan)
+    ranges = np.empty(length)
+    total = 0.0
+    gaps = 0
+    for i in range(length):
+        ranges[i] = _true_range_at(high, low, close, i)
+        if np.isnan(ranges[i]):
+            gaps += 1
+        else:
+            total += ranges[i]
+        if i >= n:
+            if np.isnan(ranges[i - n]):
+                gaps -= 1
+            else:
+                total -= ranges[i - n]
+        if i >= n - 1 and gaps == 0:
+            result[i] = total / n
+    return result
+
+def _ema_loop(values, span):
+    alpha = 2.0 / (span + 1)
+    result = np.empty(len(values))
+    if len(values) == 0:
+        return result
+    result[0] = values[0]
+    for i in range(1, len(values)):
+        result[i] = alpha * values[i] + (1.0 - alpha) * result[i - 1]
+    return result
+
+def _range_pct_loop(high, low, close, n):
+    return (_rolling_extreme_loop(high, n, 1.0) - _rolling_extreme_loop(low, n, -1.0)) / _rolling_mean_loop(close, n)
+
+NUMBA_KERNELS = {}
+if numba is not None:
+    _jit = numba.njit(cache=True)
+    _true_range_at = _jit(_true_range_at)
+    _true_range_loop = _jit(_true_range_loop)
+    _rolling_sum_loop = _jit(_rolling_sum_loop)
+    _rolling_mean_loop = _jit(_rolling_mean_loop)
+    _rolling_extreme_loop = _jit(_rolling_extreme_loop)
+    _rolling_max_loop = _jit(_rolling_max_loop)
+    _rolling_min_loop = _jit(_rolling_min_loop)
+    _atr_loop = _jit(_atr_loop)
+    _ema_loop = _jit(_ema_loop)
+    _range_pct_loop = _jit(_range_pct_loop)
+
+    NUMBA_KERNELS = {
+        'true_range': _true_range_loop,
+        'rolling_sum': _rolling_sum_loop,
+        'rolling_mean': _rolling_mean_loop,
+        'rolling_max': _rolling_max_loop,
+        'rolling_min': _rolling_min_loop,
+        'atr': _atr_loop,
+        'ema': _ema_loop,
+        'range_pct': _range_pct_loop
+    }
+
+def available_backends():
+    return ['numba', 'numpy'] if NUMBA_KERNELS else ['numpy']
+
+def use_backend(name):
+    """Rebinds the public kernels to one backend; callers look them up on this module at call time"""
+    global BACKEND, true_range, rolling_sum, rolling_mean, rolling_max, rolling_min, atr, ema, range_pct
+    if name not in available_backends():
+        raise ValueError(f"Kernel backend '{name}' is not available")
+    kernels = NUMBA_KERNELS if name == 'numba' else NUMPY_KERNELS
+    BACKEND = name
+    true_range = kernels['true_range']
+    rolling_sum = kernels['rolling_sum']
+    rolling_mean = kernels['rolling_mean']
+    rolling_max = kernels['rolling_max']
+    rolling_min = kernels['rolling_min']
+    atr = kernels['atr']
+    ema = kernels['ema']
+    range_pct = kernels['range_pct']
+
+use_backend('numba' if NUMBA_KERNELS and os.environ.get(KERNELS_ENV, '').lower() != 'numpy' else 'numpy')
@@ -0,0 +1,308 @@
+import time
+import argparse
+from datetime import datetime, timedelta
+import pandas as pd
+import pytz
+from pattern_detection import detect_patterns
+from bar_store import BarStore, OHLCV_COLUMNS
+from resample import BASE_INTERVALS
+import kernels
+
+IST = pytz.timezone('Asia/Kolkata')
+
+# Bar length in minutes for the intervals that support live mode
+INTRADAY_INTERVALS = {'15m': 15, '30m': 30, '1h': 60}
+
+SESSION_OPEN = (9, 15)
+SESSION_CLOSE = (15, 30)
+
+# Bars kept per ticker; detection never looks further back than 120 candles
+WINDOW_BARS = 200
+
+def session_bounds(day):
+    open_time = IST.localize(datetime(day.year, day.month, day.day, *SESSION_OPEN))
+    close_time = IST.localize(datetime(day.year, day.month, day.day, *SESSION_CLOSE))
+    return open_time, close_time
+
+def bar_close_times(day, interval):
+    """Bar close times of one NSE session, the last bar being cut at 15:30"""
+    minutes = INTRADAY_INTERVALS[interval]
+    open_time, close_time = session_bounds(day)
+    closes = []
+    current = open_time + timedelta(minutes=minutes)
+    while current < close_time:
+        closes.append(current)
+        current += timedelta(minutes=minutes)
+    closes.append(close_time)
+    return closes
+
+def next_bar_close(now, interval):
+    now = now.astimezone(IST)
+    day = now.date()
+    while True:
+        if day.weekday() < 5:
+            for close in bar_close_times(day, interval):
+                if close > now:
+                    return close
+        day += timedelta(days=1)
+
+def completed_bars(bars, interval, close_time):
+    """Drop the bar still forming at close_time"""
+    if bars.empty:
+        return bars
+    minutes = INTRADAY_INTERVALS[interval]
+    starts = bars.index.tz_convert(IST) if bars.index.tz is not None else bars.index.tz_localize(IST)
+    ends = starts + pd.Timedelta(minutes=minutes)
+    session_ends = starts.normalize() + pd.Timedelta(hours=SESSION_CLOSE[0], minutes=SESSION_CLOSE[1])
+    ends = ends.where(ends <= session_ends, session_ends)
+    return bars[ends <= close_time]
+
+class BarCloseScheduler:
+    """Wakes up shortly after each bar close; settle_seconds gives the feed time to publish the bar"""
+
+    def __init__(self, interval, settle_seconds=5, clock=None, sleep=None):
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.clock = clock or (lambda: datetime.now(IST))
+        self.sleep = sleep or time.sleep
+
+    def wait_for_next_close(self, should_stop=None, on_tick=None):
+        close_time = next_bar_close(self.clock(), self.interval)
+        wake_time = close_time + timedelta(seconds=self.settle_seconds)
+        while True:
+            remaining = (wake_time - self.clock()).total_seconds()
+            if remaining <= 0:
+                return close_time
+            if should_stop and should_stop():
+                return None
+            if on_tick:
+                on_tick(close_time, remaining)
+            # Short naps keep the stop button and countdown responsive
+            self.sleep(min(remaining, 1.0))
+
+class YahooBarFeed:
+    """Fetches the latest bars for the whole universe with one batched request"""
+
+    def __init__(self, provider=None):
+        self.provider = provider
+
+    def fetch_history(self, ticker, interval):
+        if self.provider is None:
+            from data_providers import YahooProvider
+            self.provider = YahooProvider()
+        data, _ = self.provider.get_bars(ticker, interval)
+        return data
+
+    def fetch_new_bars(self, tickers, interval, close_time):
+        import yfinance as yf
+        try:
+            raw = yf.download(
+                tickers,
+                period='1d',
+                interval=interval,
+                group_by='ticker',
+                auto_adjust=False,
+                threads=True,
+                progress=False
+            )
+        except Exception as e:
+            print(f"Error fetching live bars: {e}")
+            return {}
+
+        new_bars = {}
+        for ticker in tickers:
+            try:
+                if isinstance(raw.columns, pd.MultiIndex):
+                    bars = raw[ticker]
+                else:
+                    bars = raw
+                bars = bars[OHLCV_COLUMNS].dropna()
+                bars = completed_bars(bars, interval, close_time)
+                if not bars.empty:
+                    new_bars[ticker] = bars
+            except KeyError:
+                continue
+        return new_bars
+
+class ReplayBarFeed:
+    """Replays stored history bar by bar so live mode can run offline and deterministically"""
+
+    def __init__(self, store, interval, warmup_bars=WINDOW_BARS):
+        self.store = store
+        self.interval = interval
+        self.warmup_bars = warmup_bars
+        self.histories = {}
+        self.positions = {}
+
+    def _history(self, ticker):
+        if ticker not in self.histories:
+            self.histories[ticker] = self.store.read_interval(ticker, self.interval)
+        return self.histories[ticker]
+
+    def fetch_history(self, ticker, interval):
+        history = self._history(ticker)
+        self.positions[ticker] = min(self.warmup_bars, len(history))
+        return history.iloc[:self.positions[ticker]]
+
+    def next_close_time(self):
+        """Close time of the next bar to replay, used by the replay clock"""
+        pending = [
+            self._history(ticker).index[position]
+            for ticker, position in self.positions.items()
+            if position < len(self._history(ticker))
+        ]
+        if not pending:
+            return None
+        start = min(pending)
+        return min(start + pd.Timedelta(minutes=INTRADAY_INTERVALS[self.interval]),
+                   session_bounds(start.astimezone(IST).date())[1])
+
+    def fetch_new_bars(self, tickers, interval, close_time):
+        new_bars = {}
+        for ticker in tickers:
+            history = self._history(ticker)
+            position = self.positions.get(ticker, 0)
+            pending = completed_bars(history.iloc[position:], interval, close_time)
+            if not pending.empty:
+                new_bars[ticker] = pending
+                self.positions[ticker] = position + len(pending)
+        return new_bars
+
+    def exhausted(self):
+        return all(position >= len(self._history(ticker)) for ticker, position in self.positions.items())
+
+class TickerState:
+    """Rolling bar window of one ticker; detection evaluates only its last candle, so nothing else is kept"""
+
+    def __init__(self, history, max_bars=WINDOW_BARS):
+        self.max_bars = max_bars
+        self.window = history[OHLCV_COLUMNS].tail(max_bars).copy()
+
+    def update(self, new_bars):
+        new_bars = new_bars[OHLCV_COLUMNS]
+        if not self.window.empty:
+            new_bars = new_bars[new_bars.index > self.window.index[-1]]
+        if new_bars.empty:
+            return False
+        self.window = pd.concat([self.window, new_bars]).tail(self.max_bars)
+        return True
+
+class LiveScanner:
+    def __init__(self, tickers, interval, patterns, feed, store=None, exchange="NSE"):
+        if interval not in INTRADAY_INTERVALS:
+            raise ValueError(f"Live mode supports {', '.join(INTRADAY_INTERVALS)} intervals, got '{interval}'")
+        self.tickers = list(tickers)
+        self.interval = interval
+        self.patterns = list(patterns)
+        self.feed = feed
+        self.store = store
+        self.exchange = exchange
+        self.states = {}
+        self.matches = {pattern: set() for pattern in self.patterns}
+
+    def bootstrap(self, on_progress=None):
+        """Loads the initial history once; every later bar close only moves the windows forward"""
+        for i, ticker in enumerate(self.tickers):
+            history = None
+            if self.store is not None and self.store.has_interval(ticker, self.interval):
+                history = self.store.read_interval(ticker, self.interval, tail=WINDOW_BARS)
+            if history is None or history.empty:
+                history = self.feed.fetch_history(ticker, self.interval)
+                if history is not None and not history.empty:
+                    self._store_bars(ticker, history)
+            if history is not None and not history.empty:
+                self.states[ticker] = TickerState(history)
+            if on_progress:
+                on_progress(i + 1, len(self.tickers))
+        for ticker in self.states:
+            self._evaluate(ticker)
+
+    def _store_bars(self, ticker, bars):
+        # The store keeps base intervals only; 30m and 1h bars are resampled from the stored 15m ones,
+        # and the next regular fetch brings the 15m bars behind a live 30m or 1h bar
+        if self.store is not None and BASE_INTERVALS.get(self.interval) == self.interval:
+            self.store.append(ticker, self.interval, bars)
+
+    def _evaluate(self, ticker):
+        window = self.states[ticker].window
+        # Detection only reads the window, and one call shares the indicators between patterns
+        matches = detect_patterns(window, self.patterns, ticker=ticker, interval=self.interval,
+                                  exchange=self.exchange, log_results=False)
+        for pattern, matched in matches.items():
+            if matched:
+                self.matches[pattern].add(ticker)
+            else:
+                self.matches[pattern].discard(ticker)
+
+    def process_bar_close(self, close_time):
+        started = time.perf_counter()
+        previous = {pattern: set(tickers) for pattern, tickers in self.matches.items()}
+
+        new_bars = self.feed.fetch_new_bars(list(self.states), self.interval, close_time)
+        fetched = time.perf_counter()
+
+        updated = []
+        for ticker, bars in new_bars.items():
+            state = self.states.get(ticker)
+            if state is not None and state.update(bars):
+                self._store_bars(ticker, bars)
+                self._evaluate(ticker)
+                updated.append(ticker)
+
+        return {
+            'close_time': close_time,
+            'updated': len(updated),
+            'added': {p: sorted(self.matches[p] - previous[p]) for p in self.patterns},
+            'dropped': {p: sorted(previous[p] - self.matches[p]) for p in self.patterns},
+            'matching': {p: sorted(self.matches[p]) for p in self.patterns},
+            'fetch_seconds': fetched - started,
+            'latency_seconds': time.perf_counter() - started
+        }
+
+    def last_metrics(self, ticker):
+        """Close, EMA20 and ATR14 at the last candle, computed from the window when displayed"""
+        window = self.states[ticker].window
+        high, low, close = (window[field].to_numpy(dtype=float) for field in ('High', 'Low', 'Close'))
+        return {
+            'last_close': float(close[-1]),
+            'ema20': float(kernels.ema(close, 20)[-1]),
+            'atr14': float(kernels.atr(high, low, close, 14)[-1])
+        }
+
+    def run(self, scheduler, on_update, should_stop=None, on_tick=None):
+        while not (should_stop and should_stop()):
+            close_time = scheduler.wait_for_next_close(should_stop=should_stop, on_tick=on_tick)
+            if close_time is None:
+                break
+            on_update(self.process_bar_close(close_time))
+
+def replay(store_root, interval, patterns, tickers=None):
+    """Runs live mode against a stored history, printing every change to the match sets"""
+    store = BarStore(store_root)
+    tickers = tickers or store.interval_tickers(interval)
+    feed = ReplayBarFeed(store, interval)
+    # The store is the replay source, so the scanner must not write back into it
+    scanner = LiveScanner(tickers, interval, patterns, feed)
+    scanner.bootstrap()
+    print(f"Replaying {len(scanner.states)} tickers on {interval}")
+
+    while not feed.exhausted():
+        close_time = feed.next_close_time()
+        if close_time is None:
+            break
+        update = scanner.process_bar_close(close_time)
+        for pattern in patterns:
+            for ticker in update['added'][pattern]:
+                print(f"{close_time:%Y-%m-%d %H:%M} + {ticker} ({pattern})")
+            for ticker in update['dropped'][pattern]:
+                print(f"{close_time:%Y-%m-%d %H:%M} - {ticker} ({pattern})")
+        print(f"{close_time:%Y-%m-%d %H:%M} {update['updated']} tickers updated in {update['latency_seconds']*1000:.0f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay stored bars through the live screener")
+    parser.add_argument("--store", default="bar_store")
+    parser.add_argument("--interval", default="15m", choices=list(INTRADAY_INTERVALS))
+    parser.add_argument("--pattern", action="append", dest="patterns")
+    parser.add_argument("tickers", nargs="*")
+    args = parser.parse_args()
+    replay(args.store, args.interval, args.patterns or ["Volatility Contraction"], args.tickers)
@@ -1,9 +1,20 @@
+import os
 import streamlit as st
-from fetch_data import fetch_stock_data, get_company_name, fetch_all_tickers
-from plot_chart import plot_candlestick
-from pattern_detection import detect_pattern, generate_summary_report
+from collections import OrderedDict
+from pattern_detection import detect_patterns, generate_summary_report
 from datetime import datetime
 from cache_manager import CacheManager
+from live_scanner import LiveScanner, BarCloseScheduler, YahooBarFeed, INTRADAY_INTERVALS
+from scanner import run_scan, make_prefilter, make_feature_store, record_first_result, PATTERNS, PREFETCH_BATCH
+from feature_store import FEATURE_COLUMNS
+from priority import rank_tickers
+from data_providers import get_provider
+from compact_bars import CompactBars
+from results import make_record, load_record_bars
+from perf import PerfRecorder, current, recording, timed
+import metrics
+from contextlib import nullcontext
+from profiling import profiled
 
 st.set_page_config(
     page_title="Indian Stock Market Screener",
@@ -13,52 +24,268 @@ st.set_page_config(
     menu_items={}
 )
 
+STATIC_DIR = "static"
+
+@st.cache_resource
+def read_static(name):
+    """Contents of a static asset, read once per process instead of on every rerun"""
+    with open(os.path.join(STATIC_DIR, name)) as f:
+        return f.read()
+
 def load_css():
-    with open('static/style.css') as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    st.markdown(f'<style>{read_static("style.css")}</style>', unsafe_allow_html=True)
 
 def get_tradingview_url(ticker):
     symbol = ticker.replace('.NS', '')
     return f"https://www.tradingview.com/chart?symbol=NSE:{symbol}"
 
+# Charts opened in a session keep their bars around, up to this many
+RESULT_BARS_CACHED = 16
+
+def result_bars(record, provider):
+    if 'result_bars' not in st.session_state:
+        st.session_state.result_bars = OrderedDict()
+    cached = st.session_state.result_bars
+    key = (record['ticker'], record['interval'], record['last_bar'])
+    if key in cached:
+        cached.move_to_end(key)
+        return cached[key].to_frame()
+    data = load_record_bars(record, provider)
+    if not data.empty:
+        cached[key] = CompactBars.from_frame(data)
+        while len(cached) > RESULT_BARS_CACHED:
+            cached.popitem(last=False)
+    return data
+
+def render_result(record, label, provider, data=None, expanded=False, key=""):
+    """Result summary; the bars are only loaded when the chart is asked for, unless already at hand"""
+    ticker, company_name = record['ticker'], record['company_name']
+    with st.expander(f"{company_name} ({ticker}) - {label}", expanded=expanded):
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(
+                f"Close **{record['last_price']:.2f}** ({record['change_pct']:+.2f}%) · "
+                f"Avg volume {record['avg_volume']:,.0f} · {record['bar_count']} candles to {record['last_bar'][:16]}"
+            )
+            scores = record.get('scores', {})
+            for pattern, conditions in record.get('conditions', {}).items():
+                score = f" (score {scores[pattern]:+.2f})" if pattern in scores else ""
+                st.caption(f"{pattern}{score}: " + ", ".join(
+                    f"{'✅' if met else '❌'} {name}" for name, met in conditions.items()))
+        with col2:
+            st.markdown(
+                f'<a href="{get_tradingview_url(ticker)}" target="_blank" class="tradingview-button">'
+                '📊 TradingView</a>',
+                unsafe_allow_html=True
+            )
+        if data is None and st.checkbox("Show chart", key=f"chart_{key}_{label}_{ticker}"):
+            data = result_bars(record, provider)
+        if data is not None and not data.empty:
+            # matplotlib and mplfinance load with the first chart rather than with the app
+            from plot_chart import plot_candlestick
+            st.write(data.tail())
+            plot_candlestick(data, ticker, company_name)
+            st.image('chart.png')
+
+def display_multi_results(patterns, pattern_matches, stocks_with_issues, provider):
+    if stocks_with_issues:
+        st.header("All Rest Matched Stocks Old Chart Data Not Available")
+        st.info(f"Found {len(stocks_with_issues)} stocks with data availability issues")
+        for record in stocks_with_issues:
+            render_result(record, "Limited Data", provider)
+
+    for pattern in patterns:
+        matches = pattern_matches.get(pattern, [])
+        st.header(f"{pattern} ({len(matches)} stocks)")
+        if not matches:
+            st.info(f"No stocks matching the {pattern} pattern")
+        for record in matches:
+            render_result(record, pattern, provider)
+
+def show_perf_report(processed):
+    with st.expander("Scan performance breakdown"):
+        st.code(current().report(processed), language=None)
+
+def render_feature_screen(provider):
+    """Ad-hoc screen over the feature table the scans keep up to date; nothing is fetched"""
+    with st.expander("Ad-hoc screen over cached features"):
+        col1, col2 = st.columns([1, 4])
+        with col1:
+            interval = st.selectbox("Interval", ["1h", "15m", "30m", "1d", "5d"], index=3, key="feature_interval")
+        with col2:
+            expression = st.text_input(
+                "Filter expression or SQL over 'features'",
+                value="range45_pct < 0.15 and volume_ratio_20_120 < 0.8",
+                key="feature_expression"
+            )
+        st.caption("Columns: " + ", ".join(FEATURE_COLUMNS))
+        store = make_feature_store(provider, interval)
+        if not len(store):
+            st.info(f"No features for {interval} yet; they are recorded as stocks are scanned")
+            return
+        started = datetime.now()
+        try:
+            result = store.screen(expression)
+        except Exception as e:
+            st.error(f"Invalid screen: {e}")
+            return
+        elapsed = (datetime.now() - started).total_seconds() * 1000
+        st.caption(f"{len(result)} of {len(store)} stocks in {elapsed:.1f} ms")
+        st.dataframe(result)
+
+def run_multi_scan(patterns, interval, exchange, tickers, cache_manager, prefilter, provider):
+    """One pass over the universe: every ticker is fetched once and checked against all patterns"""
+    final_results = None if st.session_state.should_reset else cache_manager.get_multi_results(patterns, interval, exchange)
+    if final_results:
+        display_multi_results(patterns, final_results['pattern_matches'], final_results['stocks_with_issues'], provider)
+        return
+
+    progress_container = st.empty()
+    stats_container = st.empty()
+    fetched_header = st.empty()
+    results_header = st.empty()
+    results_container = st.container()
+    start_time = datetime.now()
+    found = {pattern: 0 for pattern in patterns}
+
+    def on_result(ticker, result, processed, total):
+        progress = min(processed / max(total, 1), 1.0)
+        elapsed_time = max(1, (datetime.now() - start_time).seconds)
+        progress_container.markdown(f"""
+            <div class="scan-progress">
+                <div style="width: {progress*100}%"></div>
+            </div>
+        """, unsafe_allow_html=True)
+        stats_container.markdown(f"""
+            <div class="stats-grid">
+                <div class="stat-card">
+                    <div class="stat-label">Progress</div>
+                    <div class="stat-value">{progress*100:.1f}%</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-label">Stocks Scanned</div>
+                    <div class="stat-value">{processed}/{total}</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-label">Time Elapsed</div>
+                    <div class="stat-value">{elapsed_time}s</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-label">Matches</div>
+                    <div class="stat-value">{sum(found.values())}</div>
+                </div>
+            </div>
+        """, unsafe_allow_html=True)
+        fetched_header.info(f"Processing {ticker}...")
+
+        if result and result['matched_patterns']:
+            for pattern in result['matched_patterns']:
+                found[pattern] += 1
+            results_header.success(", ".join(f"{p}: {n}" for p, n in found.items()))
+            with results_container:
+                render_result(result['record'], " + ".join(result['matched_patterns']), provider,
+                              data=result['data'], expanded=True, key="scan")
+
+    results = run_scan(patterns, interval, exchange, tickers=tickers, cache_manager=cache_manager,
+                       on_result=on_result, should_stop=lambda: st.session_state.stop_scan,
+                       prefilter=prefilter, provider=provider, features=make_feature_store(provider, interval),
+                       on_prefetch=lambda done, total: fetched_header.info(f"Downloading bars... {done}/{total}"))
+
+    progress_container.empty()
+    stats_container.empty()
+    fetched_header.empty()
+    results_header.empty()
+    total_time = (datetime.now() - start_time).seconds
+    if results['completed']:
+        st.success(f"Scan completed in {total_time} seconds!")
+    else:
+        st.info(f"Scan stopped after {total_time} seconds. Progress saved for the next run.")
+    show_perf_report(results['perf']['scanned'])
+    display_multi_results(patterns, results['pattern_matches'], results['stocks_with_issues'], provider)
+
+def run_live_scan(patterns, interval, exchange, tickers, provider):
+    status_container = st.empty()
+    stats_container = st.empty()
+    changes_container = st.container()
+    matches_container = st.empty()
+
+    scanner = LiveScanner(tickers, interval, patterns, YahooBarFeed(provider), store=provider.store, exchange=exchange)
+    scanner.bootstrap(on_progress=lambda done, total: status_container.info(
+        f"Loading initial history: {done}/{total} stocks"))
+
+    def show_matches(update_time, latency):
+        matching = sorted(set().union(*scanner.matches.values()))
+        stats_container.markdown(f"""
+            <div class="stats-grid">
+                <div class="stat-card">
+                    <div class="stat-label">Matching</div>
+                    <div class="stat-value">{len(matching)}</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-label">Tracked Stocks</div>
+                    <div class="stat-value">{len(scanner.states)}</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-label">Last Update</div>
+                    <div class="stat-value">{update_time}</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-label">Scan Latency</div>
+                    <div class="stat-value">{latency:.1f}s</div>
+                </div>
+            </div>
+        """, unsafe_allow_html=True)
+        with matches_container.container():
+            st.header("Stocks Matching Pattern")
+            for ticker in matching:
+                metrics = scanner.last_metrics(ticker)
+                matched = ", ".join(p for p in patterns if ticker in scanner.matches[p])
+                st.markdown(
+                    f'{ticker} ({matched}) — Close {metrics["last_close"]:.2f}, EMA20 {metrics["ema20"]:.2f} '
+                    f'<a href="{get_tradingview_url(ticker)}" target="_blank" class="tradingview-button">📊 TradingView</a>',
+                    unsafe_allow_html=True
+                )
+
+    def on_update(update):
+        close_label = update['close_time'].strftime('%H:%M')
+        with changes_container:
+            for pattern in patterns:
+                for ticker in update['added'][pattern]:
+                    st.success(f"{close_label} bar: {ticker} now matches {pattern}")
+                for ticker in update['dropped'][pattern]:
+                    st.warning(f"{close_label} bar: {ticker} no longer matches {pattern}")
+        show_matches(close_label, update['latency_seconds'])
+
+    show_matches("bootstrap", 0)
+    scanner.run(
+        BarCloseScheduler(interval),
+        on_update,
+        should_stop=lambda: st.session_state.stop_scan,
+        on_tick=lambda close_time, remaining: status_container.info(
+            f"Live mode: waiting for the {close_time:%H:%M} bar close ({int(remaining)}s)")
+    )
+    status_container.info("Live mode stopped")
+
 def main():
     load_css()
-    cache_manager = CacheManager()
+    # Yahoo unless SCREENER_PROVIDER selects the local or synthetic provider
+    # Prometheus endpoint when SCREENER_METRICS_PORT is set; started once per process
+    metrics.start_server()
+    provider = get_provider()
+    cache_manager = CacheManager(provider=provider)
 
     def display_results():
         if len(st.session_state.stocks_with_issues) > 0:
             st.header("All Rest Matched Stocks Old Chart Data Not Available")
             st.info(f"Found {len(st.session_state.stocks_with_issues)} stocks with data availability issues")
             
-            for ticker, company_name, data in st.session_state.stocks_with_issues:
-                with st.expander(f"{company_name} ({ticker}) - Limited Data", expanded=False):
-                    col1, col2 = st.columns([4, 1])
-                    with col1:
-                        st.write(data.tail())
-                    with col2:
-                        st.markdown(
-                            f'<a href="{get_tradingview_url(ticker)}" target="_blank" class="tradingview-button">'
-                            '📊 TradingView</a>',
-                            unsafe_allow_html=True
-                        )
-                    plot_candlestick(data, ticker, company_name)
-                    st.image('chart.png')
+            for record in st.session_state.stocks_with_issues:
+                render_result(record, "Limited Data", provider)
         
         if st.session_state.matching_stocks:
             st.header("Stocks Matching Pattern")
-            for ticker, company_name, data in st.session_state.matching_stocks:
-                with st.expander(f"{company_name} ({ticker})"):
-                    col1, col2 = st.columns([4, 1])
-                    with col1:
-                        st.write(data.tail())
-                    with col2:
-                        st.markdown(
-                            f'<a href="{get_tradingview_url(ticker)}" target="_blank" class="tradingview-button">'
-                            '📊 TradingView</a>',
-                            unsafe_allow_html=True
-                        )
-                    plot_candlestick(data, ticker, company_name)
-                    st.image('chart.png')
+            for record in st.session_state.matching_stocks:
+                render_result(record, "Pattern Match", provider)
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
                 st.button("🔄 New Search", key="new_search_button", 
@@ -113,9 +340,10 @@ def main():
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                pattern = st.selectbox(
-                    "Select the chart Pattern",
-                    ["Volatility Contraction", "Low Volume Stock Selection", "15% Reversal"]
+                patterns = st.multiselect(
+                    "Select the chart Pattern(s)",
+                    PATTERNS,
+                    default=["Volatility Contraction"]
                 )
             with col2:
                 interval = st.selectbox(
@@ -130,26 +358,86 @@ def main():
                     index=0
                 )
             
+            col1, col2 = st.columns(2)
+            with col1:
+                min_avg_volume = st.number_input(
+                    "Skip stocks with average volume below (0 = off):",
+                    min_value=0, value=0, step=1000
+                )
+            with col2:
+                min_price = st.number_input(
+                    "Skip stocks with last price below (0 = off):",
+                    min_value=0.0, value=0.0, step=1.0
+                )
+            
+            live_mode = st.checkbox(
+                "Live mode (15m/30m/1h only): re-scan at every bar close",
+                value=False
+            )
+            
             submitted = st.form_submit_button("Scan for Patterns")
             if submitted:
+                patterns = patterns or ["Volatility Contraction"]
                 st.session_state.form_data = {
-                    'pattern': pattern,
+                    'pattern': patterns[0],
+                    'patterns': patterns,
                     'interval': interval,
-                    'exchange': exchange
+                    'exchange': exchange,
+                    # Live mode polls Yahoo for new bars
+                    'live': live_mode and interval in INTRADAY_INTERVALS and provider.name == 'yahoo',
+                    'min_avg_volume': min_avg_volume,
+                    'min_price': min_price
                 }
                 st.session_state.scanning = True
                 st.rerun()
 
+        render_feature_screen(provider)
+
     if st.session_state.scanning:
         pattern = st.session_state.form_data['pattern']
         interval = st.session_state.form_data['interval']
         exchange = st.session_state.form_data['exchange']
+        patterns = st.session_state.form_data.get('patterns', [pattern])
 
-        tickers = fetch_all_tickers(exchange)
+        recorder = current()
+        recorder.reset()
+        with timed('ticker_list'):
+            tickers = provider.list_universe(exchange)
         if not tickers:
             st.error("Unable to fetch stock list. Please try again later.")
             return
 
+        with timed('prepare'):
+            provider.prepare(interval)
+
+        # Drop stocks that cannot match before any history is downloaded
+        prefilter = make_prefilter(
+            provider,
+            interval,
+            patterns,
+            min_avg_volume=st.session_state.form_data.get('min_avg_volume', 0),
+            min_price=st.session_state.form_data.get('min_price', 0)
+        )
+        with timed('prefilter'):
+            tickers = prefilter.filter(tickers)
+        if prefilter.skip_counts():
+            st.info(prefilter.report())
+
+        if st.session_state.form_data.get('live'):
+            st.session_state.stop_scan = False
+            st.button("🛑 Stop Live Mode", key="stop_live_button", on_click=stop_scan, type="primary")
+            run_live_scan(patterns, interval, exchange, tickers, provider)
+            st.session_state.scanning = False
+            return
+
+        if len(patterns) > 1:
+            st.session_state.stop_scan = False
+            st.button("🛑 Stop Scan", key="stop_multi_button", on_click=stop_scan, type="primary")
+            run_multi_scan(patterns, interval, exchange, tickers, cache_manager, prefilter, provider)
+            st.session_state.scanning = False
+            st.button("🔄 New Search", key="new_search_multi", on_click=trigger_reset)
+            return
+
         progress_data = cache_manager.get_progress_from_cache(pattern, interval, exchange)
         
         if progress_data and not st.session_state.should_reset:
@@ -208,19 +496,8 @@ def main():
                 if st.session_state.matching_stocks:
                     with results_container:
                         st.success(f"Found {len(st.session_state.matching_stocks)} stocks matching the {pattern} pattern")
-                        for ticker, company_name, data in st.session_state.matching_stocks:
-                            with st.expander(f"{company_name} ({ticker}) - Pattern Match", expanded=False):
-                                col1, col2 = st.columns([4, 1])
-                                with col1:
-                                    st.write(data.tail())
-                                with col2:
-                                    st.markdown(
-                                        f'<a href="{get_tradingview_url(ticker)}" target="_blank" class="tradingview-button">'
-                                        '📊 TradingView</a>',
-                                        unsafe_allow_html=True
-                                    )
-                                plot_candlestick(data, ticker, company_name)
-                                st.image('chart.png')
+                        for record in st.session_state.matching_stocks:
+                            render_result(record, "Pattern Match", provider, key="resume")
             
             st.markdown('</div>', unsafe_allow_html=True)
 
@@ -269,6 +546,12 @@ def main():
             display_results()
             return
 
+        # Likely matches first, so results show up early; the whole universe is still scanned
+        with timed('prioritize'):
+            tickers = rank_tickers(tickers, [pattern], interval, exchange, cache_manager, prefilter.metadata)
+        features = make_feature_store(provider, interval)
+        time_to_first_result = None
+        scanned = 0
         try:
             for i, ticker in enumerate(tickers):
                 if st.session_state.stop_scan:
@@ -289,6 +572,15 @@ def main():
                         st.session_state.stocks_with_issues,
                         st.session_state.total_stocks
                     )
+                    prefilter.save()
+
+                if i % PREFETCH_BATCH == 0:
+                    # Updating the placeholder lets a Stop click interrupt the downloads in flight
+                    with timed('prefetch'):
+                        provider.prefetch(tickers[i:i + PREFETCH_BATCH], interval,
+                                          should_stop=lambda: st.session_state.stop_scan,
+                                          on_progress=lambda done, total: fetched_header.info(
+                                              f"Downloading bars... {done}/{total}"))
 
                 elapsed_time = max(1, (datetime.now() - st.session_state.resume_start_time).seconds)
                 processed_since_resume = st.session_state.total_processed - st.session_state.initial_processed
@@ -327,33 +619,44 @@ def main():
                     </div>
                 """, unsafe_allow_html=True)
                 
-                data, has_period_issues = fetch_stock_data(ticker, interval)
+                ticker_started = recorder.clock()
+                with timed('fetch'):
+                    data, has_period_issues = provider.get_bars(ticker, interval)
+                prefilter.record(ticker, data, has_period_issues)
+                with timed('features'):
+                    features.update(ticker, data)
                 if not data.empty:
-                    company_name = get_company_name(ticker)
+                    with timed('company_name'):
+                        company_name = provider.get_metadata(ticker)['company_name']
                     fetched_header.info(f"Processing {ticker}...")
                     
+                    scores = {}
+                    conditions = {}
+                    matched = detect_patterns(data, [pattern], ticker=ticker, interval=interval, exchange=exchange,
+                                              scores=scores, conditions=conditions)[pattern]
+                    if has_period_issues or matched:
+                        # Session state keeps the summary only; the bars stay in the store
+                        with timed('record'):
+                            record = make_record(ticker, company_name, data, interval,
+                                                 matched=[pattern] if matched else [],
+                                                 has_period_issues=has_period_issues,
+                                                 conditions=conditions, scores=scores)
+
                     if has_period_issues:
-                        st.session_state.stocks_with_issues.append((ticker, company_name, data))
+                        st.session_state.stocks_with_issues.append(record)
                     
-                    if detect_pattern(data, pattern_type=pattern, ticker=ticker, interval=interval, exchange=exchange):
-                        st.session_state.matching_stocks.append((ticker, company_name, data))
+                    if matched:
+                        st.session_state.matching_stocks.append(record)
+                        if time_to_first_result is None:
+                            time_to_first_result = record_first_result(recorder.started, 'ui')
                         results_header.success(f"Found {len(st.session_state.matching_stocks)} stocks matching the {pattern} pattern")
                         
                         with results_container:
-                            with st.expander(f"{company_name} ({ticker}) - Pattern Match", expanded=True):
-                                col1, col2 = st.columns([4, 1])
-                                with col1:
-                                    st.write(data.tail())
-                                with col2:
-                                    st.markdown(
-                                        f'<a href="{get_tradingview_url(ticker)}" target="_blank" class="tradingview-button">'
-                                        '📊 TradingView</a>',
-                                        unsafe_allow_html=True
-                                    )
-                                plot_candlestick(data, ticker, company_name)
-                                st.image('chart.png')
+                            render_result(record, "Pattern Match", provider, data=data, expanded=True, key="scan")
+                recorder.record('ticker', recorder.clock() - ticker_started)
                 
                 stocks_processed += 1
+                scanned += 1
             
             if not st.session_state.stop_scan and st.session_state.total_processed >= st.session_state.total_stocks:
                 # Save final results when scan completes
@@ -369,6 +672,8 @@ def main():
                 st.session_state.scanning = False
                 
         finally:
+            prefilter.save()
+            features.save()
             if st.session_state.stop_scan:
                 cache_manager.save_progress_to_cache(
                     pattern,
@@ -391,6 +696,17 @@ def main():
                 st.info(f"Scan stopped after {total_time} seconds. Showing all results...")
             else:
                 st.success(f"Scan completed in {total_time} seconds!")
+            recorder.write_record(source='ui', provider=provider.name, interval=interval, exchange=exchange,
+                                  patterns=[pattern], scanned=scanned,
+                                  total_stocks=st.session_state.total_stocks, completed=not st.session_state.stop_scan,
+                                  prioritized=True, time_to_first_result=time_to_first_result)
+            show_perf_report(scanned)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # A scan runs within a single script run, so profiling that run covers the whole scan loop
+    # Sessions share the process, so each times its scans into its own recorder
+    if 'perf_recorder' not in st.session_state:
+        st.session_state.perf_recorder = PerfRecorder()
+    with profiled("ui_scan") if st.session_state.get('scanning') else nullcontext(), \
+            recording(st.session_state.perf_recorder):
+        main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+import os
+import sys
+import math
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# SCREENER_METRICS_PORT=9108 serves /metrics from the Streamlit process or a headless scan
+METRICS_PORT_ENV = "SCREENER_METRICS_PORT"
+METRICS_HOST = "127.0.0.1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """(suffix, label values, extra label pairs, value) tuples"""
+        with self._lock:
+            return [("", key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_label_text(self.labels, key, extra)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), function=None):
+        super().__init__(name, help_text, labels)
+        # An unlabelled gauge can be read from a callback at scrape time instead of being set
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        if self.function is not None:
+            return [("", (), (), self.function())]
+        return super().samples()
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts, then sum and count
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    samples.append(("_bucket", key, (('le', _format_value(float(bound))),), cumulative))
+                samples.append(("_sum", key, (), state[-2]))
+                samples.append(("_count", key, (), state[-1]))
+        return samples
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=(), function=None):
+        return self._register(Gauge, name, help_text, labels, function=function)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+def _resident_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return 0
+
+_started = time.time()
+
+# Screener metrics; the instrumented modules import these objects directly
+CACHE_LOOKUPS = REGISTRY.counter("screener_cache_lookups_total", "CacheManager lookups by cache kind and result",
+                                 ("kind", "result"))
+FETCH_REQUESTS = REGISTRY.counter("screener_fetch_requests_total", "Bar requests by interval and where the bars came from",
+                                  ("interval", "source"))
+FETCH_RETRIES = REGISTRY.counter("screener_fetch_retries_total", "Extra Yahoo history attempts after the first period",
+                                 ("interval",))
+PERIOD_FALLBACKS = REGISTRY.counter("screener_fetch_period_fallbacks_total",
+                                    "Downloads that only succeeded with a shorter fallback period", ("interval",))
+FETCH_ERRORS = REGISTRY.counter("screener_fetch_errors_total", "Failed fetch attempts by stage", ("stage",))
+DETECTION_SECONDS = REGISTRY.histogram("screener_detection_seconds",
+                                       "Pattern evaluation time per ticker; shared clauses count for every pattern using them",
+                                       ("pattern",))
+PATTERN_MATCHES = REGISTRY.counter("screener_pattern_matches_total", "Tickers matching each pattern", ("pattern",))
+SCAN_SECONDS = REGISTRY.histogram("screener_scan_seconds", "Wall time of finished or stopped scans", ("source",),
+                                  buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+TIME_TO_FIRST_RESULT = REGISTRY.histogram("screener_time_to_first_result_seconds",
+                                          "Time from scan start to the first pattern match", ("source",),
+                                          buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800))
+TICKERS_SCANNED = REGISTRY.counter("screener_tickers_scanned_total", "Tickers scanned", ("source",))
+LAST_SCAN = REGISTRY.gauge("screener_last_scan_timestamp_seconds", "Unix time the last scan finished", ("source",))
+REGISTRY.gauge("process_resident_memory_bytes", "Resident memory size in bytes", function=_resident_bytes)
+REGISTRY.gauge("process_start_time_seconds", "Start time of the process since the epoch", function=lambda: _started)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+
+def start_server(port=None, host=METRICS_HOST):
+    """Serves /metrics on a daemon thread; safe to call on every Streamlit rerun"""
+    global _server
+    if _server is not None:
+        return _server
+    port = port if port is not None else os.environ.get(METRICS_PORT_ENV)
+    if not port:
+        return None
+    try:
+        _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    except (OSError, ValueError) as e:
+        print(f"Error starting metrics server on port {port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving metrics on http://{host}:{_server.server_address[1]}/metrics")
+    return _server
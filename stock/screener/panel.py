@@ -0,0 +1,142 @@
+import os
+import json
+import argparse
+from contextlib import ExitStack
+import numpy as np
+import pandas as pd
+from bar_store import OHLCV_COLUMNS
+from atomic_io import atomic_file
+
+INDEX_FILE = "index.json"
+# Detection runs on float64; keeping the panel in float64 makes results identical to the frame path
+FIELD_DTYPE = np.float64
+
+def _field_file(path, field):
+    return os.path.join(path, f"{field}.f8")
+
+def build_panel(provider, interval, path, tickers=None, exchange="NSE"):
+    """Writes one interval of the universe as contiguous per-field arrays plus a ticker offset index
+
+    Each ticker's bars are appended to the field files in one pass, so memory use stays at
+    one ticker regardless of universe size.
+    """
+    os.makedirs(path, exist_ok=True)
+    tickers = tickers if tickers is not None else provider.list_universe(exchange)
+    index = {}
+    rows = 0
+    # Every field file replaces the old one when the block completes, and none does on an error
+    with ExitStack() as stack:
+        files = {field: stack.enter_context(atomic_file(_field_file(path, field), 'wb')) for field in OHLCV_COLUMNS}
+        files['timestamps'] = stack.enter_context(atomic_file(os.path.join(path, "timestamps.i8"), 'wb'))
+        for ticker in tickers:
+            data, _ = provider.get_bars(ticker, interval)
+            if data.empty:
+                continue
+            stamps = pd.DatetimeIndex(data.index)
+            if stamps.tz is None:
+                stamps = stamps.tz_localize('Asia/Kolkata')
+            epoch_ns = stamps.tz_convert('UTC').tz_localize(None).values.astype('datetime64[ns]').astype(np.int64)
+            files['timestamps'].write(epoch_ns.tobytes())
+            for field in OHLCV_COLUMNS:
+                files[field].write(data[field].to_numpy(dtype=FIELD_DTYPE).tobytes())
+            index[ticker] = [rows, len(data)]
+            rows += len(data)
+
+    with atomic_file(os.path.join(path, INDEX_FILE), 'w') as f:
+        json.dump({'interval': interval, 'rows': rows, 'tickers': index}, f)
+    return len(index)
+
+class PanelBars:
+    """One ticker's slice of a panel; columns are Series over the mapped arrays, nothing is copied
+
+    Supports the part of the DataFrame interface the pattern evaluator and backtest use.
+    """
+
+    def __init__(self, fields, timestamps, tz='Asia/Kolkata'):
+        self.fields = fields
+        self.timestamps = timestamps
+        self.tz = tz
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = pd.DatetimeIndex(self.timestamps.view('datetime64[ns]'), tz='UTC').tz_convert(self.tz)
+            self._index.name = 'Datetime'
+        return self._index
+
+    @property
+    def columns(self):
+        return list(self.fields)
+
+    @property
+    def empty(self):
+        return len(self.timestamps) == 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, field):
+        return pd.Series(self.fields[field], index=self.index, name=field, copy=False)
+
+    def tail(self, n=5):
+        start = max(len(self) - n, 0)
+        return PanelBars({f: a[start:] for f, a in self.fields.items()}, self.timestamps[start:], self.tz)
+
+    def to_frame(self):
+        return pd.DataFrame({field: np.array(values) for field, values in self.fields.items()}, index=self.index)
+
+class OHLCVPanel:
+    """Read-only view of a panel written by build_panel
+
+    The field files are opened with numpy.memmap, so any number of worker processes can attach to
+    the same panel and share the operating system's page cache instead of receiving pickled frames.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), 'r') as f:
+            meta = json.load(f)
+        self.interval = meta['interval']
+        self.offsets = meta['tickers']
+        rows = meta['rows']
+        self.fields = {
+            field: np.memmap(_field_file(path, field), dtype=FIELD_DTYPE, mode='r', shape=(rows,))
+            for field in OHLCV_COLUMNS
+        } if rows else {field: np.empty(0, dtype=FIELD_DTYPE) for field in OHLCV_COLUMNS}
+        self.timestamps = (np.memmap(os.path.join(path, "timestamps.i8"), dtype=np.int64, mode='r', shape=(rows,))
+                           if rows else np.empty(0, dtype=np.int64))
+
+    @property
+    def tickers(self):
+        return list(self.offsets)
+
+    def __contains__(self, ticker):
+        return ticker in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def arrays(self, ticker):
+        """Per-field array views of one ticker's bars"""
+        start, length = self.offsets[ticker]
+        return {field: values[start:start + length] for field, values in self.fields.items()}
+
+    def bars(self, ticker):
+        start, length = self.offsets[ticker]
+        return PanelBars(self.arrays(ticker), self.timestamps[start:start + length])
+
+if __name__ == "__main__":
+    from data_providers import get_provider, PROVIDERS
+
+    parser = argparse.ArgumentParser(description="Build a memory-mapped OHLCV panel for multi-process scans")
+    parser.add_argument("path")
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default="local")
+    parser.add_argument("--data-dir", default="bar_store", help="directory read by the local provider")
+    parser.add_argument("tickers", nargs="*")
+    args = parser.parse_args()
+
+    provider = get_provider(args.provider, data_dir=args.data_dir)
+    count = build_panel(provider, args.interval, args.path, args.tickers or None)
+    print(f"Wrote {count} tickers of {args.interval} bars to {args.path}")
@@ -0,0 +1,95 @@
+# Declarative pattern definitions compiled by pattern_dsl.compile_patterns.
+#
+# Every condition compares an indicator over a window of bars with a threshold:
+#   indicator  - reduction from pattern_dsl.INDICATORS (max, min, mean, range_pct, ...)
+#   field      - input series: Open/High/Low/Close/Volume, true_range, abs_return, atrN, emaN
+#   bars       - window length in candles
+#   offset     - how many candles before the current one the window ends (default 0)
+#   compare    - <, <=, >, >=, or between (inclusive [low, high])
+#   threshold  - a number, a [low, high] pair, or another indicator expression with an optional scale
+# A condition with "all" holds when every listed clause holds.
+# Windows are described relative to the current candle, so for the 120-candle patterns
+# "offset 75, bars 45" are candles 0-44 of the window.
+
+VOLUME_120 = {"indicator": "mean", "field": "Volume", "bars": 120}
+
+WINDOW_120_CONDITIONS = [
+    {
+        "name": "sample_size",
+        "description": "Minimum 120 Candles Available",
+        "indicator": "bar_count", "bars": 120,
+        "compare": ">=", "threshold": 120
+    },
+    {
+        "name": "tight_consolidation",
+        "description": "Price Range within 5-25% of Mean",
+        "indicator": "range_pct", "bars": 45, "offset": 75,
+        "compare": "between", "threshold": [0.05, 0.25]
+    },
+    {
+        "name": "volatility_impulse",
+        "description": "Price Move between 3-30%",
+        "indicator": "count_between", "field": "abs_return", "bars": 39, "offset": 20, "range": [0.03, 0.30],
+        "compare": ">=", "threshold": 1
+    },
+    {
+        "name": "low_volume_consolidation",
+        "description": "Volume 10-150% of Average & Range ≤15%",
+        "all": [
+            {
+                "indicator": "mean", "field": "Volume", "bars": 20,
+                "compare": "between", "threshold": [dict(VOLUME_120, scale=0.10), dict(VOLUME_120, scale=1.5)]
+            },
+            {
+                "indicator": "range_pct", "bars": 20,
+                "compare": "<=", "threshold": 0.15
+            }
+        ]
+    },
+    {
+        "name": "ema_proximity",
+        "description": "Price within 5% of EMA20",
+        # EMA20 is seeded at the first of the 120 candles
+        "indicator": "ema_distance_max", "field": "Close", "span": 20, "seed": 120, "bars": 15,
+        "compare": "<=", "threshold": 0.05
+    }
+]
+
+REVERSAL_CONDITION = {
+    "name": "reversal_level",
+    "description": "Price Above 15% Reversal Level",
+    "indicator": "min", "field": "Close", "bars": 30,
+    # Reversal percentage can be modified to any value between 0.15-0.20
+    "compare": ">", "threshold": {"indicator": "max", "field": "High", "bars": 100, "offset": 20, "scale": 1 - 0.15}
+}
+
+PATTERN_DEFINITIONS = {
+    "volatility contraction": {
+        "min_bars": 60,
+        "log_min_conditions": 2,
+        "conditions": [
+            {
+                "name": "atr_decrease",
+                "description": "ATR Decrease Over Period",
+                "indicator": "monotonic_down", "field": "atr14", "bars": 10,
+                "compare": ">=", "threshold": 1
+            },
+            {
+                "name": "atr_threshold",
+                "description": "ATR Threshold Check",
+                "indicator": "decline_pct", "field": "atr14", "bars": 10,
+                "compare": ">", "threshold": 0.15
+            }
+        ]
+    },
+    "low volume stock selection": {
+        "min_bars": 120,
+        "log_min_conditions": 2,
+        "conditions": WINDOW_120_CONDITIONS
+    },
+    "15% reversal": {
+        "min_bars": 120,
+        "log_min_conditions": 2,
+        "conditions": WINDOW_120_CONDITIONS + [REVERSAL_CONDITION]
+    }
+}
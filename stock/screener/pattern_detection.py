@@ -1,7 +1,10 @@
-import pandas as pd
-import numpy as np
 from datetime import datetime
 import os
+from pattern_dsl import compile_patterns
+from pattern_definitions import PATTERN_DEFINITIONS
+from perf import timed
+from atomic_io import atomic_file, file_lock
+from metrics import DETECTION_SECONDS, PATTERN_MATCHES
 
 TOTAL_STOCKS_SCANNED = 0
 
@@ -44,11 +47,12 @@ def log_pattern_result(ticker, conditions_met, met_conditions, failed_conditions
             for cond in failed_conditions:
                 f.write(f"✗ {cond.replace('_', ' ').title()}\n")
     
-    # Update summary after each stock scan
-    update_summary_report(summary_file, ticker, len(met_conditions), pattern_type, interval, exchange)
+    # Update summary after each stock scan; the lock keeps concurrent scans from dropping each other's tickers
+    with file_lock(summary_file):
+        update_summary_report(summary_file, ticker, len(met_conditions), pattern_type, interval, exchange)
 
-def update_summary_report(summary_file, ticker, conditions_met_count, pattern_type=None, interval=None, exchange=None):
-    # Read existing summary if it exists
+def read_summary(summary_file):
+    """Tickers per number of conditions met, as listed in a pattern_summary.txt"""
     summary_data = {2: [], 3: [], 4: [], 5: [], 6: []}
     
     if os.path.exists(summary_file):
@@ -60,6 +64,11 @@ def update_summary_report(summary_file, ticker, conditions_met_count, pattern_ty
                 elif line.startswith("- ") and current_section:
                     ticker_name = line.strip("- \n")
                     summary_data[current_section].append(ticker_name)
+    return summary_data
+
+def update_summary_report(summary_file, ticker, conditions_met_count, pattern_type=None, interval=None, exchange=None):
+    # Read existing summary if it exists
+    summary_data = read_summary(summary_file)
     
     # Update with new ticker
     if conditions_met_count >= 2:
@@ -106,7 +115,8 @@ def update_summary_report(summary_file, ticker, conditions_met_count, pattern_ty
                         condition_stats[condition]['failed'] += 1
 
     # Write updated summary with full analysis
-    with open(summary_file, 'w', encoding='utf-8') as f:
+    # Rewritten for every logged ticker, so it is not synced to disk; a crash still leaves the previous summary
+    with atomic_file(summary_file, 'w', fsync=False, encoding='utf-8') as f:
         f.write(f"Pattern Scan Summary Report - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write("="*50 + "\n\n")
         
@@ -142,227 +152,75 @@ def update_summary_report(summary_file, ticker, conditions_met_count, pattern_ty
                 for stock in stocks:
                     f.write(f"- {stock}\n")
 
-def detect_pattern(data, pattern_type="Volatility Contraction", ticker="Unknown", interval="1h", exchange="NSE"):
+def detect_patterns(data, pattern_types, ticker="Unknown", interval="1h", exchange="NSE", log_results=True, scores=None,
+                    early_exit=True, conditions=None):
+    """Evaluates several patterns on one fetch, sharing indicator work between them
+
+    When scores or conditions is a dict it receives the score or the condition flags of every
+    pattern with enough candles. With early_exit, a pattern stops evaluating once it can neither
+    match nor reach the logging threshold; its skipped conditions are then reported as not met
+    and its score is an upper bound, which is all top-K pruning needs.
+    """
+    results = {pattern_type: False for pattern_type in pattern_types}
     if data.empty or len(data) < 60:
-        return False
-    
-    if pattern_type.lower() == "volatility contraction":
-        data['TR'] = np.maximum(
-            data['High'] - data['Low'],
-            np.maximum(
-                abs(data['High'] - data['Close'].shift(1)),
-                abs(data['Low'] - data['Close'].shift(1))
-            )
-        )
-        
-        if data.index.freq == 'D' or len(data) >= 60:
-            atr_window = 14
-            lookback_period = 10
+        return results
+
+    compiled = compile_patterns(pattern_types)
+    ready = []
+    for pattern_type in compiled.pattern_types:
+        min_bars = compiled.definitions[pattern_type].get('min_bars', 60)
+        if len(data) < min_bars:
+            print(f"{ticker}: Failed - Insufficient candles ({len(data)})")
         else:
-            atr_window = 14
-            lookback_period = 5
-            
-        data['ATR'] = data['TR'].rolling(window=atr_window).mean()
-        last_n_atr = data['ATR'].tail(lookback_period)
-        
-        if not last_n_atr.is_monotonic_decreasing:
-            return False
-            
-        first_atr = last_n_atr.iloc[0]
-        last_atr = last_n_atr.iloc[-1]
-        
-        if pd.isna(first_atr) or pd.isna(last_atr) or first_atr == 0:
-            return False
-            
-        atr_decrease = (first_atr - last_atr) / first_atr
-        atr_threshold = 0.15 if (data.index.freq == 'D' or len(data) >= 60) else 0.1
-        
-        if atr_decrease > atr_threshold:
-            log_pattern_result(ticker, conditions_met=True, met_conditions=["atr_decrease", "atr_threshold"], pattern_type=pattern_type, interval=interval, exchange=exchange)
-            return True
-        return False
-    
-    elif pattern_type.lower() == "low volume stock selection":
-        try:
-            conditions_met = {
-                "sample_size": False,
-                "tight_consolidation": False,
-                "volatility_impulse": False,
-                "low_volume_consolidation": False,
-                "ema_proximity": False
-            }
-            
-            last_120_candles = data.tail(120).copy()  # Changed from 126 to 120
-            if len(last_120_candles) >= 120:  # Changed from 126 to 120
-                conditions_met["sample_size"] = True
-            else:
-                print(f"{ticker}: Failed - Insufficient candles ({len(last_120_candles)})")
-                return False
-            
-            last_120_candles['EMA20'] = last_120_candles['Close'].ewm(span=20, adjust=False).mean()
-            
-            # Update all references from last_126_candles to last_120_candles
-            first_45_candles = last_120_candles.head(45)
-            consolidation_range = (first_45_candles['High'].max() - first_45_candles['Low'].min()) / first_45_candles['Close'].mean()
-            if 0.05 <= consolidation_range <= 0.25:
-                conditions_met["tight_consolidation"] = True
-            
-            volatility_section = last_120_candles.iloc[60:100].copy()
-            volatility_section['TR'] = np.maximum(
-                volatility_section['High'] - data['Low'],
-                np.maximum(
-                    abs(volatility_section['High'] - volatility_section['Close'].shift(1)),
-                    abs(volatility_section['Low'] - volatility_section['Close'].shift(1))
-                )
-            )
-            volatility_section['ATR'] = volatility_section['TR'].rolling(window=8).mean()
-            price_moves = volatility_section['Close'].pct_change().abs()
-            
-            if any((move >= 0.03 and move <= 0.30) for move in price_moves):
-                conditions_met["volatility_impulse"] = True
-            
-            last_20_candles = last_120_candles.tail(20)
-            avg_volume = last_120_candles['Volume'].mean()
-            recent_volume = last_20_candles['Volume'].mean()
-            recent_range = (last_20_candles['High'].max() - last_20_candles['Low'].min()) / last_20_candles['Close'].mean()
-            
-            if (recent_volume >= (avg_volume * 0.10) and
-                recent_volume <= (avg_volume * 1.5) and
-                recent_range <= 0.15):
-                conditions_met["low_volume_consolidation"] = True
-            
-            last_15_candles = last_120_candles.tail(15)
-            ema_proximity = True
-            for _, candle in last_15_candles.iterrows():
-                if abs(candle['Close'] - candle['EMA20']) / candle['Close'] > 0.05:
-                    ema_proximity = False
-                    break
-            if ema_proximity:
-                conditions_met["ema_proximity"] = True
-            
-            conditions_count = sum(conditions_met.values())
-            
-            if conditions_count >= 2:
-                met_conditions = [cond for cond, met in conditions_met.items() if met]
-                failed_conditions = [cond for cond, met in conditions_met.items() if not met]
-                log_pattern_result(ticker, conditions_met, met_conditions, failed_conditions, pattern_type, interval, exchange)
-            
-            return all(conditions_met.values())
-            
-        except Exception as e:
-            print(f"Error in Lucifer pattern detection for {ticker}: {str(e)}")
-            return False
+            ready.append(pattern_type)
+    if not ready:
+        return results
 
-    elif pattern_type.lower() == "15% reversal":
-        try:
-            conditions_met = {
-                "sample_size": False,
-                "tight_consolidation": False,
-                "volatility_impulse": False,
-                "low_volume_consolidation": False,
-                "ema_proximity": False,
-                "reversal_level": False
-            }
-            
-            last_120_candles = data.tail(120).copy()  # Changed from 126 to 120
-            if len(last_120_candles) >= 120:  # Changed from 126 to 120
-                conditions_met["sample_size"] = True
-            else:
-                print(f"{ticker}: Failed - Insufficient candles ({len(last_120_candles)})")
-                return False
-            
-            last_120_candles['EMA20'] = last_120_candles['Close'].ewm(span=20, adjust=False).mean()
-            
-            # Update all references from last_126_candles to last_120_candles
-            first_45_candles = last_120_candles.head(45)
-            consolidation_range = (first_45_candles['High'].max() - first_45_candles['Low'].min()) / first_45_candles['Close'].mean()
-            if 0.05 <= consolidation_range <= 0.25:
-                conditions_met["tight_consolidation"] = True
-            
-            volatility_section = last_120_candles.iloc[60:100].copy()
-            volatility_section['TR'] = np.maximum(
-                volatility_section['High'] - data['Low'],
-                np.maximum(
-                    abs(volatility_section['High'] - volatility_section['Close'].shift(1)),
-                    abs(volatility_section['Low'] - volatility_section['Close'].shift(1))
-                )
-            )
-            volatility_section['ATR'] = volatility_section['TR'].rolling(window=8).mean()
-            price_moves = volatility_section['Close'].pct_change().abs()
-            
-            if any((move >= 0.03 and move <= 0.30) for move in price_moves):
-                conditions_met["volatility_impulse"] = True
-            
-            last_20_candles = last_120_candles.tail(20)
-            avg_volume = last_120_candles['Volume'].mean()
-            recent_volume = last_20_candles['Volume'].mean()
-            recent_range = (last_20_candles['High'].max() - last_20_candles['Low'].min()) / last_20_candles['Close'].mean()
-            
-            if (recent_volume >= (avg_volume * 0.10) and
-                recent_volume <= (avg_volume * 1.5) and
-                recent_range <= 0.15):
-                conditions_met["low_volume_consolidation"] = True
-            
-            last_15_candles = last_120_candles.tail(15)
-            ema_proximity = True
-            for _, candle in last_15_candles.iterrows():
-                if abs(candle['Close'] - candle['EMA20']) / candle['Close'] > 0.05:
-                    ema_proximity = False
-                    break
-            if ema_proximity:
-                conditions_met["ema_proximity"] = True
-                
-            first_100_candles = last_120_candles.head(100)
-            top_high = first_100_candles['High'].max()
-            
-            reversal_percentage = 0.15  # Can be modified to any value between 0.15-0.20
-            reversal_level = top_high * (1 - reversal_percentage)
-            
-            last_30_candles = last_120_candles.tail(30)
-            above_reversal_level = all(close > reversal_level for close in last_30_candles['Close'])
-            
-            if above_reversal_level:
-                conditions_met["reversal_level"] = True
-            
-            conditions_count = sum(conditions_met.values())
-            if conditions_count >= 2:
-                met_conditions = [cond for cond, met in conditions_met.items() if met]
-                failed_conditions = [cond for cond, met in conditions_met.items() if not met]
+    evaluator = compile_patterns(ready)
+    needed = None
+    if early_exit:
+        # Without logging only a full match is worth knowing
+        needed = {
+            pattern_type: (compiled.definitions[pattern_type].get('log_min_conditions', 2) if log_results
+                           else len(compiled.definitions[pattern_type]['conditions']))
+            for pattern_type in ready
+        }
+    clause_seconds = {}
+    try:
+        with timed('detection'):
+            latest = evaluator.latest_conditions(data, clause_seconds, scores, needed)
+    except Exception as e:
+        print(f"Error in pattern detection for {ticker}: {str(e)}")
+        return results
+    for pattern_type, seconds in evaluator.pattern_seconds(clause_seconds).items():
+        DETECTION_SECONDS.observe(seconds, pattern=pattern_type)
+    if conditions is not None:
+        conditions.update(latest)
+
+    for pattern_type, conditions_met in latest.items():
+        definition = compiled.definitions[pattern_type]
+        conditions_count = sum(conditions_met.values())
+        if conditions_count >= definition.get('log_min_conditions', 2) and log_results:
+            met_conditions = [cond for cond, met in conditions_met.items() if met]
+            failed_conditions = [cond for cond, met in conditions_met.items() if not met]
+            with timed('logging'):
                 log_pattern_result(ticker, conditions_met, met_conditions, failed_conditions, pattern_type, interval, exchange)
-            
-            return all(conditions_met.values())
-            
-        except Exception as e:
-            print(f"Error in 15% Reversal pattern detection for {ticker}: {str(e)}")
-            return False
 
-    return False
+        results[pattern_type] = all(conditions_met.values())
+        if results[pattern_type]:
+            PATTERN_MATCHES.inc(pattern=pattern_type)
+
+    return results
+
+def detect_pattern(data, pattern_type="Volatility Contraction", ticker="Unknown", interval="1h", exchange="NSE", log_results=True):
+    return detect_patterns(data, [pattern_type], ticker, interval, exchange, log_results)[pattern_type]
 
 def get_pattern_conditions(pattern_type):
     """Returns a dictionary of conditions and their descriptions for each pattern"""
-    if pattern_type.lower() == "volatility contraction":
-        return {
-            "atr_decrease": "ATR Decrease Over Period",
-            "atr_threshold": "ATR Threshold Check"
-        }
-    elif pattern_type.lower() == "low volume stock selection":
-        return {
-            "sample_size": "Minimum 120 Candles Available",
-            "tight_consolidation": "Price Range within 5-25% of Mean",
-            "volatility_impulse": "Price Move between 3-30%",
-            "low_volume_consolidation": "Volume 10-150% of Average & Range ≤15%",
-            "ema_proximity": "Price within 5% of EMA20"
-        }
-    elif pattern_type.lower() == "15% reversal":
-        return {
-            "sample_size": "Minimum 120 Candles Available",
-            "tight_consolidation": "Price Range within 5-25% of Mean",
-            "volatility_impulse": "Price Move between 3-30%",
-            "low_volume_consolidation": "Volume 10-150% of Average & Range ≤15%",
-            "ema_proximity": "Price within 5% of EMA20",
-            "reversal_level": "Price Above 15% Reversal Level"
-        }
-    return {}
+    definition = PATTERN_DEFINITIONS.get(pattern_type.lower())
+    if not definition:
+        return {}
+    return {condition['name']: condition['description'] for condition in definition['conditions']}
 
 def generate_summary_report():
     global TOTAL_STOCKS_SCANNED
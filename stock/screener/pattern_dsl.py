@@ -0,0 +1,436 @@
+import re
+import time
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pattern_definitions import PATTERN_DEFINITIONS
+import kernels
+
+# Keys that identify an indicator expression; two expressions with equal keys are computed once
+EXPRESSION_KEYS = ('indicator', 'field', 'bars', 'offset', 'range', 'span', 'seed')
+PRICE_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+def expression_key(expr):
+    return tuple((key, _freeze(expr[key])) for key in EXPRESSION_KEYS if key in expr)
+
+def clause_key(clause):
+    return (expression_key(clause), clause['compare'], _freeze(clause['threshold']))
+
+def field_warmup(name):
+    """Leading candles a derived field needs before its first valid value"""
+    if name in ('true_range', 'abs_return'):
+        return 1
+    match = re.match(r'^(atr|ema)(\d+)$', name or '')
+    if match:
+        return int(match.group(2)) + 1
+    return 0
+
+def expression_lookback(expr):
+    lookback = expr.get('offset', 0) + expr.get('bars', 1) + field_warmup(expr.get('field'))
+    if expr['indicator'] == 'ema_distance_max':
+        lookback = max(lookback, expr.get('offset', 0) + expr['seed'])
+    return lookback
+
+class EvaluationContext:
+    """Holds the input bars and every field/expression computed from them
+
+    The input is a DataFrame or a panel.PanelBars view; only column access, index and len are used.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.fields = {}
+        self.expressions = {}
+
+    def series(self, values):
+        return pd.Series(values, index=self.data.index)
+
+    def values(self, name):
+        return self.field(name).to_numpy(dtype=float)
+
+    def field(self, name):
+        if name not in self.fields:
+            self.fields[name] = self._compute_field(name)
+        return self.fields[name]
+
+    def _compute_field(self, name):
+        if name in PRICE_FIELDS:
+            # No copy when the column is already float64, e.g. a memory-mapped panel view
+            return pd.Series(self.data[name].to_numpy(dtype=float, copy=False), index=self.data.index, name=name,
+                             copy=False)
+        if name == 'true_range':
+            return self.series(kernels.true_range(self.values('High'), self.values('Low'), self.values('Close')))
+        if name == 'abs_return':
+            return self.field('Close').pct_change().abs()
+        match = re.match(r'^(atr|ema)(\d+)$', name)
+        if match and match.group(1) == 'atr':
+            return self.series(kernels.atr(self.values('High'), self.values('Low'), self.values('Close'),
+                                           int(match.group(2))))
+        if match and match.group(1) == 'ema':
+            return self.series(kernels.ema(self.values('Close'), int(match.group(2))))
+        raise ValueError(f"Unknown field '{name}'")
+
+    def expression(self, expr):
+        key = expression_key(expr)
+        if key not in self.expressions:
+            values = INDICATORS[expr['indicator']](self, expr)
+            offset = expr.get('offset', 0)
+            self.expressions[key] = values.shift(offset) if offset else values
+        return self.expressions[key]
+
+# Rolling reductions over the `bars` candles ending at each position; the offset shift is applied by the context
+def _rolling(reduction):
+    kernel = 'rolling_' + reduction
+    def indicator(ctx, expr):
+        # Looked up per call so kernels.use_backend takes effect
+        return ctx.series(getattr(kernels, kernel)(ctx.values(expr['field']), expr['bars']))
+    return indicator
+
+def _range_pct(ctx, expr):
+    return ctx.series(kernels.range_pct(ctx.values('High'), ctx.values('Low'), ctx.values('Close'), expr['bars']))
+
+def _count_between(ctx, expr):
+    low, high = expr['range']
+    values = ctx.values(expr['field'])
+    with np.errstate(invalid='ignore'):
+        inside = ((values >= low) & (values <= high)).astype(float)
+    return ctx.series(kernels.rolling_sum(inside, expr['bars']))
+
+def _monotonic_down(ctx, expr):
+    # Share of non-increasing steps inside the window, 1.0 when the whole window is monotonic
+    steps = expr['bars'] - 1
+    with np.errstate(invalid='ignore'):
+        falling = (np.diff(ctx.values(expr['field']), prepend=np.nan) <= 0).astype(float)
+    return ctx.series(kernels.rolling_sum(falling, steps) / steps)
+
+def _decline_pct(ctx, expr):
+    series = ctx.field(expr['field'])
+    first = series.shift(expr['bars'] - 1)
+    return (first - series) / first.where(first != 0)
+
+def _bar_count(ctx, expr):
+    return pd.Series(np.minimum(np.arange(1, len(ctx.data) + 1), expr['bars']).astype(float), index=ctx.data.index)
+
+def _ema_distance_max(ctx, expr):
+    # The EMA is seeded at the first candle of a `seed`-candle window. A seed at candle s differs from the
+    # full-history EMA by (1 - alpha)^(j - s) * (close[s] - ema[s]), so every window EMA is recovered exactly.
+    span, seed, bars = expr['span'], expr['seed'], expr['bars']
+    close = ctx.field(expr['field'])
+    ema = ctx.field(f"ema{span}")
+    decay = 1 - 2 / (span + 1)
+    seed_gap = (close - ema).shift(seed - 1).to_numpy()
+    distance = np.full(len(close), np.nan)
+    for k in range(bars):
+        window_ema = ema.shift(k).to_numpy() + decay ** (seed - 1 - k) * seed_gap
+        shifted_close = close.shift(k).to_numpy()
+        # fmax skips NaN the same way a failed "> threshold" check does in the scalar code
+        distance = np.fmax(distance, np.abs(shifted_close - window_ema) / shifted_close)
+    return pd.Series(distance, index=close.index)
+
+INDICATORS = {
+    'max': _rolling('max'),
+    'min': _rolling('min'),
+    'mean': _rolling('mean'),
+    'sum': _rolling('sum'),
+    'range_pct': _range_pct,
+    'count_between': _count_between,
+    'monotonic_down': _monotonic_down,
+    'decline_pct': _decline_pct,
+    'bar_count': _bar_count,
+    'ema_distance_max': _ema_distance_max
+}
+
+class LatestContext(EvaluationContext):
+    """Evaluates every expression at the last candle only, as a float computed from NumPy windows
+
+    Fields are still computed over the whole input, but no indicator series is built, so a
+    clause costs a slice reduction instead of a rolling pass plus pandas overhead.
+    """
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.arrays = {}
+        self.flags = {}
+
+    def values(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = super().values(name)
+        return self.arrays[name]
+
+    def expression(self, expr):
+        key = expression_key(expr)
+        if key not in self.expressions:
+            end = len(self.data) - expr.get('offset', 0)
+            self.expressions[key] = LATEST_INDICATORS[expr['indicator']](self, expr, end) if end > 0 else np.nan
+        return self.expressions[key]
+
+# Value of each indicator at index end - 1, from the `bars` values ending there; NaN wherever the
+# rolling version is NaN, i.e. when the history is too short or a NaN falls inside the window
+def _window(ctx, name, bars, end):
+    start = end - bars
+    return None if start < 0 else ctx.values(name)[start:end]
+
+def _latest_reduction(reduction):
+    def indicator(ctx, expr, end):
+        window = _window(ctx, expr['field'], expr['bars'], end)
+        return np.nan if window is None else float(reduction(window))
+    return indicator
+
+def _latest_range_pct(ctx, expr, end):
+    bars = expr['bars']
+    high, low, close = (_window(ctx, name, bars, end) for name in ('High', 'Low', 'Close'))
+    if close is None:
+        return np.nan
+    return float((high.max() - low.min()) / (close.sum() / bars))
+
+def _latest_count_between(ctx, expr, end):
+    window = _window(ctx, expr['field'], expr['bars'], end)
+    if window is None:
+        return np.nan
+    low, high = expr['range']
+    with np.errstate(invalid='ignore'):
+        return float(np.count_nonzero((window >= low) & (window <= high)))
+
+def _latest_monotonic_down(ctx, expr, end):
+    steps = expr['bars'] - 1
+    start = end - steps
+    if start < 0:
+        return np.nan
+    values = ctx.values(expr['field'])
+    # The first candle has no previous one, so it never counts as a falling step
+    steps_taken = np.diff(values[start - 1:end]) if start > 0 else np.r_[np.nan, np.diff(values[:end])]
+    with np.errstate(invalid='ignore'):
+        return float(np.count_nonzero(steps_taken <= 0)) / steps
+
+def _latest_decline_pct(ctx, expr, end):
+    window = _window(ctx, expr['field'], expr['bars'], end)
+    if window is None or window[0] == 0:
+        return np.nan
+    return float((window[0] - window[-1]) / window[0])
+
+def _latest_bar_count(ctx, expr, end):
+    return float(min(end, expr['bars']))
+
+def _latest_ema_distance_max(ctx, expr, end):
+    # Same seeded-window reconstruction as _ema_distance_max, for the one candle at end - 1
+    span, seed, bars = expr['span'], expr['seed'], expr['bars']
+    seed_index = end - seed
+    if seed_index < 0:
+        return np.nan
+    close = ctx.values(expr['field'])
+    ema = ctx.values(f"ema{span}")
+    decay = 1 - 2 / (span + 1)
+    k = np.arange(min(bars, end))
+    positions = end - 1 - k
+    window_ema = ema[positions] + decay ** (seed - 1 - k) * (close[seed_index] - ema[seed_index])
+    distance = np.abs(close[positions] - window_ema) / close[positions]
+    return float(np.fmax.reduce(distance))
+
+LATEST_INDICATORS = {
+    'max': _latest_reduction(np.max),
+    'min': _latest_reduction(np.min),
+    'mean': _latest_reduction(lambda window: window.sum() / len(window)),
+    'sum': _latest_reduction(np.sum),
+    'range_pct': _latest_range_pct,
+    'count_between': _latest_count_between,
+    'monotonic_down': _latest_monotonic_down,
+    'decline_pct': _latest_decline_pct,
+    'bar_count': _latest_bar_count,
+    'ema_distance_max': _latest_ema_distance_max
+}
+
+def _last(value):
+    return value.iloc[-1] if isinstance(value, pd.Series) else value
+
+def _threshold_value(ctx, threshold):
+    if isinstance(threshold, dict):
+        return ctx.expression(threshold) * threshold.get('scale', 1)
+    return threshold
+
+def _holds(ctx, clause):
+    """The comparison of a clause, a boolean series or a single boolean depending on the context"""
+    value = ctx.expression(clause)
+    compare = clause['compare']
+    if compare == 'between':
+        low, high = (_threshold_value(ctx, t) for t in clause['threshold'])
+        result = (value >= low) & (value <= high)
+    else:
+        threshold = _threshold_value(ctx, clause['threshold'])
+        if compare == '<':
+            result = value < threshold
+        elif compare == '<=':
+            result = value <= threshold
+        elif compare == '>':
+            result = value > threshold
+        elif compare == '>=':
+            result = value >= threshold
+        else:
+            raise ValueError(f"Unknown comparison '{compare}'")
+    return result
+
+def evaluate_clause(ctx, clause):
+    return _holds(ctx, clause).fillna(False).astype(bool)
+
+def clause_margin(ctx, clause):
+    """Signed distance from the threshold at the last candle, relative to the threshold and clipped to [-1, 1]
+
+    Positive when the clause holds; for 'between' it is 1 in the middle of the range and 0 at its edges.
+    """
+    value = _last(ctx.expression(clause))
+    compare = clause['compare']
+    if compare == 'between':
+        low, high = (_last(_threshold_value(ctx, t)) for t in clause['threshold'])
+        half_width = (high - low) / 2
+        margin = min(value - low, high - value) / (half_width or 1.0)
+    else:
+        threshold = _last(_threshold_value(ctx, clause['threshold']))
+        distance = threshold - value if compare in ('<', '<=') else value - threshold
+        margin = distance / (abs(threshold) or 1.0)
+    return -1.0 if np.isnan(margin) else float(np.clip(margin, -1.0, 1.0))
+
+def _clauses(condition):
+    return condition['all'] if 'all' in condition else [condition]
+
+class CompiledPatterns:
+    """Evaluator for a set of patterns; clauses and indicators shared between patterns are computed once"""
+
+    def __init__(self, pattern_types):
+        self.pattern_types = [p for p in pattern_types if p.lower() in PATTERN_DEFINITIONS]
+        self.definitions = {p: PATTERN_DEFINITIONS[p.lower()] for p in self.pattern_types}
+
+        # Unique clauses in first-use order; conditions refer to them by key
+        self.clauses = {}
+        self.plan = {}
+        lookbacks = [60]
+        for pattern_type, definition in self.definitions.items():
+            self.plan[pattern_type] = []
+            lookbacks.append(definition.get('min_bars', 60))
+            for condition in definition['conditions']:
+                keys = []
+                for clause in _clauses(condition):
+                    key = clause_key(clause)
+                    self.clauses.setdefault(key, clause)
+                    keys.append(key)
+                    lookbacks.append(expression_lookback(clause))
+                    for threshold in clause['threshold'] if isinstance(clause['threshold'], list) else [clause['threshold']]:
+                        if isinstance(threshold, dict):
+                            lookbacks.append(expression_lookback(threshold))
+                self.plan[pattern_type].append((condition['name'], keys))
+        self.lookback = max(lookbacks)
+        # Seconds per clause and (evaluated, met) per condition, learned across tickers for early exit
+        self.clause_cost = {}
+        self.condition_stats = {}
+
+    def condition_frames(self, data, clause_seconds=None):
+        """Condition flags of every pattern at every candle, each evaluated on the history up to that candle
+
+        When clause_seconds is a dict it receives the evaluation time of every clause.
+        """
+        return self._evaluate(EvaluationContext(data), clause_seconds)
+
+    def _evaluate(self, ctx, clause_seconds=None):
+        data = ctx.data
+        if clause_seconds is None:
+            clause_results = {key: evaluate_clause(ctx, clause) for key, clause in self.clauses.items()}
+        else:
+            clause_results = {}
+            for key, clause in self.clauses.items():
+                started = time.perf_counter()
+                clause_results[key] = evaluate_clause(ctx, clause)
+                clause_seconds[key] = time.perf_counter() - started
+        frames = {}
+        for pattern_type, conditions in self.plan.items():
+            frame = pd.DataFrame(index=data.index)
+            for name, keys in conditions:
+                flags = clause_results[keys[0]]
+                for key in keys[1:]:
+                    flags = flags & clause_results[key]
+                frame[name] = flags
+            frames[pattern_type] = frame
+        return frames
+
+    def signals(self, data):
+        positions = np.arange(len(data))
+        signals = {}
+        for pattern_type, frame in self.condition_frames(data).items():
+            min_bars = max(60, self.definitions[pattern_type].get('min_bars', 60))
+            signals[pattern_type] = frame.all(axis=1) & (positions >= min_bars - 1)
+        return signals
+
+    def latest_conditions(self, data, clause_seconds=None, scores=None, needed=None):
+        """Condition flags for the last candle only, evaluated on the shortest tail that gives the same answer
+
+        When scores is a dict it receives each pattern's score: the mean over conditions of the
+        weakest clause margin, in [-1, 1], with a match at or above 0 on every condition. needed maps a
+        pattern to the number of met conditions still worth knowing about, e.g. its logging
+        threshold: its conditions then run cheapest per rejection first, and evaluation stops once
+        the pattern can neither match nor reach that count. The skipped conditions are reported
+        as not met and the score is an upper bound, with every skipped condition at the maximum.
+        """
+        ctx = LatestContext(data.tail(self.lookback))
+        results = {}
+        for pattern_type, conditions in self.plan.items():
+            stop_below = None
+            order = conditions
+            if needed is not None and pattern_type in needed:
+                stop_below = min(needed[pattern_type], len(conditions))
+                order = self._condition_order(pattern_type)
+            met = {}
+            for position, (name, keys) in enumerate(order):
+                if stop_below is not None and sum(met.values()) + len(order) - position < stop_below:
+                    break
+                # Every clause runs, so the margins and costs of the condition are all known
+                met[name] = all([self._latest_clause(ctx, key, clause_seconds) for key in keys])
+                stats = self.condition_stats.setdefault((pattern_type, name), [0, 0])
+                stats[0] += 1
+                stats[1] += met[name]
+            results[pattern_type] = {name: met.get(name, False) for name, _ in conditions}
+            if scores is not None:
+                # Margins are clipped to 1, so a skipped condition counts at the most it could score
+                scores[pattern_type] = float(np.mean([
+                    min(clause_margin(ctx, self.clauses[key]) for key in keys) if name in met else 1.0
+                    for name, keys in conditions
+                ]))
+        return results
+
+    def _latest_clause(self, ctx, key, clause_seconds=None):
+        if key not in ctx.flags:
+            started = time.perf_counter()
+            ctx.flags[key] = bool(_holds(ctx, self.clauses[key]))
+            seconds = time.perf_counter() - started
+            if clause_seconds is not None:
+                clause_seconds[key] = seconds
+            previous = self.clause_cost.get(key)
+            self.clause_cost[key] = seconds if previous is None else 0.9 * previous + 0.1 * seconds
+        return ctx.flags[key]
+
+    def _condition_order(self, pattern_type):
+        """Conditions by expected cost per rejection: clause seconds over the observed failure rate"""
+        def cost_per_rejection(condition):
+            name, keys = condition
+            cost = sum(self.clause_cost.get(key, 0.0) for key in keys)
+            evaluated, passed = self.condition_stats.get((pattern_type, name), (0, 0))
+            # Smoothed, so a condition seen only passing still gets a small failure rate
+            return cost * (evaluated + 2) / (evaluated - passed + 1)
+        return sorted(self.plan[pattern_type], key=cost_per_rejection)
+
+    def pattern_seconds(self, clause_seconds):
+        """Evaluation time per pattern; a clause shared by several patterns is charged to each of them"""
+        return {
+            pattern_type: sum(clause_seconds.get(key, 0.0) for key in {key for _, keys in conditions for key in keys})
+            for pattern_type, conditions in self.plan.items()
+        }
+
+@lru_cache(maxsize=None)
+def _compile(pattern_types):
+    return CompiledPatterns(pattern_types)
+
+def compile_patterns(pattern_types):
+    return _compile(tuple(pattern_types))
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from metrics import SCAN_SECONDS, TICKERS_SCANNED, LAST_SCAN
+
+PERF_LOG_DIR = "perf_logs"
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, float('inf'))
+
+class StageStats:
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile"""
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= target and count:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': round(self.total, 6),
+            'mean': round(self.total / self.count, 6) if self.count else 0.0,
+            'min': round(self.min, 6) if self.count else 0.0,
+            'max': round(self.max, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'buckets': dict(zip([str(b) for b in BUCKETS], self.buckets))
+        }
+
+class PerfRecorder:
+    """Stage timers and counters for one scan; a few dict updates per call, so it stays on in the hot path"""
+
+    # Start times for stages that span too much code for a with block
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.started = time.perf_counter()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.add(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'wall_seconds': round(time.perf_counter() - self.started, 3),
+                'stages': {stage: stats.to_dict() for stage, stats in self.stages.items()},
+                'counters': dict(self.counters)
+            }
+
+    def report(self, processed=None):
+        snapshot = self.snapshot()
+        wall = snapshot['wall_seconds']
+        lines = [f"Scan time breakdown ({wall:.1f}s wall" +
+                 (f", {processed} stocks, {processed / max(wall, 1e-9):.1f} stocks/s)" if processed else ")")]
+        lines.append(f"{'stage':<22}{'calls':>7}{'total':>10}{'share':>8}{'mean':>10}{'p95':>10}{'max':>10}")
+        stages = sorted(snapshot['stages'].items(), key=lambda item: -item[1]['total'])
+        for stage, stats in stages:
+            share = stats['total'] / wall * 100 if wall else 0
+            lines.append(
+                f"{stage:<22}{stats['count']:>7}{stats['total']:>9.2f}s{share:>7.1f}%"
+                f"{stats['mean'] * 1000:>8.1f}ms{stats['p95'] * 1000:>8.1f}ms{stats['max'] * 1000:>8.1f}ms"
+            )
+        if 'ticker' in snapshot['stages']:
+            lines.append("(ticker is the whole per-ticker step; fetch, detection, logging, record and company_name run inside it)")
+        if snapshot['counters']:
+            lines.append("counters: " + ", ".join(f"{name}={value}" for name, value in sorted(snapshot['counters'].items())))
+        return "\n".join(lines)
+
+    def write_record(self, log_dir=PERF_LOG_DIR, **context):
+        """Appends this scan's snapshot to perf_logs/scan_perf.jsonl for trend tracking"""
+        record = {'timestamp': datetime.now().isoformat(), **context, **self.snapshot()}
+        source = context.get('source', 'scan')
+        SCAN_SECONDS.observe(record['wall_seconds'], source=source)
+        TICKERS_SCANNED.inc(context.get('scanned', 0), source=source)
+        LAST_SCAN.set(time.time(), source=source)
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            with open(os.path.join(log_dir, "scan_perf.jsonl"), 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            print(f"Error writing performance record: {e}")
+        return record
+
+# Process-wide recorder, used by the command line tools and wherever no scan recorder is active
+recorder = PerfRecorder()
+_active = contextvars.ContextVar('perf_recorder', default=None)
+
+def current():
+    """Recorder of the scan running in this thread, or the process-wide one"""
+    return _active.get() or recorder
+
+@contextmanager
+def recording(scan_recorder):
+    """Sends timed and count in this thread to scan_recorder, so concurrent app sessions keep their timings apart"""
+    token = _active.set(scan_recorder)
+    try:
+        yield scan_recorder
+    finally:
+        _active.reset(token)
+
+def timed(stage):
+    return current().timed(stage)
+
+def count(name, n=1):
+    current().count(name, n)
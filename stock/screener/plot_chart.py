@@ -9,12 +9,18 @@ except ImportError as e:
     print("1. Activate your virtual environment")
     print("2. Run: pip install mplfinance")
     raise
+from compact_bars import as_frame
+from perf import timed
 
 def plot_candlestick(data, ticker, company_name):
+    with timed('chart_render'):
+        _plot_candlestick(data, ticker, company_name)
+
+def _plot_candlestick(data, ticker, company_name):
     try:
         plt.close('all')
         
-        mpf.plot(data, 
+        mpf.plot(as_frame(data), 
                 type='candle', 
                 style='charles',
                 title=f"{company_name} ({ticker})",
@@ -0,0 +1,182 @@
+import os
+import json
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from pattern_dsl import compile_patterns
+from atomic_io import atomic_file
+
+METADATA_DIR = "metadata"
+
+EQUITY_LIST_URLS = [
+    "https://archives.nseindia.com/content/equities/EQUITY_L.csv",
+    "https://www1.nseindia.com/content/equities/EQUITY_L.csv"
+]
+
+# Candles per NSE session for each interval of the form
+BARS_PER_SESSION = {'15m': 25, '30m': 13, '1h': 7, '1d': 1, '5d': 0.2}
+
+SKIP_REASONS = {
+    'listed_too_recently': "Listed too recently to have enough candles",
+    'too_few_bars': "Too few candles in the last fetch",
+    'illiquid': "Average volume below minimum",
+    'price_below_minimum': "Last price below minimum"
+}
+
+def load_listing_dates(metadata_dir=METADATA_DIR, max_age_days=7):
+    """Listing date per ticker from NSE's EQUITY_L.csv, kept locally and refreshed weekly"""
+    local_file = os.path.join(metadata_dir, "EQUITY_L.csv")
+    try:
+        is_fresh = (os.path.exists(local_file) and
+                    datetime.now() - datetime.fromtimestamp(os.path.getmtime(local_file)) < timedelta(days=max_age_days))
+        if is_fresh:
+            df = pd.read_csv(local_file)
+        else:
+            df = pd.DataFrame()
+            for url in EQUITY_LIST_URLS:
+                try:
+                    df = pd.read_csv(url)
+                    if not df.empty:
+                        os.makedirs(metadata_dir, exist_ok=True)
+                        df.to_csv(local_file, index=False)
+                        break
+                except Exception:
+                    continue
+            if df.empty and os.path.exists(local_file):
+                df = pd.read_csv(local_file)
+        if df.empty:
+            return {}
+
+        df.columns = [c.strip() for c in df.columns]
+        listed = pd.to_datetime(df['DATE OF LISTING'], format='%d-%b-%Y', errors='coerce')
+        return {
+            f"{symbol}.NS": date.date()
+            for symbol, date in zip(df['SYMBOL'], listed)
+            if not pd.isna(date)
+        }
+    except Exception as e:
+        print(f"Error loading listing dates: {e}")
+        return {}
+
+class TickerPrefilter:
+    """Drops tickers that cannot produce a match before their history is downloaded"""
+
+    def __init__(self, interval, patterns, store=None, metadata_dir=METADATA_DIR,
+                 min_avg_volume=0, min_price=0, listing_dates=None, max_metadata_age_days=7):
+        self.interval = interval
+        self.store = store
+        self.metadata_dir = metadata_dir
+        self.min_avg_volume = min_avg_volume
+        self.min_price = min_price
+        self.max_metadata_age = timedelta(days=max_metadata_age_days)
+
+        # Any selected pattern may match, so the least demanding one decides
+        compiled = compile_patterns(patterns)
+        self.required_bars = max(60, min(
+            [compiled.definitions[p].get('min_bars', 60) for p in compiled.pattern_types] or [60]
+        ))
+
+        self.listing_dates = listing_dates if listing_dates is not None else load_listing_dates(metadata_dir)
+        self.metadata_file = os.path.join(metadata_dir, f"ticker_metadata_{interval}.json")
+        self.metadata = self._load_metadata()
+        self.skipped = {reason: [] for reason in SKIP_REASONS}
+
+    def _load_metadata(self):
+        if not os.path.exists(self.metadata_file):
+            return {}
+        try:
+            with open(self.metadata_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error reading ticker metadata: {e}")
+            return {}
+
+    def save(self):
+        try:
+            with atomic_file(self.metadata_file) as f:
+                json.dump(self.metadata, f)
+        except Exception as e:
+            print(f"Error saving ticker metadata: {e}")
+
+    def record(self, ticker, data, has_period_issues=False, scores=None):
+        """Remembers the cheap facts of a fetched history, and its pattern scores, for the next scan"""
+        # A fallback period returns a shortened history that says nothing about the next fetch
+        if data is None or data.empty or has_period_issues:
+            return
+        # Scores of patterns not in this scan are kept; they stay usable as bounds within their slack
+        previous_scores = self.metadata.get(ticker, {}).get('scores', {})
+        self.metadata[ticker] = {
+            'bar_count': int(len(data)),
+            'avg_volume': float(data['Volume'].tail(120).mean()),
+            'last_price': float(data['Close'].iloc[-1]),
+            'last_bar': pd.Timestamp(data.index[-1]).isoformat(),
+            'updated': datetime.now().isoformat()
+        }
+        scores = {**previous_scores, **{pattern: round(score, 4) for pattern, score in (scores or {}).items()}}
+        if scores:
+            self.metadata[ticker]['scores'] = scores
+
+    def _known_facts(self, ticker):
+        facts = self.metadata.get(ticker)
+        if facts and datetime.now() - datetime.fromisoformat(facts['updated']) < self.max_metadata_age:
+            return facts
+        if self.store is not None and self.store.has_interval(ticker, self.interval):
+            # Non-base intervals are resampled from the stored base bars, so the count comes from the result
+            bars = self.store.read_interval(ticker, self.interval)
+            if not bars.empty:
+                return {
+                    'bar_count': len(bars),
+                    'avg_volume': float(bars['Volume'].tail(120).mean()),
+                    'last_price': float(bars['Close'].iloc[-1]),
+                    'last_bar': pd.Timestamp(bars.index[-1]).isoformat()
+                }
+        return None
+
+    def _sessions_since(self, day):
+        return int(np.busday_count(day, datetime.now().date() + timedelta(days=1)))
+
+    def check(self, ticker):
+        """Returns the skip reason for a ticker, or None when it has to be scanned"""
+        bars_per_session = BARS_PER_SESSION.get(self.interval)
+
+        listed = self.listing_dates.get(ticker)
+        if listed and bars_per_session:
+            if self._sessions_since(listed) * bars_per_session < self.required_bars:
+                return 'listed_too_recently'
+
+        facts = self._known_facts(ticker)
+        if not facts:
+            return None
+
+        if bars_per_session and facts.get('last_bar'):
+            # Candles that can have been added since the last fetch
+            last_bar = pd.Timestamp(facts['last_bar']).date()
+            new_bars = max(0, self._sessions_since(last_bar) - 1) * bars_per_session
+            if facts['bar_count'] + new_bars < self.required_bars:
+                return 'too_few_bars'
+
+        if self.min_avg_volume and facts.get('avg_volume', 0) < self.min_avg_volume:
+            return 'illiquid'
+        if self.min_price and facts.get('last_price', 0) < self.min_price:
+            return 'price_below_minimum'
+        return None
+
+    def filter(self, tickers):
+        kept = []
+        for ticker in tickers:
+            reason = self.check(ticker)
+            if reason:
+                self.skipped[reason].append(ticker)
+            else:
+                kept.append(ticker)
+        return kept
+
+    def skip_counts(self):
+        return {reason: len(tickers) for reason, tickers in self.skipped.items() if tickers}
+
+    def report(self):
+        counts = self.skip_counts()
+        if not counts:
+            return "Pre-filter skipped no stocks"
+        details = ", ".join(f"{SKIP_REASONS[reason]}: {count}" for reason, count in counts.items())
+        return f"Pre-filter skipped {sum(counts.values())} stocks without fetching ({details})"
@@ -0,0 +1,142 @@
+import os
+import time
+import signal
+import argparse
+import threading
+from datetime import datetime, timedelta
+import pytz
+from cache_manager import CacheManager
+from data_providers import get_provider, PROVIDERS
+from scanner import run_scan, make_prefilter, make_feature_store, PATTERNS
+from perf import recorder
+import metrics
+
+IST = pytz.timezone('Asia/Kolkata')
+# Comma-separated exchange times, e.g. SCREENER_PREWARM_TIMES=08:30,12:30
+PREWARM_TIMES_ENV = "SCREENER_PREWARM_TIMES"
+# Before the 09:15 open; cached results stay valid for 12 hours, i.e. through the session
+PREWARM_TIMES = "08:30"
+# Every combination the UI offers; intervals sharing a base interval run back to back so the stored bars are reused
+PREWARM_INTERVALS = ["15m", "30m", "1h", "1d", "5d"]
+PREWARM_EXCHANGES = ["NSE", "NIFTY50", "ALL"]
+# Pre-warm checkpoints are kept apart from those of UI scans
+PREWARM_PROGRESS_TAG = "prewarm"
+
+def parse_times(text):
+    """'08:30,12:30' -> [(8, 30), (12, 30)]"""
+    times = []
+    for part in text.split(','):
+        hour, minute = part.strip().split(':')
+        times.append((int(hour), int(minute)))
+    return sorted(times)
+
+def next_run(times, now=None, weekdays_only=True):
+    """Next scheduled time after now, skipping weekends when the market is closed"""
+    now = now or datetime.now(IST)
+    for days in range(8):
+        day = now + timedelta(days=days)
+        if weekdays_only and day.weekday() >= 5:
+            continue
+        for hour, minute in times:
+            candidate = day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if candidate > now:
+                return candidate
+    return None
+
+def lower_priority():
+    """Runs the process at idle CPU priority where the OS has one, so interactive scans come first"""
+    if hasattr(os, 'sched_setscheduler') and hasattr(os, 'SCHED_IDLE'):
+        try:
+            os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+            return "idle"
+        except OSError:
+            pass
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(19)
+            return "nice 19"
+        except OSError:
+            pass
+    return "normal"
+
+def prewarm(provider, intervals=PREWARM_INTERVALS, exchanges=PREWARM_EXCHANGES, patterns=PATTERNS,
+            cache_manager=None, should_stop=None):
+    """Runs one fresh multi-pattern scan per (interval, exchange) and publishes every pattern's results
+
+    Results are written with save_multi_results and save_final_results per pattern, so a UI scan of
+    any pattern subset is answered from the cache. Returns the (interval, exchange) pairs published.
+    """
+    cache_manager = cache_manager or CacheManager(provider=provider, progress_tag=PREWARM_PROGRESS_TAG)
+    published = []
+    for interval in intervals:
+        for exchange in exchanges:
+            if should_stop and should_stop():
+                return published
+            recorder.reset()
+            started = time.perf_counter()
+            tickers = provider.list_universe(exchange)
+            if not tickers:
+                # Publishing an empty scan would hide the failure from users until the cache expires
+                print(f"Skipping {interval} {exchange}: unable to fetch the stock list")
+                continue
+
+            # A checkpoint left from an earlier pre-warm would be resumed with older bars; the
+            # checkpoints of interactive scans are kept under other keys and stay untouched
+            cache_manager.clear_multi_progress(interval, exchange)
+            results = run_scan(patterns, interval, exchange, tickers=tickers, cache_manager=cache_manager,
+                               should_stop=should_stop, prefilter=make_prefilter(provider, interval, patterns),
+                               provider=provider, features=make_feature_store(provider, interval))
+            if not results['completed']:
+                print(f"Pre-warm of {interval} {exchange} stopped, progress saved")
+                return published
+
+            # Per-pattern final results take precedence over the multi-pattern ones in the UI
+            for pattern in patterns:
+                cache_manager.save_final_results(pattern, interval, exchange, results['pattern_matches'][pattern],
+                                                 results['stocks_with_issues'], results['total_stocks'])
+            published.append((interval, exchange))
+            matches = ", ".join(f"{pattern}: {len(records)}" for pattern, records in results['pattern_matches'].items())
+            print(f"Published {interval} {exchange} ({results['total_stocks']} stocks, "
+                  f"{time.perf_counter() - started:.0f}s): {matches}")
+    return published
+
+def run_daemon(provider, times, intervals=PREWARM_INTERVALS, exchanges=PREWARM_EXCHANGES, patterns=PATTERNS):
+    """Pre-warms the cache at every scheduled time until SIGTERM or Ctrl+C"""
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    while not stop.is_set():
+        when = next_run(times)
+        print(f"Next pre-warm at {when:%Y-%m-%d %H:%M} IST")
+        if stop.wait(max(0.0, (when - datetime.now(IST)).total_seconds())):
+            break
+        prewarm(provider, intervals, exchanges, patterns, should_stop=stop.is_set)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-compute scan results into the cache on a schedule")
+    parser.add_argument("--times", default=os.environ.get(PREWARM_TIMES_ENV, PREWARM_TIMES),
+                        help="comma-separated HH:MM exchange times, defaults to $SCREENER_PREWARM_TIMES or 08:30")
+    parser.add_argument("--interval", action="append", dest="intervals", help="defaults to every UI interval")
+    parser.add_argument("--exchange", action="append", dest="exchanges", help="defaults to every UI exchange")
+    parser.add_argument("--pattern", action="append", dest="patterns", choices=PATTERNS)
+    parser.add_argument("--provider", choices=sorted(PROVIDERS),
+                        help="data source, defaults to $SCREENER_PROVIDER or yahoo")
+    parser.add_argument("--data-dir", help="directory read by the local provider")
+    parser.add_argument("--once", action="store_true", help="pre-warm now and exit, e.g. from cron")
+    parser.add_argument("--normal-priority", action="store_true", help="do not lower the process priority")
+    parser.add_argument("--metrics-port", type=int, help="defaults to $SCREENER_METRICS_PORT")
+    args = parser.parse_args()
+
+    provider = get_provider(args.provider, data_dir=args.data_dir)
+    intervals = args.intervals or PREWARM_INTERVALS
+    exchanges = args.exchanges or PREWARM_EXCHANGES
+    patterns = args.patterns or PATTERNS
+    if not args.normal_priority:
+        print(f"Running at {lower_priority()} priority")
+    metrics.start_server(args.metrics_port)
+
+    if args.once:
+        prewarm(provider, intervals, exchanges, patterns)
+    else:
+        run_daemon(provider, parse_times(args.times), intervals, exchanges, patterns)
@@ -0,0 +1,53 @@
+import os
+from pattern_detection import get_scan_folder_name, read_summary
+from pattern_definitions import PATTERN_DEFINITIONS
+
+def previous_matches(cache_manager, patterns, interval, exchange):
+    """Tickers that matched any of the patterns in the last cached scan"""
+    matched = set()
+    if cache_manager is None:
+        return matched
+    for pattern in patterns:
+        matched.update(cache_manager.matched_tickers(pattern, interval, exchange))
+    return matched
+
+def near_matches(patterns, interval, exchange, log_dir="pattern_logs"):
+    """Best fraction of conditions met per ticker, from the pattern summaries of earlier scans"""
+    closeness = {}
+    for pattern in patterns:
+        definition = PATTERN_DEFINITIONS.get(pattern.lower())
+        if not definition:
+            continue
+        total = len(definition['conditions'])
+        summary_file = os.path.join(log_dir, get_scan_folder_name(pattern, interval, exchange), "pattern_summary.txt")
+        try:
+            summary = read_summary(summary_file)
+        except Exception as e:
+            print(f"Error reading pattern summary: {e}")
+            continue
+        for count, tickers in summary.items():
+            for ticker in tickers:
+                closeness[ticker] = max(closeness.get(ticker, 0.0), count / total)
+    return closeness
+
+def turnover(metadata):
+    """Average traded value per ticker from the pre-filter's metadata"""
+    return {
+        ticker: facts.get('avg_volume', 0.0) * facts.get('last_price', 0.0)
+        for ticker, facts in (metadata or {}).items()
+    }
+
+def rank_tickers(tickers, patterns, interval, exchange, cache_manager=None, metadata=None, log_dir="pattern_logs"):
+    """Orders the universe so likely matches are scanned first; every ticker is kept
+
+    Previous matches come first, then near-matches by fraction of conditions met, then the
+    rest, each group by traded value. Ties keep the listing order.
+    """
+    matched = previous_matches(cache_manager, patterns, interval, exchange)
+    closeness = near_matches(patterns, interval, exchange, log_dir)
+    liquidity = turnover(metadata)
+    return sorted(tickers, key=lambda ticker: (
+        ticker not in matched,
+        -closeness.get(ticker, 0.0),
+        -liquidity.get(ticker, 0.0)
+    ))
@@ -0,0 +1,97 @@
+import os
+import sys
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# SCREENER_PROFILE=1 writes to profiles/, any other value is taken as the output directory
+PROFILE_ENV = "SCREENER_PROFILE"
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL = 0.005
+
+def profile_dir():
+    value = os.environ.get(PROFILE_ENV, "").strip()
+    if value.lower() in ("", "0", "false", "no"):
+        return None
+    return PROFILE_DIR if value.lower() in ("1", "true", "yes") else value
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval and counts collapsed stacks
+
+    The counts are in the folded format flamegraph.pl, speedscope and inferno read directly.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profiled(label, output_dir=None):
+    """Profiles the enclosed block when output_dir or $SCREENER_PROFILE is set, otherwise does nothing
+
+    Each run writes <label>_<time>.prof (load with pstats or snakeviz) and <label>_<time>.collapsed.
+    """
+    output_dir = output_dir or profile_dir()
+    if not output_dir:
+        yield None
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"{label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    profiler = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    profiler.enable()
+    try:
+        yield base
+    finally:
+        profiler.disable()
+        sampler.stop()
+        try:
+            profiler.dump_stats(f"{base}.prof")
+            sampler.write(f"{base}.collapsed")
+            print(f"Profile written to {base}.prof and {base}.collapsed")
+        except Exception as e:
+            print(f"Error writing profile: {e}")
+
+def print_top(path, limit=20, sort='cumulative'):
+    pstats.Stats(path).sort_stats(sort).print_stats(limit)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print the top functions of a saved scan profile")
+    parser.add_argument("path")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--sort", default="cumulative")
+    args = parser.parse_args()
+    print_top(args.path, args.limit, args.sort)
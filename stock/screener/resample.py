@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# Every form interval is derived from one stored base granularity
+BASE_INTERVALS = {'15m': '15m', '30m': '15m', '1h': '15m', '1d': '1d', '5d': '1d'}
+
+INTRADAY_MINUTES = {'15m': 15, '30m': 30, '1h': 60}
+
+# NSE continuous session opens at 09:15 IST; intraday bars are aligned to it, the last one cut at 15:30
+SESSION_OPEN_MINUTE = 9 * 60 + 15
+
+def _to_exchange_time(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        return index.tz_localize('Asia/Kolkata')
+    return index.tz_convert('Asia/Kolkata')
+
+def _aggregate(data, keys):
+    """OHLCV aggregation of consecutive rows sharing a key; data must be sorted by time"""
+    keys = np.asarray(keys)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+    result = pd.DataFrame({
+        'Open': data['Open'].to_numpy(dtype=float)[starts],
+        'High': np.maximum.reduceat(high, starts),
+        'Low': np.minimum.reduceat(low, starts),
+        'Close': data['Close'].to_numpy(dtype=float)[ends],
+        'Volume': np.add.reduceat(data['Volume'].to_numpy(), starts)
+    })
+    return result, starts
+
+def resample_ohlcv(data, interval):
+    """Builds coarser bars from finer ones: 15m -> 30m/1h/1d and 1d -> 5d"""
+    if data.empty:
+        return data
+    data = data.sort_index()
+    index = _to_exchange_time(data.index)
+
+    if interval in INTRADAY_MINUTES:
+        minutes = INTRADAY_MINUTES[interval]
+        minute_of_day = index.hour * 60 + index.minute
+        # Bins restart at 09:15 each session, so no bar spans two sessions
+        slot = np.maximum(minute_of_day - SESSION_OPEN_MINUTE, 0) // minutes
+        session_day = index.normalize()
+        bin_start = session_day + pd.to_timedelta(SESSION_OPEN_MINUTE + slot * minutes, unit='min')
+        bars, starts = _aggregate(data, bin_start.asi8)
+        bars.index = bin_start[starts]
+
+    elif interval == '1d':
+        session_day = index.normalize()
+        bars, starts = _aggregate(data, session_day.asi8)
+        bars.index = session_day[starts]
+
+    elif interval == '5d':
+        # Calendar weeks from Monday, so a past bar keeps its sessions however much history is stored;
+        # only the current week's bar grows, like the day's bar built from 15m. Holidays shorten a week
+        session_day = index.normalize()
+        daily, starts = _aggregate(data, session_day.asi8)
+        daily.index = session_day[starts]
+        week_start = daily.index - pd.to_timedelta(daily.index.dayofweek, unit='D')
+        bars, starts = _aggregate(daily, week_start.asi8)
+        bars.index = daily.index[starts]
+
+    else:
+        raise ValueError(f"Cannot resample to '{interval}'")
+
+    bars.index.name = data.index.name or 'Datetime'
+    return bars
@@ -0,0 +1,31 @@
+import pandas as pd
+
+def make_record(ticker, company_name, data, interval, matched=(), has_period_issues=False, conditions=None,
+                scores=None):
+    """Summary of one scan result; the bars stay in the store and are loaded when a chart is opened
+
+    conditions and scores are the flags and scores detect_patterns filled in for the same bars.
+    """
+    close = data['Close']
+    scores = scores or {}
+    return {
+        'ticker': ticker,
+        'company_name': company_name,
+        'interval': interval,
+        'last_bar': pd.Timestamp(data.index[-1]).isoformat(),
+        'bar_count': int(len(data)),
+        'last_price': float(close.iloc[-1]),
+        'change_pct': float((close.iloc[-1] / close.iloc[-2] - 1) * 100) if len(close) > 1 else 0.0,
+        'avg_volume': float(data['Volume'].tail(20).mean()),
+        'has_period_issues': bool(has_period_issues),
+        'patterns': list(matched),
+        'conditions': conditions or {},
+        'scores': {pattern: round(score, 4) for pattern, score in scores.items()}
+    }
+
+def load_record_bars(record, provider):
+    """Bars behind a result, cut at the candle the result was computed on"""
+    data, _ = provider.get_bars(record['ticker'], record['interval'])
+    if data.empty:
+        return data
+    return data[data.index <= pd.Timestamp(record['last_bar'])]
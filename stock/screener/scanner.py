@@ -0,0 +1,258 @@
+import time
+import argparse
+import os
+from pattern_detection import detect_patterns
+from cache_manager import CacheManager
+from prefilter import TickerPrefilter, METADATA_DIR
+from data_providers import get_provider, PROVIDERS, PROVIDER_ENV
+from results import make_record
+from perf import PerfRecorder, recorder, current, timed
+import metrics
+from profiling import profiled, PROFILE_DIR
+from priority import rank_tickers
+from feature_store import FeatureStore
+from scoring import TopK, score_bounds, order_by_bound, cannot_improve, SCORE_SLACK
+
+PATTERNS = ["Volatility Contraction", "Low Volume Stock Selection", "15% Reversal"]
+# Tickers whose bars the provider may fetch concurrently ahead of the per-ticker loop
+PREFETCH_BATCH = 200
+
+def scan_ticker(ticker, interval, patterns, exchange="NSE", provider=None):
+    """Fetches one ticker once and evaluates every selected pattern on the same data"""
+    provider = provider or get_provider()
+    with timed('fetch'):
+        data, has_period_issues = provider.get_bars(ticker, interval)
+    if data.empty:
+        return None
+
+    scores = {}
+    conditions = {}
+    matches = detect_patterns(data, patterns, ticker=ticker, interval=interval, exchange=exchange, scores=scores,
+                              conditions=conditions)
+    matched_patterns = [pattern for pattern in patterns if matches[pattern]]
+
+    # The company name is only shown for results, so skip the scrape for everything else
+    company_name = None
+    if matched_patterns or has_period_issues:
+        with timed('company_name'):
+            company_name = provider.get_metadata(ticker)['company_name']
+
+    return {
+        'ticker': ticker,
+        'company_name': company_name,
+        'data': data,
+        'has_period_issues': has_period_issues,
+        'matched_patterns': matched_patterns,
+        'conditions': conditions,
+        'scores': scores
+    }
+
+def scan_and_record(ticker, interval, patterns, exchange="NSE", provider=None, prefilter=None, features=None):
+    """scan_ticker plus the result record kept for matches and tickers with period issues"""
+    # 'ticker' covers everything done for one ticker, so its histogram is the per-ticker latency
+    with timed('ticker'):
+        result = scan_ticker(ticker, interval, patterns, exchange, provider)
+        if result and prefilter is not None:
+            prefilter.record(ticker, result['data'], result['has_period_issues'], result['scores'])
+        if result and features is not None:
+            with timed('features'):
+                features.update(ticker, result['data'])
+        if result and (result['matched_patterns'] or result['has_period_issues']):
+            # Results keep a summary only; the bars are read back from the store for charts
+            with timed('record'):
+                result['record'] = make_record(ticker, result['company_name'], result['data'], interval,
+                                               matched=result['matched_patterns'],
+                                               has_period_issues=result['has_period_issues'],
+                                               conditions=result['conditions'], scores=result['scores'])
+    return result
+
+def record_first_result(scan_started, source):
+    """Seconds from scan start to the first match, kept in the perf record and the metrics"""
+    elapsed = PerfRecorder.clock() - scan_started
+    current().record('first_result', elapsed)
+    metrics.TIME_TO_FIRST_RESULT.observe(elapsed, source=source)
+    return elapsed
+
+def provider_metadata_dir(provider):
+    return METADATA_DIR if provider.name == 'yahoo' else os.path.join(METADATA_DIR, provider.name)
+
+def make_prefilter(provider, interval, patterns, min_avg_volume=0, min_price=0):
+    """Pre-filter reading the provider's own store, with metadata kept apart per provider"""
+    return TickerPrefilter(interval, patterns, store=provider.store, metadata_dir=provider_metadata_dir(provider),
+                           min_avg_volume=min_avg_volume, min_price=min_price,
+                           listing_dates=provider.listing_dates())
+
+def make_feature_store(provider, interval):
+    """Feature table kept next to the provider's ticker metadata"""
+    return FeatureStore(interval, root=provider_metadata_dir(provider))
+
+def run_scan(patterns, interval, exchange, tickers=None, cache_manager=None, on_result=None, should_stop=None,
+             checkpoint_every=10, prefilter=None, provider=None, prioritize=True, top_k=None, score_slack=SCORE_SLACK,
+             features=None, on_prefetch=None):
+    """Headless multi-pattern scan with the same checkpoint and final-result format as the UI
+
+    With top_k, only the top_k best-scored matches per pattern are kept, and the scan stops once the
+    cached score bounds of the remaining tickers cannot beat any pattern's K-th score. A top-K scan
+    is a partial view of the universe, so it neither resumes from nor writes the scan cache.
+    Bars are prefetched PREFETCH_BATCH tickers at a time; should_stop also cancels a prefetch in
+    flight, and on_prefetch(done, total) is called while one runs. Timings go to the active
+    recorder, see perf.recording.
+    """
+    provider = provider or get_provider()
+    scan_started = PerfRecorder.clock()
+    cache_manager = cache_manager or CacheManager(provider=provider)
+    if tickers is None:
+        with timed('ticker_list'):
+            tickers = provider.list_universe(exchange)
+    with timed('prepare'):
+        provider.prepare(interval)
+    if prefilter is not None:
+        with timed('prefilter'):
+            tickers = prefilter.filter(tickers)
+
+    progress = cache_manager.get_multi_progress(patterns, interval, exchange) if not top_k else None
+    if progress:
+        processed_stocks = progress['processed_stocks']
+        pattern_matches = progress['pattern_matches']
+        stocks_with_issues = progress['stocks_with_issues']
+        total_stocks = progress['total_stocks']
+    else:
+        processed_stocks = set()
+        pattern_matches = {pattern: [] for pattern in patterns}
+        stocks_with_issues = []
+        total_stocks = len(tickers)
+
+    remaining = [t for t in tickers if t not in processed_stocks]
+    if prioritize:
+        with timed('prioritize'):
+            remaining = rank_tickers(remaining, patterns, interval, exchange, cache_manager,
+                                     prefilter.metadata if prefilter is not None else None)
+    top = None
+    if top_k:
+        top = {pattern: TopK(top_k) for pattern in patterns}
+        bounds = score_bounds(remaining, patterns, prefilter.metadata if prefilter is not None else None,
+                              slack=score_slack)
+        remaining, remaining_best = order_by_bound(remaining, bounds)
+    skipped_by_bound = 0
+    time_to_first_result = None
+    resumed = len(processed_stocks)
+    stopped = False
+    for i, ticker in enumerate(remaining):
+        if should_stop and should_stop():
+            stopped = True
+            break
+        if top is not None and cannot_improve(top, patterns, remaining_best[i]):
+            skipped_by_bound = len(remaining) - i
+            break
+        if i % PREFETCH_BATCH == 0:
+            with timed('prefetch'):
+                provider.prefetch(remaining[i:i + PREFETCH_BATCH], interval, should_stop, on_prefetch)
+            if should_stop and should_stop():
+                stopped = True
+                break
+
+        result = scan_and_record(ticker, interval, patterns, exchange, provider, prefilter, features)
+        processed_stocks.add(ticker)
+        if result and 'record' in result:
+            if result['has_period_issues']:
+                stocks_with_issues.append(result['record'])
+            for pattern in result['matched_patterns']:
+                if top is not None:
+                    top[pattern].push(result['scores'][pattern], result['record'])
+                else:
+                    pattern_matches[pattern].append(result['record'])
+            if result['matched_patterns'] and time_to_first_result is None:
+                time_to_first_result = record_first_result(scan_started, 'scanner')
+        if on_result:
+            on_result(ticker, result, len(processed_stocks), total_stocks)
+
+        if i % checkpoint_every == 0 and top is None:
+            cache_manager.save_multi_progress(patterns, interval, exchange, processed_stocks,
+                                              pattern_matches, stocks_with_issues, total_stocks)
+            if prefilter is not None:
+                prefilter.save()
+
+    if prefilter is not None:
+        prefilter.save()
+    if features is not None:
+        features.save()
+    if top is not None:
+        pattern_matches = {pattern: heap.records() for pattern, heap in top.items()}
+    elif stopped:
+        cache_manager.save_multi_progress(patterns, interval, exchange, processed_stocks,
+                                          pattern_matches, stocks_with_issues, total_stocks)
+    else:
+        cache_manager.save_multi_results(patterns, interval, exchange, pattern_matches,
+                                         stocks_with_issues, total_stocks)
+
+    perf = current().write_record(source='scanner', provider=provider.name, interval=interval, exchange=exchange,
+                                      patterns=list(patterns), scanned=len(processed_stocks) - resumed,
+                                      total_stocks=total_stocks, completed=not stopped, prioritized=prioritize,
+                                      time_to_first_result=time_to_first_result, top_k=top_k,
+                                      skipped_by_bound=skipped_by_bound)
+    return {
+        'pattern_matches': pattern_matches,
+        'stocks_with_issues': stocks_with_issues,
+        'processed_stocks': processed_stocks,
+        'total_stocks': total_stocks,
+        'completed': not stopped,
+        'skipped': prefilter.skip_counts() if prefilter is not None else {},
+        'perf': perf,
+        'time_to_first_result': time_to_first_result,
+        'skipped_by_bound': skipped_by_bound
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a screener scan without the UI")
+    parser.add_argument("--pattern", action="append", dest="patterns", choices=PATTERNS)
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--exchange", default="NSE")
+    parser.add_argument("--min-avg-volume", type=float, default=0)
+    parser.add_argument("--min-price", type=float, default=0)
+    parser.add_argument("--no-prefilter", action="store_true")
+    parser.add_argument("--top-k", type=int, help="keep the K best-scored matches per pattern and stop early")
+    parser.add_argument("--score-slack", type=float, default=SCORE_SLACK,
+                        help="how far a cached score may have moved, used for top-K early stopping")
+    parser.add_argument("--no-priority", action="store_true", help="scan in listing order instead of likely matches first")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS),
+                        help="data source, defaults to $SCREENER_PROVIDER or yahoo")
+    parser.add_argument("--data-dir", help="directory read by the local provider")
+    parser.add_argument("--synthetic-tickers", type=int, default=500)
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics on this port while scanning, defaults to $SCREENER_METRICS_PORT")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_DIR, metavar="DIR",
+                        help="write cProfile stats and collapsed stacks of the scan, defaults to $SCREENER_PROFILE")
+    parser.add_argument("tickers", nargs="*")
+    args = parser.parse_args()
+
+    patterns = args.patterns or PATTERNS
+    provider_name = args.provider or os.environ.get(PROVIDER_ENV) or 'yahoo'
+    if provider_name == 'synthetic':
+        provider = get_provider(provider_name, n_tickers=args.synthetic_tickers)
+    else:
+        provider = get_provider(provider_name, data_dir=args.data_dir)
+    metrics.start_server(args.metrics_port)
+    recorder.reset()
+    prefilter = None
+    if not args.no_prefilter:
+        prefilter = make_prefilter(provider, args.interval, patterns, args.min_avg_volume, args.min_price)
+
+    started = time.perf_counter()
+    with profiled("scan", args.profile):
+        results = run_scan(patterns, args.interval, args.exchange, args.tickers or None, prefilter=prefilter,
+                           provider=provider, prioritize=not args.no_priority, top_k=args.top_k,
+                           score_slack=args.score_slack, features=make_feature_store(provider, args.interval))
+    if prefilter is not None:
+        print(prefilter.report())
+    for pattern, matches in results['pattern_matches'].items():
+        print(f"{pattern}: {len(matches)} matches")
+        for record in matches:
+            print(f"  {record['ticker']} ({record['company_name']}) score {record['scores'].get(pattern, 0):.3f}")
+    elapsed = time.perf_counter() - started
+    print(recorder.report(results['perf']['scanned']))
+    if results['skipped_by_bound']:
+        print(f"Stopped early: {results['skipped_by_bound']} stocks could not beat the top {args.top_k}")
+    if results['time_to_first_result'] is not None:
+        print(f"First match after {results['time_to_first_result']:.1f}s")
+    print(f"Scanned {len(results['processed_stocks'])}/{results['total_stocks']} stocks in {elapsed:.1f}s "
+          f"({len(results['processed_stocks']) / max(elapsed, 1e-9):.1f} stocks/s, {provider.name} provider)")
@@ -0,0 +1,75 @@
+import heapq
+import itertools
+from datetime import datetime, timedelta
+import numpy as np
+
+# How far a pattern score may move between two scans of the same ticker; cached scores plus this
+# slack are the bounds top-K mode trusts when deciding that the rest of the universe cannot win
+SCORE_SLACK = 0.25
+# Scores are in [-1, 1], so a ticker without a recent cached score is bounded by the maximum
+MAX_SCORE = 1.0
+
+class TopK:
+    """The k highest-scored records seen so far, kept in a min-heap"""
+
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+        self._order = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def full(self):
+        return len(self._heap) >= self.k
+
+    @property
+    def threshold(self):
+        """Score a new record has to beat, -inf until the heap is full"""
+        return self._heap[0][0] if self.full else -np.inf
+
+    def push(self, score, record):
+        # The counter breaks score ties by arrival, so records are never compared
+        entry = (score, -next(self._order), record)
+        if not self.full:
+            heapq.heappush(self._heap, entry)
+            return True
+        if score > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def records(self):
+        return [record for _, _, record in sorted(self._heap, key=lambda entry: (-entry[0], -entry[1]))]
+
+def score_bounds(tickers, patterns, metadata, slack=SCORE_SLACK, max_age_days=7):
+    """Upper bound of every ticker's score per pattern, as an array of shape (tickers, patterns)"""
+    bounds = np.full((len(tickers), len(patterns)), MAX_SCORE)
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+    for row, ticker in enumerate(tickers):
+        facts = (metadata or {}).get(ticker)
+        if not facts or 'scores' not in facts or datetime.fromisoformat(facts['updated']) < cutoff:
+            continue
+        for column, pattern in enumerate(patterns):
+            if pattern in facts['scores']:
+                bounds[row, column] = min(MAX_SCORE, facts['scores'][pattern] + slack)
+    return bounds
+
+def order_by_bound(tickers, bounds):
+    """Tickers by their best bound, highest first (stable), with the suffix maximum of the bounds
+
+    remaining_best[i] is the highest bound per pattern over tickers[i:], so a scan can stop at i
+    once no pattern's remaining_best can beat its current K-th score.
+    """
+    if not tickers:
+        return [], bounds
+    order = np.argsort(-bounds.max(axis=1), kind='stable')
+    bounds = bounds[order]
+    remaining_best = np.maximum.accumulate(bounds[::-1], axis=0)[::-1]
+    return [tickers[i] for i in order], remaining_best
+
+def cannot_improve(top, patterns, remaining_best):
+    """True when every pattern's heap is full and no remaining bound beats its K-th score"""
+    return all(top[pattern].full and remaining_best[column] <= top[pattern].threshold
+               for column, pattern in enumerate(patterns))
@@ -0,0 +1,23 @@
+import pandas as pd
+from async_fetch import parse_chart
+
+def _payload(timestamps, closes, adjcloses):
+    return {'chart': {'result': [{
+        'timestamp': timestamps,
+        'indicators': {
+            'quote': [{'open': closes, 'high': closes, 'low': closes, 'close': closes, 'volume': [100] * len(closes)}],
+            'adjclose': [{'adjclose': adjcloses}]
+        }
+    }], 'error': None}}
+
+def test_daily_bars_use_quote_prices_at_midnight():
+    # Session opens at 09:15 IST on 8 and 9 July 2024
+    data = parse_chart(_payload([1720410300, 1720496700], [100.0, 102.0], [98.0, 100.0]), '1d')
+    assert list(data['Close']) == [100.0, 102.0]
+    assert list(data.index) == [pd.Timestamp('2024-07-08', tz='Asia/Kolkata'),
+                                pd.Timestamp('2024-07-09', tz='Asia/Kolkata')]
+
+def test_intraday_bars_keep_their_time_and_drop_empty_intervals():
+    data = parse_chart(_payload([1720410300, 1720411200], [100.0, None], [100.0, None]), '15m')
+    assert len(data) == 1
+    assert data.index[0] == pd.Timestamp('2024-07-08 09:15', tz='Asia/Kolkata')
@@ -0,0 +1,90 @@
+import io
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+import bhavcopy
+from bar_store import BarStore
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+LEGACY_CSV = os.path.join(DATA_DIR, "cm04JUL2024bhav.csv")
+LEGACY_ZIP = os.path.join(DATA_DIR, "cm05JUL2024bhav.csv.zip")
+UDIFF_CSV = os.path.join(DATA_DIR, "BhavCopy_NSE_CM_0_0_0_20240708_F_0000.csv")
+UDIFF_ZIP = os.path.join(DATA_DIR, "BhavCopy_NSE_CM_0_0_0_20240709_F_0000.csv.zip")
+
+def _zipped(path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.write(path, os.path.basename(path))
+    return buffer.getvalue()
+
+def test_legacy_keeps_equity_series_only():
+    bars = bhavcopy.parse_bhavcopy(LEGACY_CSV)
+    assert sorted(bars['ticker']) == ['ALPHA.NS', 'BETA.NS', 'DELTA.NS', 'GAMMA.NS']
+    assert (bars['date'] == pd.Timestamp('2024-07-04')).all()
+    alpha = bars.set_index('ticker').loc['ALPHA.NS']
+    assert (alpha['Open'], alpha['High'], alpha['Low'], alpha['Close'], alpha['Volume']) == (100, 102, 99, 101, 1000)
+    assert alpha['prev_close'] == 100
+
+def test_udiff_keeps_equity_series_only():
+    bars = bhavcopy.parse_bhavcopy(UDIFF_CSV)
+    # NEWCO trades in the SME series, which is not an equity series here
+    assert sorted(bars['ticker']) == ['ALPHA.NS', 'DELTA.NS', 'GAMMA.NS']
+    assert (bars['date'] == pd.Timestamp('2024-07-08')).all()
+    assert bars.set_index('ticker').loc['DELTA.NS', 'Close'] == 1020
+
+def test_series_filter_is_configurable():
+    bars = bhavcopy.parse_bhavcopy(UDIFF_CSV, series=('EQ', 'BE', 'SM'))
+    assert 'NEWCO.NS' in set(bars['ticker'])
+
+@pytest.mark.parametrize("path", [LEGACY_CSV, UDIFF_CSV])
+def test_zip_parses_like_csv(path):
+    with open(path, 'rb') as f:
+        from_csv = bhavcopy.parse_bhavcopy(f.read())
+    from_zip = bhavcopy.parse_bhavcopy(_zipped(path))
+    pd.testing.assert_frame_equal(from_csv.sort_values('ticker').reset_index(drop=True),
+                                  from_zip.sort_values('ticker').reset_index(drop=True))
+
+def test_zip_files_on_disk():
+    assert len(bhavcopy.parse_bhavcopy(LEGACY_ZIP)) == 4
+    assert len(bhavcopy.parse_bhavcopy(UDIFF_ZIP)) == 3
+
+def test_duplicate_series_keeps_most_traded():
+    # BETA trades in EQ and BE on both days; EQ is busier on the 4th, BE on the 5th
+    first = bhavcopy.parse_bhavcopy(LEGACY_CSV).set_index('ticker').loc['BETA.NS']
+    second = bhavcopy.parse_bhavcopy(LEGACY_ZIP).set_index('ticker').loc['BETA.NS']
+    assert (first['Close'], first['Volume']) == (50, 300)
+    assert (second['Close'], second['Volume']) == (50.5, 200)
+
+def test_unknown_layout_raises():
+    with pytest.raises(ValueError):
+        bhavcopy.parse_bhavcopy(b"a,b,c\n1,2,3\n")
+
+def test_ingest_adjusts_history_before_a_split(tmp_path):
+    store = BarStore(str(tmp_path))
+    rows = bhavcopy.ingest_files([LEGACY_CSV, LEGACY_ZIP, UDIFF_CSV, UDIFF_ZIP], store)
+    assert rows == 4 + 4 + 3 + 3
+
+    # DELTA split 2:1 on the 9th; the exchange's previous close of 510 halves the 1020 close
+    delta = store.read('DELTA.NS', '1d')
+    assert list(delta['Close']) == [500, 505, 510, 510]
+    assert list(delta['Volume']) == [1000, 900, 1040, 1100]
+    # No corporate action: prices stay as traded
+    assert list(store.read('ALPHA.NS', '1d')['Close']) == [101, 102, 103, 104]
+
+def test_ingest_keeps_adjusting_stored_history(tmp_path):
+    store = BarStore(str(tmp_path))
+    bhavcopy.ingest_files([LEGACY_CSV, LEGACY_ZIP, UDIFF_CSV], store)
+    assert list(store.read('DELTA.NS', '1d')['Close']) == [1000, 1010, 1020]
+    # The split session arrives in a later run and rescales the history already stored
+    bhavcopy.ingest_files([UDIFF_ZIP], store)
+    assert list(store.read('DELTA.NS', '1d')['Close']) == [500, 505, 510, 510]
+
+def test_no_adjustment_across_missing_sessions():
+    index = pd.DatetimeIndex(['2024-07-01', '2024-07-15'], tz='Asia/Kolkata')
+    bars = pd.DataFrame({'Open': [100, 60], 'High': [100, 60], 'Low': [100, 60], 'Close': [100, 60],
+                         'Volume': [10, 10], 'prev_close': [np.nan, 50]}, index=index)
+    # The previous close refers to a session that is not stored, so it says nothing about the stored bar
+    adjusted = bhavcopy.adjust_for_corporate_actions(bars)
+    assert list(adjusted['Close']) == [100, 60]
@@ -0,0 +1,60 @@
+import pytest
+from cache_manager import CacheManager
+from cache_files import find_cache_file
+
+def _record(ticker):
+    return {'ticker': ticker, 'company_name': ticker}
+
+@pytest.fixture
+def cache_manager(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return CacheManager()
+
+def test_checkpoints_of_two_sessions_are_merged(cache_manager):
+    other = CacheManager()
+    cache_manager.save_multi_progress(['P'], '1d', 'NSE', ['A.NS', 'B.NS'], {'P': [_record('A.NS')]}, [], 4)
+    other.save_multi_progress(['P'], '1d', 'NSE', ['C.NS', 'D.NS'], {'P': [_record('D.NS')]}, [], 4)
+
+    progress = cache_manager.get_multi_progress(['P'], '1d', 'NSE')
+    assert progress['processed_stocks'] == {'A.NS', 'B.NS', 'C.NS', 'D.NS'}
+    assert [r['ticker'] for r in progress['pattern_matches']['P']] == ['A.NS', 'D.NS']
+
+def test_rescanned_ticker_replaces_its_stored_result(cache_manager):
+    cache_manager.save_progress_to_cache('P', '1d', 'NSE', ['A.NS', 'B.NS'], [_record('A.NS')], [], 2)
+    # A later session scanned A.NS again and it no longer matches
+    CacheManager().save_progress_to_cache('P', '1d', 'NSE', ['A.NS'], [], [], 2)
+
+    progress = cache_manager.get_progress_from_cache('P', '1d', 'NSE')
+    assert progress['processed_stocks'] == {'A.NS', 'B.NS'}
+    assert progress['matching_stocks'] == []
+
+def test_checkpoint_of_another_pattern_set_is_replaced(cache_manager):
+    cache_manager.save_multi_progress(['P'], '1d', 'NSE', ['A.NS'], {'P': [_record('A.NS')]}, [], 2)
+    cache_manager.save_multi_progress(['P', 'Q'], '1d', 'NSE', ['B.NS'], {'P': [], 'Q': []}, [], 2)
+
+    assert cache_manager.get_multi_progress(['P'], '1d', 'NSE') is None
+    assert cache_manager.get_multi_progress(['P', 'Q'], '1d', 'NSE')['processed_stocks'] == {'B.NS'}
+
+def test_prewarm_keeps_interactive_checkpoints(cache_manager):
+    cache_manager.save_multi_progress(['P'], '1d', 'NSE', ['A.NS'], {'P': [_record('A.NS')]}, [], 2)
+    cache_manager.save_progress_to_cache('P', '1d', 'NSE', ['A.NS'], [_record('A.NS')], [], 2)
+
+    prewarm = CacheManager(progress_tag='prewarm')
+    prewarm.clear_multi_progress('1d', 'NSE')
+    prewarm.save_multi_progress(['P'], '1d', 'NSE', ['B.NS'], {'P': []}, [], 2)
+    prewarm.save_multi_results(['P'], '1d', 'NSE', {'P': [_record('B.NS')]}, [], 2)
+    prewarm.save_final_results('P', '1d', 'NSE', [_record('B.NS')], [], 2)
+
+    assert cache_manager.get_multi_progress(['P'], '1d', 'NSE')['processed_stocks'] == {'A.NS'}
+    assert cache_manager.get_progress_from_cache('P', '1d', 'NSE')['processed_stocks'] == {'A.NS'}
+    # Published results are shared
+    assert [r['ticker'] for r in cache_manager.get_final_results('P', '1d', 'NSE')['matching_stocks']] == ['B.NS']
+
+def test_corrupt_final_results_read_as_no_matches(cache_manager):
+    cache_manager.save_final_results('P', '1d', 'NSE', [_record('A.NS')], [], 2)
+    assert cache_manager.matched_tickers('P', '1d', 'NSE') == {'A.NS'}
+
+    path = find_cache_file(cache_manager._base(f"{cache_manager.get_cache_key('P', '1d', 'NSE')}_final"))
+    with open(path, 'r+b') as f:
+        f.truncate(f.seek(0, 2) // 2)
+    assert cache_manager.matched_tickers('P', '1d', 'NSE') == set()
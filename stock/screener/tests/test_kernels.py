@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import kernels
+from bench_kernels import REFERENCES
+
+BACKENDS = {
+    'numpy': kernels.NUMPY_KERNELS,
+    'numba': kernels.NUMBA_KERNELS
+}
+
+def _backend(name):
+    if name not in kernels.available_backends():
+        pytest.skip(f"{name} kernels are not available")
+    return BACKENDS[name]
+
+def _bars(length, seed, nan_rate=0.0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+    high = close * (1 + rng.uniform(0, 0.03, length))
+    low = close * (1 - rng.uniform(0, 0.03, length))
+    volume = rng.lognormal(12, 1, length)
+    if nan_rate:
+        for values in (high, low, close, volume):
+            values[rng.random(length) < nan_rate] = np.nan
+    return high, low, close, volume
+
+def _calls(high, low, close, volume):
+    returns = np.abs(np.diff(close, prepend=np.nan) / np.r_[np.nan, close[:-1]])
+    return [
+        ('true_range', (high, low, close)),
+        ('rolling_sum', (returns, 39)),
+        ('rolling_sum', (volume, 1)),
+        ('rolling_mean', (volume, 120)),
+        ('rolling_max', (high, 100)),
+        ('rolling_min', (close, 30)),
+        ('atr', (high, low, close, 14)),
+        ('ema', (close, 20)),
+        ('range_pct', (high, low, close, 45))
+    ]
+
+def _assert_matches(name, actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=0, equal_nan=True, err_msg=name)
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+@pytest.mark.parametrize("length", [0, 5, 150, 1000])
+def test_kernels_match_pandas_on_random_input(backend, length):
+    implementations = _backend(backend)
+    for seed in range(3):
+        for name, args in _calls(*_bars(length, seed)):
+            _assert_matches(name, implementations[name](*args), REFERENCES[name](*args))
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_rolling_kernels_propagate_nan_like_pandas(backend):
+    implementations = _backend(backend)
+    for seed in range(3):
+        for name, args in _calls(*_bars(600, seed, nan_rate=0.01)):
+            # An EWM skips NaN, while the kernel carries it; detection never feeds NaN to the EMA
+            if name == 'ema':
+                continue
+            _assert_matches(name, implementations[name](*args), REFERENCES[name](*args))
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_ema_matches_pandas_over_long_histories(backend):
+    implementations = _backend(backend)
+    close = _bars(20000, 7)[2]
+    for span in (2, 20, 200):
+        _assert_matches(f"ema{span}", implementations['ema'](close, span), REFERENCES['ema'](close, span))
+
+def test_use_backend_rebinds_the_public_kernels():
+    original = kernels.BACKEND
+    try:
+        for backend in kernels.available_backends():
+            kernels.use_backend(backend)
+            assert kernels.rolling_max is BACKENDS[backend]['rolling_max']
+    finally:
+        kernels.use_backend(original)
+    with pytest.raises(ValueError):
+        kernels.use_backend('fortran')
@@ -0,0 +1,72 @@
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from bar_store import BarStore
+from data_providers import SyntheticProvider
+from live_scanner import IST, LiveScanner, ReplayBarFeed, BarCloseScheduler, session_bounds
+
+PATTERNS = ["Volatility Contraction", "Low Volume Stock Selection", "15% Reversal"]
+
+@pytest.fixture
+def store(tmp_path):
+    """A 15m-only store, the layout fetches leave behind"""
+    provider = SyntheticProvider(3, seed=0)
+    store = BarStore(str(tmp_path))
+    for ticker in provider.list_universe():
+        store.write(ticker, '15m', provider.get_bars(ticker, '15m')[0])
+    return store
+
+def _replay(store, interval, warmup_bars):
+    tickers = store.tickers('15m')
+    feed = ReplayBarFeed(store, interval, warmup_bars=warmup_bars)
+    scanner = LiveScanner(tickers, interval, PATTERNS, feed)
+    scanner.bootstrap()
+    updates = []
+    while not feed.exhausted():
+        updates.append(scanner.process_bar_close(feed.next_close_time()))
+    return tickers, scanner, updates
+
+@pytest.mark.parametrize("interval, minutes, warmup_bars", [('15m', 15, 400), ('1h', 60, 120)])
+def test_replay_fires_one_trigger_per_bar_close(store, interval, minutes, warmup_bars):
+    tickers, scanner, updates = _replay(store, interval, warmup_bars)
+    history = store.read_interval(tickers[0], interval)
+
+    replayed = history.index[warmup_bars:]
+    expected_closes = [min(start + pd.Timedelta(minutes=minutes), session_bounds(start.astimezone(IST).date())[1])
+                       for start in replayed]
+    assert [update['close_time'] for update in updates] == expected_closes
+    assert all(update['updated'] == len(tickers) for update in updates)
+    # Each window ends at the last replayed candle, as a live fetch would leave it
+    for ticker in tickers:
+        assert scanner.states[ticker].window.index[-1] == store.read_interval(ticker, interval).index[-1]
+
+def test_match_sets_follow_the_replayed_bars(store):
+    _, scanner, updates = _replay(store, '15m', 400)
+    matching = {pattern: set() for pattern in PATTERNS}
+    for update in updates:
+        for pattern in PATTERNS:
+            matching[pattern] |= set(update['added'][pattern])
+            matching[pattern] -= set(update['dropped'][pattern])
+            assert matching[pattern] == set(update['matching'][pattern])
+    assert matching == scanner.matches
+
+@pytest.mark.parametrize("interval, stored", [('15m', True), ('1h', False)])
+def test_only_base_interval_bars_are_stored(store, tmp_path, interval, stored):
+    live_store = BarStore(str(tmp_path / "live"))
+    feed = ReplayBarFeed(store, interval, warmup_bars=120)
+    scanner = LiveScanner(store.tickers('15m'), interval, PATTERNS, feed, store=live_store)
+    scanner.bootstrap()
+    scanner.process_bar_close(feed.next_close_time())
+    assert os.path.exists(os.path.join(live_store.root, interval)) == stored
+    if stored:
+        for ticker, state in scanner.states.items():
+            assert live_store.read(ticker, interval).index[-1] == state.window.index[-1]
+
+def test_scheduler_wakes_after_the_bar_close():
+    now = [IST.localize(datetime(2024, 12, 2, 9, 20))]
+    scheduler = BarCloseScheduler('15m', settle_seconds=5, clock=lambda: now[0],
+                                  sleep=lambda seconds: now.__setitem__(0, now[0] + timedelta(seconds=seconds)))
+    close_time = scheduler.wait_for_next_close()
+    assert close_time == IST.localize(datetime(2024, 12, 2, 9, 30))
+    assert now[0] >= close_time + timedelta(seconds=5)
@@ -0,0 +1,33 @@
+import threading
+import perf
+from perf import PerfRecorder, recording, timed, count
+
+def test_scans_in_different_threads_keep_their_own_timings():
+    recorders = [PerfRecorder(), PerfRecorder()]
+    barrier = threading.Barrier(len(recorders))
+    global_calls = perf.recorder.snapshot()['counters'].get('test.calls', 0)
+
+    def scan(scan_recorder, n):
+        with recording(scan_recorder):
+            barrier.wait()
+            # A reset in one session must not touch the other session's stages
+            perf.current().reset()
+            for _ in range(n):
+                with timed('fetch'):
+                    count('test.calls')
+
+    threads = [threading.Thread(target=scan, args=(scan_recorder, n)) for scan_recorder, n in zip(recorders, (3, 5))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [r.snapshot()['stages']['fetch']['count'] for r in recorders] == [3, 5]
+    assert [r.snapshot()['counters']['test.calls'] for r in recorders] == [3, 5]
+    assert perf.recorder.snapshot()['counters'].get('test.calls', 0) == global_calls
+
+def test_timings_outside_a_scan_go_to_the_process_recorder():
+    assert perf.current() is perf.recorder
+    with recording(PerfRecorder()) as scan_recorder:
+        assert perf.current() is scan_recorder
+    assert perf.current() is perf.recorder
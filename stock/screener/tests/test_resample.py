@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from resample import resample_ohlcv
+
+def _daily(start, sessions, seed=0):
+    index = pd.bdate_range(start, periods=sessions, tz='Asia/Kolkata', name='Datetime')
+    close = 100 + np.random.default_rng(seed).normal(0, 1, sessions).cumsum()
+    return pd.DataFrame({'Open': close - 0.5, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                         'Volume': np.arange(1, sessions + 1) * 100}, index=index)
+
+def test_weekly_bars_follow_calendar_weeks():
+    # Wednesday 2024-07-03 to Friday 2024-07-26
+    daily = _daily('2024-07-03', 18)
+    bars = resample_ohlcv(daily, '5d')
+    assert list(bars.index.strftime('%Y-%m-%d')) == ['2024-07-03', '2024-07-08', '2024-07-15', '2024-07-22']
+    week = daily.loc['2024-07-08':'2024-07-12']
+    assert bars.loc['2024-07-08'].tolist() == [week['Open'].iloc[0], week['High'].max(), week['Low'].min(),
+                                               week['Close'].iloc[-1], week['Volume'].sum()]
+
+def test_past_weekly_bars_do_not_change_as_days_are_added():
+    daily = _daily('2024-07-01', 40)
+    full = resample_ohlcv(daily, '5d')
+    for sessions in range(20, 40):
+        partial = resample_ohlcv(daily.iloc[:sessions], '5d')
+        # Every bar but the newest, which may hold the current week so far, is already final
+        pd.testing.assert_frame_equal(partial.iloc[:-1], full.iloc[:len(partial) - 1])
+
+def test_weekly_bars_do_not_depend_on_where_history_starts():
+    daily = _daily('2024-07-01', 40)
+    full = resample_ohlcv(daily, '5d')
+    trimmed = resample_ohlcv(daily.iloc[7:], '5d')
+    pd.testing.assert_frame_equal(trimmed.iloc[1:], full.loc[trimmed.index[1]:])
+
+def test_holiday_shortens_its_week():
+    daily = _daily('2024-08-12', 10).drop(pd.Timestamp('2024-08-15', tz='Asia/Kolkata'))
+    bars = resample_ohlcv(daily, '5d')
+    assert list(bars.index.strftime('%Y-%m-%d')) == ['2024-08-12', '2024-08-19']
+    assert bars['Volume'].tolist() == [daily['Volume'].iloc[:4].sum(), daily['Volume'].iloc[4:].sum()]
@@ -0,0 +1,392 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from abc import ABC, abstractmethod
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUEUE_PATH = os.path.join("cache", "work_queue.db")
+SHARD_SIZE = 50
+# A lease is renewed after every ticker, so it only expires when a worker dies or hangs
+LEASE_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    patterns TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    exchange TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    job_id TEXT NOT NULL,
+    shard_id INTEGER NOT NULL,
+    tickers TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    results TEXT,
+    PRIMARY KEY (job_id, shard_id)
+);
+CREATE INDEX IF NOT EXISTS shards_state ON shards (state, lease_expires);
+"""
+
+class WorkQueue(ABC):
+    """Shards of a scan handed out as time-limited leases
+
+    A lease is a dict with job_id, shard_id, tickers, patterns, interval, exchange, worker and expires.
+    Shard results are {'pattern_matches': {pattern: [record]}, 'stocks_with_issues': [record],
+    'processed': [ticker]}, the same records run_scan produces.
+    """
+
+    @abstractmethod
+    def create_job(self, tickers, patterns, interval, exchange, shard_size=SHARD_SIZE):
+        """Splits tickers into shards of a new job; returns the job_id"""
+
+    @abstractmethod
+    def claim(self, worker, lease_seconds=LEASE_SECONDS):
+        """Next pending or expired shard of the oldest open job, or None"""
+
+    @abstractmethod
+    def renew(self, lease, lease_seconds=LEASE_SECONDS):
+        """Extends a lease; False when it expired and was handed to another worker"""
+
+    @abstractmethod
+    def complete(self, lease, results):
+        """Stores a shard's results; False when the lease was lost and the results are dropped"""
+
+    @abstractmethod
+    def status(self, job_id):
+        """Shard counts of a job by state and whether it is finished, or None for an unknown job"""
+
+    @abstractmethod
+    def collect(self, job_id):
+        """Results of every finished shard of a job, merged"""
+
+class SQLiteWorkQueue(WorkQueue):
+    """Queue in one SQLite file; workers on the same host use it directly, remote ones through serve_queue"""
+
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # A connection per call keeps the queue usable from the HTTP server's threads
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_job(self, tickers, patterns, interval, exchange, shard_size=SHARD_SIZE):
+        job_id = f"{interval}_{exchange}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?)",
+                         (job_id, json.dumps(list(patterns)), interval, exchange, len(tickers), time.time()))
+            conn.executemany(
+                "INSERT INTO shards (job_id, shard_id, tickers) VALUES (?, ?, ?)",
+                [(job_id, i // shard_size, json.dumps(list(tickers[i:i + shard_size])))
+                 for i in range(0, len(tickers), shard_size)]
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return job_id
+
+    def claim(self, worker, lease_seconds=LEASE_SECONDS):
+        now = time.time()
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so two workers can never claim the same shard
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT s.job_id, s.shard_id, s.tickers, j.patterns, j.interval, j.exchange "
+                "FROM shards s JOIN jobs j ON j.job_id = s.job_id "
+                "WHERE s.state = 'pending' OR (s.state = 'leased' AND s.lease_expires < ?) "
+                "ORDER BY j.created, s.shard_id LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            expires = now + lease_seconds
+            conn.execute(
+                "UPDATE shards SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE job_id = ? AND shard_id = ?", (worker, expires, row['job_id'], row['shard_id'])
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return {
+            'job_id': row['job_id'],
+            'shard_id': row['shard_id'],
+            'tickers': json.loads(row['tickers']),
+            'patterns': json.loads(row['patterns']),
+            'interval': row['interval'],
+            'exchange': row['exchange'],
+            'worker': worker,
+            'expires': expires
+        }
+
+    def _update_lease(self, lease, assignments, values):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                f"UPDATE shards SET {assignments} WHERE job_id = ? AND shard_id = ? AND state = 'leased' AND worker = ?",
+                (*values, lease['job_id'], lease['shard_id'], lease['worker'])
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def renew(self, lease, lease_seconds=LEASE_SECONDS):
+        lease['expires'] = time.time() + lease_seconds
+        return self._update_lease(lease, "lease_expires = ?", (lease['expires'],))
+
+    def complete(self, lease, results):
+        return self._update_lease(lease, "state = 'done', lease_expires = NULL, results = ?", (json.dumps(results),))
+
+    def status(self, job_id):
+        conn = self._connect()
+        try:
+            job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(conn.execute(
+                "SELECT state, COUNT(*) FROM shards WHERE job_id = ? GROUP BY state", (job_id,)
+            ).fetchall())
+            expired = conn.execute(
+                "SELECT COUNT(*) FROM shards WHERE job_id = ? AND state = 'leased' AND lease_expires < ?",
+                (job_id, time.time())
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        shards = sum(counts.values())
+        return {
+            'job_id': job_id,
+            'total_stocks': job['total'],
+            'shards': shards,
+            'pending': counts.get('pending', 0),
+            'leased': counts.get('leased', 0),
+            'expired': expired,
+            'done': counts.get('done', 0),
+            'finished': shards > 0 and counts.get('done', 0) == shards
+        }
+
+    def collect(self, job_id):
+        conn = self._connect()
+        try:
+            patterns = json.loads(conn.execute("SELECT patterns FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0])
+            rows = conn.execute(
+                "SELECT results FROM shards WHERE job_id = ? AND state = 'done' ORDER BY shard_id", (job_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return merge_results(patterns, [json.loads(row['results']) for row in rows])
+
+def merge_results(patterns, shard_results):
+    merged = {'pattern_matches': {pattern: [] for pattern in patterns}, 'stocks_with_issues': [], 'processed': []}
+    for results in shard_results:
+        for pattern, records in results['pattern_matches'].items():
+            merged['pattern_matches'].setdefault(pattern, []).extend(records)
+        merged['stocks_with_issues'].extend(results['stocks_with_issues'])
+        merged['processed'].extend(results['processed'])
+    return merged
+
+class HTTPWorkQueue(WorkQueue):
+    """Client for a queue served by serve_queue on the coordinator"""
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _call(self, method, **params):
+        request = urllib.request.Request(f"{self.url}/{method}", data=json.dumps(params).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode('utf-8'))['result']
+
+    def create_job(self, tickers, patterns, interval, exchange, shard_size=SHARD_SIZE):
+        return self._call('create_job', tickers=list(tickers), patterns=list(patterns), interval=interval,
+                          exchange=exchange, shard_size=shard_size)
+
+    def claim(self, worker, lease_seconds=LEASE_SECONDS):
+        return self._call('claim', worker=worker, lease_seconds=lease_seconds)
+
+    def renew(self, lease, lease_seconds=LEASE_SECONDS):
+        renewed = self._call('renew', lease=lease, lease_seconds=lease_seconds)
+        lease['expires'] = time.time() + lease_seconds
+        return renewed
+
+    def complete(self, lease, results):
+        return self._call('complete', lease=lease, results=results)
+
+    def status(self, job_id):
+        return self._call('status', job_id=job_id)
+
+    def collect(self, job_id):
+        return self._call('collect', job_id=job_id)
+
+QUEUE_METHODS = ('create_job', 'claim', 'renew', 'complete', 'status', 'collect')
+
+def serve_queue(queue, host="0.0.0.0", port=8765):
+    """Exposes a queue's methods as JSON POST endpoints on a daemon thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            method = self.path.strip('/')
+            if method not in QUEUE_METHODS:
+                self.send_error(404)
+                return
+            try:
+                params = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                body = json.dumps({'result': getattr(queue, method)(**params)}).encode('utf-8')
+            except Exception as e:
+                self.send_error(400, str(e))
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="work-queue", daemon=True).start()
+    return server
+
+QUEUE_BACKENDS = {'sqlite': SQLiteWorkQueue, 'http': HTTPWorkQueue}
+
+def open_queue(location=QUEUE_PATH):
+    """HTTP client for http(s):// locations, otherwise the SQLite file at that path"""
+    if location.startswith(('http://', 'https://')):
+        return QUEUE_BACKENDS['http'](location)
+    return QUEUE_BACKENDS['sqlite'](location)
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def run_worker(queue, provider=None, worker=None, lease_seconds=LEASE_SECONDS, idle_exit=True, poll=5.0,
+               should_stop=None):
+    """Claims shards until the queue is empty (or forever with idle_exit=False) and reports their results"""
+    from scanner import scan_and_record
+    from data_providers import get_provider
+
+    provider = provider or get_provider()
+    worker = worker or default_worker_id()
+    prepared = set()
+    completed = 0
+    while not (should_stop and should_stop()):
+        lease = queue.claim(worker, lease_seconds)
+        if lease is None:
+            if idle_exit:
+                break
+            time.sleep(poll)
+            continue
+
+        interval, patterns, exchange = lease['interval'], lease['patterns'], lease['exchange']
+        if interval not in prepared:
+            provider.prepare(interval)
+            prepared.add(interval)
+
+        results = {'pattern_matches': {pattern: [] for pattern in patterns}, 'stocks_with_issues': [], 'processed': []}
+        lost = False
+        for ticker in lease['tickers']:
+            result = scan_and_record(ticker, interval, patterns, exchange, provider)
+            results['processed'].append(ticker)
+            if result and 'record' in result:
+                if result['has_period_issues']:
+                    results['stocks_with_issues'].append(result['record'])
+                for pattern in result['matched_patterns']:
+                    results['pattern_matches'][pattern].append(result['record'])
+            if not queue.renew(lease, lease_seconds):
+                lost = True
+                break
+
+        if lost or not queue.complete(lease, results):
+            print(f"{worker}: lease on shard {lease['shard_id']} of {lease['job_id']} expired, results dropped")
+            continue
+        completed += 1
+        print(f"{worker}: finished shard {lease['shard_id']} of {lease['job_id']} ({len(lease['tickers'])} stocks)")
+    return completed
+
+def coordinate(queue, patterns, interval, exchange, tickers, shard_size=SHARD_SIZE, cache_manager=None, poll=5.0,
+               timeout=None):
+    """Shards the universe into a job, waits for the workers and saves the merged results
+
+    Results are written with save_final_results per pattern and save_multi_results, so the UI
+    and scanner.py find a distributed scan exactly like a local one.
+    """
+    job_id = queue.create_job(tickers, patterns, interval, exchange, shard_size)
+    print(f"Created job {job_id}: {len(tickers)} stocks in shards of {shard_size}")
+    started = time.time()
+    while True:
+        status = queue.status(job_id)
+        if status['finished']:
+            break
+        if timeout is not None and time.time() - started > timeout:
+            print(f"Job {job_id} timed out with {status['done']}/{status['shards']} shards done")
+            return None
+        print(f"{status['done']}/{status['shards']} shards done, {status['leased']} leased, "
+              f"{status['expired']} expired")
+        time.sleep(poll)
+
+    results = queue.collect(job_id)
+    if cache_manager is not None:
+        total_stocks = status['total_stocks']
+        for pattern in patterns:
+            cache_manager.save_final_results(pattern, interval, exchange, results['pattern_matches'][pattern],
+                                             results['stocks_with_issues'], total_stocks)
+        cache_manager.save_multi_results(patterns, interval, exchange, results['pattern_matches'],
+                                         results['stocks_with_issues'], total_stocks)
+    return results
+
+if __name__ == "__main__":
+    from data_providers import get_provider, PROVIDERS
+    from scanner import PATTERNS
+
+    parser = argparse.ArgumentParser(description="Split a scan across workers through a shared lease queue")
+    parser.add_argument("role", choices=["coordinator", "worker"])
+    parser.add_argument("--queue", default=QUEUE_PATH, help="SQLite path or http://host:port of a coordinator")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), help="defaults to $SCREENER_PROVIDER or yahoo")
+    parser.add_argument("--data-dir", help="directory read by the local provider")
+    parser.add_argument("--lease-seconds", type=int, default=LEASE_SECONDS)
+    parser.add_argument("--pattern", action="append", dest="patterns", choices=PATTERNS)
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--exchange", default="NSE")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--serve", type=int, metavar="PORT", help="coordinator: serve the queue to remote workers")
+    parser.add_argument("--wait", action="store_true", help="worker: keep polling when the queue is empty")
+    parser.add_argument("tickers", nargs="*")
+    args = parser.parse_args()
+
+    provider = get_provider(args.provider, data_dir=args.data_dir)
+    queue = open_queue(args.queue)
+    if args.role == "worker":
+        count = run_worker(queue, provider, lease_seconds=args.lease_seconds, idle_exit=not args.wait)
+        print(f"Worker finished {count} shards")
+    else:
+        from cache_manager import CacheManager
+
+        if args.serve:
+            serve_queue(queue, port=args.serve)
+            print(f"Serving the queue on port {args.serve}")
+        patterns = args.patterns or PATTERNS
+        tickers = args.tickers or provider.list_universe(args.exchange)
+        results = coordinate(queue, patterns, args.interval, args.exchange, tickers, args.shard_size,
+                             CacheManager(provider=provider))
+        if results:
+            for pattern, matches in results['pattern_matches'].items():
+                print(f"{pattern}: {len(matches)} matches")
+            print(f"Scanned {len(results['processed'])} stocks")